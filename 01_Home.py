@@ -1,9 +1,13 @@
 # pages/1_🌱_สถานะฟาร์ม.py
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from utils import load_data_from_mongo, calculate_vpd, get_vpd_status
-from streamlit_autorefresh import st_autorefresh
+from datetime import datetime, timedelta
+from utils import load_data_from_mongo, get_data_version, calculate_vpd, get_vpd_status, check_rules, RPI_HEALTH_RULES, DATA_SOURCES
+from alerts import get_alert_scheduler
+from warmup import get_cache_warmup
+from charting import downsample, point_budget
+from profiling import timed
+from metrics import start_metrics_server
 
 # --- Page Config ---
 st.set_page_config(
@@ -12,64 +16,121 @@ st.set_page_config(
     layout="wide"
 )
 
-# --- Auto-refresh every 5 seconds ---
-st_autorefresh(interval=5000, key="monitoring_refresh")
+# --- Refresh Intervals ---
+# แต่ละส่วนของหน้าเป็น fragment ที่ rerun แยกกัน การ์ด KPI อัปเดตถี่ ส่วนกราฟแนวโน้ม 3 ชั่วโมงอัปเดตห่างกว่า
+KPI_REFRESH = "5s"
+TREND_REFRESH = "60s"
+
+# Alert ถูกประเมินเบื้องหลังเพียงครั้งเดียวต่อ process ทุกหน้าเพียงอ่านผล
+alert_scheduler = get_alert_scheduler()
+
+# โหลดข้อมูลเริ่มต้นของทุกหน้าล่วงหน้าเบื้องหลัง (ครั้งเดียวต่อ process)
+cache_warmup = get_cache_warmup()
+
+# Prometheus endpoint ของ process (ครั้งเดียวต่อ process, ปิดด้วย METRICS_PORT=0)
+start_metrics_server()
 
 # --- Header ---
 st.title("🌱 SmartFarm Real-Time Dashboard")
-st.caption(f"อัปเดตล่าสุด: {datetime.now().strftime('%H:%M:%S')}")
+if cache_warmup.running:
+    st.caption(f"⏳ Warming caches in the background ({cache_warmup.progress:.0%})")
 
 # --- Load Data ---
-@st.cache_data(ttl=5)
-def load_monitoring_data():
-    """โหลดข้อมูลล่าสุดสำหรับ monitoring"""
-    df_sf = load_data_from_mongo("telemetry_data_clean", "SmartFarm", time_delta_days=1)
-    df_rpi = load_data_from_mongo("raspberry_pi_telemetry_clean", "raspberry_pi_status", time_delta_days=1)
-    return df_sf, df_rpi
-
-df_smartfarm, df_rpi = load_monitoring_data()
+SMARTFARM_SOURCE = DATA_SOURCES["SmartFarm"]
+RPI_SOURCE = DATA_SOURCES["Raspberry Pi"]
+
+# กราฟครึ่งหน้าจอกว้างราว 600 px จึงไม่จำเป็นต้องส่งจุดมากกว่านี้
+TREND_MAX_POINTS = point_budget(600)
+SOIL_COLUMNS = ['soil_raw_1', 'soil_raw_2', 'soil_raw_3', 'soil_raw_4']
+
+def trend_chart_data(recent, columns):
+    """ลดจำนวนจุดแบบ min/max แล้วจัดรูปแบบสำหรับ st.line_chart"""
+    chart_data, _ = downsample(recent, 'timestamp_local_dt', columns, TREND_MAX_POINTS, 'minmax')
+    return chart_data.set_index('timestamp_local_dt')[columns]
+
+# ทุก loader/ตัวคำนวณรับเวอร์ชันข้อมูลจาก get_data_version เป็น key
+# fragment ที่ rerun โดยไม่มีข้อมูลใหม่จึงอ่านผลเดิมจาก cache ทั้งหมด
+
+@st.cache_data(ttl=300, max_entries=8)
+def load_monitoring_data(source, version):
+    """โหลดข้อมูล 1 วันล่าสุดของแหล่งข้อมูล (โหลดใหม่เมื่อเวอร์ชันข้อมูลเปลี่ยน)"""
+    return load_data_from_mongo(*source, time_delta_days=1, data_version=version)
+
+@st.cache_data(ttl=300, max_entries=8)
+def build_kpi_view(source, version):
+    """คำนวณค่าสำหรับการ์ด KPI (แถวล่าสุดและค่าเฉลี่ย) ครั้งเดียวต่อเวอร์ชันข้อมูล"""
+    df = load_monitoring_data(source, version)
+    if df.empty:
+        return None
+    return {
+        'latest': df.sort_values('timestamp_local_dt').iloc[-1],
+        'means': df.select_dtypes('number').mean(),
+    }
+
+@st.cache_data(ttl=300, max_entries=8)
+def build_trend_view(source, version, columns_groups):
+    """เตรียมข้อมูลกราฟแนวโน้ม 3 ชั่วโมง (ลดจำนวนจุดแล้ว) ครั้งเดียวต่อเวอร์ชันข้อมูล"""
+    df = load_monitoring_data(source, version)
+    if df.empty:
+        return None
+    recent = df[df['timestamp_local_dt'] > datetime.now() - timedelta(hours=3)]
+    if recent.empty:
+        return {}
+    return {name: trend_chart_data(recent, list(columns)) for name, columns in columns_groups}
 
 # --- Section 1: SmartFarm Status Cards ---
-st.subheader("🏡 สถานะ SmartFarm")
-
-if not df_smartfarm.empty:
-    latest_sf = df_smartfarm.sort_values('timestamp_local_dt').iloc[-1]
-    
-    # คำนวณ VPD
-    vpd = calculate_vpd(latest_sf['temperature'], latest_sf['humidity'])
-    vpd_status, vpd_color = get_vpd_status(vpd)
-    
+@st.fragment(run_every=KPI_REFRESH)
+@timed('home.smartfarm_status', refresh=True)
+def smartfarm_status_section():
+    st.caption(f"อัปเดตล่าสุด: {datetime.now().strftime('%H:%M:%S')}")
+    st.subheader("🏡 สถานะ SmartFarm")
+
+    sf_view = build_kpi_view(SMARTFARM_SOURCE, get_data_version(*SMARTFARM_SOURCE))
+    if sf_view is None:
+        st.warning("❌ ไม่พบข้อมูลจาก SmartFarm")
+        return
+
+    latest_sf, means = sf_view['latest'], sf_view['means']
+
+    # VPD จากการประเมินล่าสุดของ Alert scheduler (ชุดเดียวกับที่ใช้แจ้งเตือน) คำนวณเองเมื่อ scheduler ยังไม่มีผล
+    sf_results = alert_scheduler.latest_results("SmartFarm")
+    if sf_results and 'vpd' in sf_results:
+        vpd, vpd_status = sf_results['vpd']['value'], sf_results['vpd']['status']
+    else:
+        vpd = calculate_vpd(latest_sf['temperature'], latest_sf['humidity'])
+        vpd_status, _ = get_vpd_status(vpd)
+
     # แสดงการ์ด KPI
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
         st.metric(
             "🌡️ อุณหภูมิ",
             f"{latest_sf['temperature']:.1f} °C",
-            f"{latest_sf['temperature'] - df_smartfarm['temperature'].mean():.1f}°",
+            f"{latest_sf['temperature'] - means['temperature']:.1f}°",
             delta_color="inverse" if latest_sf['temperature'] > 35 else "normal"
         )
-    
+
     with col2:
         st.metric(
             "💧 ความชื้น",
             f"{latest_sf['humidity']:.1f} %",
-            f"{latest_sf['humidity'] - df_smartfarm['humidity'].mean():.1f}%"
+            f"{latest_sf['humidity'] - means['humidity']:.1f}%"
         )
-    
+
     with col3:
         st.metric(
             "💨 VPD",
             f"{vpd:.2f} kPa",
             help="Vapor Pressure Deficit - ค่าที่เหมาะสม 0.5-1.5 kPa"
         )
-    
+
     with col4:
         if vpd_status == "✅ เหมาะสม":
             st.success(vpd_status)
         else:
             st.warning(vpd_status)
-    
+
     # แสดงความชื้นดิน
     with st.container():
         st.caption("🌱 ความชื้นดิน")
@@ -80,19 +141,26 @@ if not df_smartfarm.empty:
                 # แปลงค่า raw เป็นเปอร์เซ็นต์ (สมมติว่า 0-1023)
                 soil_pct = (soil_val / 1023) * 100
                 col.metric(f"จุดที่ {i}", f"{soil_pct:.0f}%", f"{soil_val:.0f}")
-else:
-    st.warning("❌ ไม่พบข้อมูลจาก SmartFarm")
+
+smartfarm_status_section()
 
 st.divider()
 
 # --- Section 2: Raspberry Pi Status Cards ---
-st.subheader("🖥️ สถานะ Raspberry Pi")
+@st.fragment(run_every=KPI_REFRESH)
+@timed('home.rpi_status', refresh=True)
+def rpi_status_section():
+    st.subheader("🖥️ สถานะ Raspberry Pi")
+
+    rpi_view = build_kpi_view(RPI_SOURCE, get_data_version(*RPI_SOURCE))
+    if rpi_view is None:
+        st.warning("❌ ไม่พบข้อมูลจาก Raspberry Pi")
+        return
+
+    latest_rpi = rpi_view['latest']
 
-if not df_rpi.empty:
-    latest_rpi = df_rpi.sort_values('timestamp_local_dt').iloc[-1]
-    
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
         cpu_temp = latest_rpi['cpu_temp']
         st.metric(
@@ -100,7 +168,7 @@ if not df_rpi.empty:
             f"{cpu_temp:.1f} °C",
             delta_color="inverse" if cpu_temp > 70 else "normal"
         )
-    
+
     with col2:
         cpu_usage = latest_rpi['cpu_percent']
         st.metric(
@@ -108,7 +176,7 @@ if not df_rpi.empty:
             f"{cpu_usage:.1f} %",
             delta_color="inverse" if cpu_usage > 80 else "normal"
         )
-    
+
     with col3:
         mem = latest_rpi['memory_percent']
         st.metric(
@@ -116,7 +184,7 @@ if not df_rpi.empty:
             f"{mem:.1f} %",
             delta_color="inverse" if mem > 80 else "normal"
         )
-    
+
     with col4:
         storage = latest_rpi['disk_percent']
         st.metric(
@@ -124,65 +192,64 @@ if not df_rpi.empty:
             f"{storage:.1f} %",
             delta_color="inverse" if storage > 90 else "normal"
         )
-    
+
     # System Health Summary
-    issues = []
-    if cpu_temp > 70:
-        issues.append("⚠️ CPU ร้อนเกินไป")
-    if cpu_usage > 80:
-        issues.append("⚠️ CPU ใช้งานสูง")
-    if mem > 80:
-        issues.append("⚠️ หน่วยความจำใกล้เต็ม")
-    if storage > 90:
-        issues.append("⚠️ พื้นที่จัดเก็บใกล้เต็ม")
-    
+    rpi_results = alert_scheduler.latest_results("Raspberry Pi")
+    if rpi_results is not None and any(result.get('stale') for result in rpi_results.values()):
+        # scheduler หยุดประเมินเมื่ออุปกรณ์ไม่ส่งข้อมูลใหม่ ค่าด้านบนจึงไม่ใช่สถานะปัจจุบัน
+        st.warning("⏸️ Raspberry Pi ไม่ได้ส่งข้อมูลใหม่ (ค่าที่แสดงเป็นค่าล่าสุดที่ได้รับ)")
+        return
+    if rpi_results is not None:
+        issues = [alert['message'] for alert in alert_scheduler.active_alerts("Raspberry Pi", include_stale=False)]
+    else:
+        issues = check_rules(latest_rpi, RPI_HEALTH_RULES)
+
     if issues:
         st.error(" | ".join(issues))
     else:
         st.success("✅ ระบบทำงานปกติ")
-else:
-    st.warning("❌ ไม่พบข้อมูลจาก Raspberry Pi")
+
+rpi_status_section()
 
 st.divider()
 
 # --- Section 3: Quick Trend Charts ---
-st.subheader("📈 แนวโน้มล่าสุด (3 ชั่วโมงที่ผ่านมา)")
+SF_TRENDS = (('climate', ('temperature', 'humidity')), ('soil', tuple(SOIL_COLUMNS)))
+RPI_TRENDS = (('system', ('cpu_percent', 'memory_percent')),)
 
-# กรองข้อมูล 3 ชั่วโมงล่าสุด
-from datetime import timedelta
-time_filter = datetime.now() - timedelta(hours=3)
+@st.fragment(run_every=TREND_REFRESH)
+@timed('home.trends', refresh=True)
+def trend_section():
+    st.subheader("📈 แนวโน้มล่าสุด (3 ชั่วโมงที่ผ่านมา)")
 
-col1, col2 = st.columns(2)
+    sf_trends = build_trend_view(SMARTFARM_SOURCE, get_data_version(*SMARTFARM_SOURCE), SF_TRENDS)
+    rpi_trends = build_trend_view(RPI_SOURCE, get_data_version(*RPI_SOURCE), RPI_TRENDS)
 
-with col1:
-    if not df_smartfarm.empty:
-        st.caption("🌡️ อุณหภูมิและความชื้น")
-        recent_sf = df_smartfarm[df_smartfarm['timestamp_local_dt'] > time_filter]
-        if not recent_sf.empty:
-            chart_data = recent_sf.set_index('timestamp_local_dt')[['temperature', 'humidity']]
-            st.line_chart(chart_data, height=250)
-        else:
-            st.info("ไม่มีข้อมูลในช่วง 3 ชั่วโมงที่ผ่านมา")
-
-with col2:
-    if not df_rpi.empty:
-        st.caption("🖥️ ประสิทธิภาพระบบ")
-        recent_rpi = df_rpi[df_rpi['timestamp_local_dt'] > time_filter]
-        if not recent_rpi.empty:
-            chart_data = recent_rpi.set_index('timestamp_local_dt')[['cpu_percent', 'memory_percent']]
-            st.line_chart(chart_data, height=250)
-        else:
-            st.info("ไม่มีข้อมูลในช่วง 3 ชั่วโมงที่ผ่านมา")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        if sf_trends is not None:
+            st.caption("🌡️ อุณหภูมิและความชื้น")
+            if 'climate' in sf_trends:
+                st.line_chart(sf_trends['climate'], height=250)
+            else:
+                st.info("ไม่มีข้อมูลในช่วง 3 ชั่วโมงที่ผ่านมา")
+
+    with col2:
+        if rpi_trends is not None:
+            st.caption("🖥️ ประสิทธิภาพระบบ")
+            if 'system' in rpi_trends:
+                st.line_chart(rpi_trends['system'], height=250)
+            else:
+                st.info("ไม่มีข้อมูลในช่วง 3 ชั่วโมงที่ผ่านมา")
+
+    # Soil moisture trends
+    if sf_trends and 'soil' in sf_trends:
+        st.caption("🌱 แนวโน้มความชื้นดิน")
+        st.line_chart(sf_trends['soil'], height=200)
 
-# Soil moisture trends
-if not df_smartfarm.empty:
-    st.caption("🌱 แนวโน้มความชื้นดิน")
-    recent_sf = df_smartfarm[df_smartfarm['timestamp_local_dt'] > time_filter]
-    if not recent_sf.empty:
-        soil_cols = ['soil_raw_1', 'soil_raw_2', 'soil_raw_3', 'soil_raw_4']
-        chart_data = recent_sf.set_index('timestamp_local_dt')[soil_cols]
-        st.line_chart(chart_data, height=200)
+trend_section()
 
 # --- Footer ---
 st.divider()
-st.caption("💡 หน้านี้อัปเดตอัตโนมัติทุก 5 วินาที | ใช้หน้า 'เครื่องมือวิเคราะห์' สำหรับการวิเคราะห์เชิงลึก")
\ No newline at end of file
+st.caption("💡 การ์ดสถานะอัปเดตทุก 5 วินาที กราฟแนวโน้มทุก 1 นาที | ใช้หน้า 'เครื่องมือวิเคราะห์' สำหรับการวิเคราะห์เชิงลึก")
@@ -0,0 +1,358 @@
+import streamlit as st
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from utils import (
+    load_latest_reading, calculate_vpd, get_vpd_status, check_thresholds, RPI_HEALTH_RULES
+)
+
+logger = logging.getLogger(__name__)
+
+# การตั้งค่าของ Alert scheduler
+ALERT_INTERVAL_SECONDS = 5
+RENOTIFY_AFTER_SECONDS = 15 * 60
+# เอกสารล่าสุดที่เก่ากว่านี้ถือว่าอุปกรณ์หยุดส่งข้อมูล (ไม่ประเมินซ้ำและไม่แจ้งเตือนซ้ำ)
+MAX_READING_AGE_SECONDS = 10 * 60
+MAX_NOTIFICATIONS_PER_MINUTE = 10
+ALERT_STATE_PATH = Path(__file__).with_name("alert_state.json")
+
+# --- 1. กฎการประเมินของแต่ละแหล่งข้อมูล ---
+
+def evaluate_smartfarm(reading: Dict) -> List[Dict]:
+    """
+    ประเมินค่า VPD ของ SmartFarm ด้วย get_vpd_status
+
+    Args:
+        reading: เอกสารล่าสุดจาก MongoDB
+
+    Returns:
+        รายการผลการประเมิน {'column', 'level', 'message', 'value', 'status'}
+    """
+    if reading.get('temperature') is None or reading.get('humidity') is None:
+        return []
+    vpd = calculate_vpd(reading['temperature'], reading['humidity'])
+    status, _ = get_vpd_status(vpd)
+    level = 'normal' if status == "✅ เหมาะสม" else 'warning'
+    return [{'column': 'vpd', 'level': level, 'message': f"VPD {status}", 'value': vpd, 'status': status}]
+
+def evaluate_rpi(reading: Dict) -> List[Dict]:
+    """
+    ประเมินสุขภาพของ Raspberry Pi ตาม RPI_HEALTH_RULES ด้วย check_thresholds
+
+    Args:
+        reading: เอกสารล่าสุดจาก MongoDB
+
+    Returns:
+        รายการผลการประเมิน {'column', 'level', 'message', 'value'}
+    """
+    results = []
+    for column, rule in RPI_HEALTH_RULES.items():
+        value = reading.get(column)
+        if value is None:
+            continue
+        level, _ = check_thresholds(value, rule['thresholds'], column)
+        results.append({'column': column, 'level': level, 'message': rule['message'], 'value': value})
+    return results
+
+ALERT_SOURCES = {
+    "SmartFarm": {
+        "collection": "telemetry_data_clean",
+        "device": "SmartFarm",
+        "evaluate": evaluate_smartfarm,
+    },
+    "Raspberry Pi": {
+        "collection": "raspberry_pi_telemetry_clean",
+        "device": "raspberry_pi_status",
+        "evaluate": evaluate_rpi,
+    },
+}
+
+# --- 2. ช่องทางแจ้งเตือน (Notification Sinks) ---
+
+class LocalSink:
+    """
+    Sink สำหรับใช้งานในเครื่อง: เขียน log และเก็บการแจ้งเตือนล่าสุดไว้ในหน่วยความจำ
+    """
+
+    def __init__(self, max_events: int = 200):
+        self.events = deque(maxlen=max_events)
+
+    def send(self, event: Dict):
+        logger.warning("[alert] %s %s: %s", event['type'], event['key'], event['message'])
+        self.events.append(event)
+
+class WebhookSink:
+    """
+    Sink ที่ส่ง event เป็น JSON ไปยัง webhook (เช่น LINE Notify proxy, Slack, n8n)
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, event: Dict):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(event, ensure_ascii=False, default=str).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+# --- 3. Scheduler ---
+
+class AlertScheduler:
+    """
+    ประเมิน Alert เบื้องหลังเพียงชุดเดียวต่อ process ตามรอบเวลาที่กำหนด
+
+    ทุกรอบจะดึงเฉพาะเอกสารล่าสุดของแต่ละแหล่งข้อมูล ประเมินกฎ แล้วส่งแจ้งเตือนเมื่อสถานะเปลี่ยน
+    (เกิดใหม่, เปลี่ยนระดับ, กลับสู่ปกติ) หรือเมื่อ Alert ยังค้างอยู่เกิน renotify_after วินาที
+    การแจ้งเตือนถูกจำกัดจำนวนต่อนาที และสถานะถูกบันทึกลงไฟล์เพื่อให้คงอยู่หลัง restart
+    (Alert ที่โหลดจากไฟล์ถูกทำเครื่องหมาย stale จนกว่าแหล่งข้อมูลของมันจะถูกประเมินใหม่)
+    ถ้าเอกสารล่าสุดเก่ากว่า max_reading_age วินาที แหล่งข้อมูลนั้นจะไม่ถูกประเมิน Alert ของมันถูกทำเครื่องหมาย stale
+    และไม่ถูกแจ้งเตือนซ้ำจนกว่าจะมีข้อมูลใหม่
+
+    Args:
+        sources: Dictionary ของแหล่งข้อมูล {ชื่อ: {'collection', 'device', 'evaluate'}}
+        sinks: รายการ sink ที่มีเมธอด send(event)
+        interval: รอบเวลาการประเมิน (วินาที)
+        state_path: ไฟล์สำหรับบันทึกสถานะ Alert (None = ไม่บันทึก)
+        renotify_after: เวลาขั้นต่ำก่อนแจ้งเตือน Alert เดิมซ้ำ (วินาที)
+        max_per_minute: จำนวนการแจ้งเตือนสูงสุดต่อนาที
+        fetch_latest: ฟังก์ชันดึงเอกสารล่าสุด (collection, device) -> dict
+        max_reading_age: อายุสูงสุดของเอกสารล่าสุดที่ยังถูกประเมิน (วินาที, None = ไม่ตรวจ)
+    """
+
+    def __init__(
+        self,
+        sources: Dict[str, Dict] = ALERT_SOURCES,
+        sinks: Optional[List] = None,
+        interval: float = ALERT_INTERVAL_SECONDS,
+        state_path: Optional[Path] = ALERT_STATE_PATH,
+        renotify_after: float = RENOTIFY_AFTER_SECONDS,
+        max_per_minute: int = MAX_NOTIFICATIONS_PER_MINUTE,
+        fetch_latest: Callable[[str, str], Optional[Dict]] = load_latest_reading,
+        max_reading_age: Optional[float] = MAX_READING_AGE_SECONDS
+    ):
+        self.sources = sources
+        self.sinks = sinks if sinks is not None else [LocalSink()]
+        self.interval = interval
+        self.state_path = state_path
+        self.renotify_after = renotify_after
+        self.max_per_minute = max_per_minute
+        self.fetch_latest = fetch_latest
+        self.max_reading_age = max_reading_age
+
+        self.last_evaluated: Optional[float] = None
+        self.suppressed_count = 0
+        self._alerts: Dict[str, Dict] = {}
+        self._results: Dict[str, Dict] = {}
+        self._sent_times = deque()
+        self._pending: List[Dict] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load_state()
+
+    # --- สถานะ ---
+
+    def _load_state(self):
+        if not self.state_path or not Path(self.state_path).exists():
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                self._alerts = json.load(f).get('alerts', {})
+            # ยังไม่รู้ว่า Alert จากรอบก่อน restart ยังเป็นจริงหรือไม่
+            for alert in self._alerts.values():
+                alert['stale'] = True
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load alert state from %s: %s", self.state_path, e)
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'alerts': self._alerts, 'saved_at': time.time()}, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning("Could not save alert state to %s: %s", self.state_path, e)
+
+    def active_alerts(self, source: Optional[str] = None, include_stale: bool = True) -> List[Dict]:
+        """
+        คืนรายการ Alert ที่ยัง active อยู่ (สำหรับให้หน้าเว็บอ่านแทนการคำนวณเอง)
+
+        Args:
+            source: ชื่อแหล่งข้อมูลที่ต้องการ (None = ทั้งหมด)
+            include_stale: รวม Alert ที่ยังไม่ถูกประเมินใหม่ (โหลดจากไฟล์ หรืออุปกรณ์หยุดส่งข้อมูล) หรือไม่
+
+        Returns:
+            รายการ Alert เรียงตามเวลาที่เริ่มเกิด
+        """
+        with self._lock:
+            alerts = [
+                dict(a) for a in self._alerts.values()
+                if (source is None or a['source'] == source) and (include_stale or not a.get('stale'))
+            ]
+        return sorted(alerts, key=lambda a: a['first_seen'])
+
+    def latest_results(self, source: str) -> Optional[Dict[str, Dict]]:
+        """
+        ผลการประเมินรอบล่าสุดของแหล่งข้อมูล (ทุกระดับรวม normal) เพื่อให้หน้าเว็บแสดงสถานะเดียวกับ scheduler
+
+        Returns:
+            {column: ผลการประเมิน} หรือ None ถ้ายังไม่เคยประเมินแหล่งข้อมูลนี้สำเร็จ
+        """
+        with self._lock:
+            evaluation = self._results.get(source)
+            return {column: dict(result) for column, result in evaluation.items()} if evaluation is not None else None
+
+    # --- การแจ้งเตือน ---
+
+    def _notify(self, event: Dict, now: float) -> bool:
+        # จองโควตาการแจ้งเตือน event จะถูกส่งจริงหลังปล่อย lock ใน run_once
+        while self._sent_times and now - self._sent_times[0] >= 60:
+            self._sent_times.popleft()
+        if len(self._sent_times) >= self.max_per_minute:
+            self.suppressed_count += 1
+            return False
+        self._sent_times.append(now)
+        self._pending.append(event)
+        return True
+
+    def _dispatch(self, events: List[Dict]):
+        for event in events:
+            for sink in self.sinks:
+                try:
+                    sink.send(event)
+                except Exception as e:
+                    logger.warning("Alert sink %s failed: %s", type(sink).__name__, e)
+
+    def _process(self, source: str, results: List[Dict], now: float) -> bool:
+        changed = False
+        for result in results:
+            key = f"{source}:{result['column']}"
+            current = self._alerts.get(key)
+
+            if result['level'] in ('warning', 'critical'):
+                if current is None or current['level'] != result['level']:
+                    current = {
+                        'key': key, 'source': source, 'column': result['column'],
+                        'level': result['level'], 'message': result['message'],
+                        'first_seen': now, 'last_notified': None,
+                    }
+                    self._alerts[key] = current
+                    changed = True
+                current.update(value=result['value'], message=result['message'], last_seen=now, stale=False)
+                last_notified = current['last_notified']
+                if last_notified is None or now - last_notified >= self.renotify_after:
+                    event_type = 'triggered' if last_notified is None else 'reminder'
+                    if self._notify(dict(current, type=event_type), now):
+                        current['last_notified'] = now
+                        changed = True
+
+            elif result['level'] == 'normal' and current is not None:
+                # แจ้งกลับสู่ปกติเฉพาะ Alert ที่เคยแจ้งไปแล้ว
+                if current['last_notified'] is not None:
+                    self._notify(dict(current, type='resolved', value=result['value'], last_seen=now), now)
+                del self._alerts[key]
+                changed = True
+        return changed
+
+    def _is_outdated(self, reading: Dict, now: float) -> bool:
+        """เอกสารเก่ากว่า max_reading_age หรือไม่ (เอกสารที่ไม่มีหรืออ่าน timestamp_utc ไม่ได้ถือว่าใหม่)"""
+        if self.max_reading_age is None or not reading.get('timestamp_utc'):
+            return False
+        try:
+            timestamp = pd.Timestamp(reading['timestamp_utc'])
+        except (TypeError, ValueError):
+            return False
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize('UTC')
+        return now - timestamp.timestamp() > self.max_reading_age
+
+    def _mark_stale(self, source: str) -> bool:
+        changed = False
+        for alert in self._alerts.values():
+            if alert['source'] == source and not alert.get('stale'):
+                alert['stale'] = True
+                changed = True
+        for result in self._results.get(source, {}).values():
+            result['stale'] = True
+        return changed
+
+    def run_once(self):
+        """ประเมินกฎของทุกแหล่งข้อมูลหนึ่งรอบ (last_evaluated เปลี่ยนเฉพาะเมื่อประเมินได้อย่างน้อยหนึ่งแหล่ง)"""
+        now = time.time()
+        changed = False
+        evaluated = False
+        for source, config in self.sources.items():
+            try:
+                reading = self.fetch_latest(config['collection'], config['device'])
+            except Exception as e:
+                logger.warning("Alert evaluation for %s failed: %s", source, e)
+                continue
+            if not reading:
+                continue
+            if self._is_outdated(reading, now):
+                # อุปกรณ์หยุดส่งข้อมูล: ค่าเดิมไม่ใช่สถานะปัจจุบัน จึงไม่ประเมินและไม่แจ้งเตือนซ้ำ
+                with self._lock:
+                    changed = self._mark_stale(source) or changed
+                continue
+            results = config['evaluate'](reading)
+            evaluated = True
+            with self._lock:
+                changed = self._process(source, results, now) or changed
+                self._results[source] = {result['column']: dict(result, evaluated_at=now) for result in results}
+        with self._lock:
+            if evaluated:
+                self.last_evaluated = now
+            if changed:
+                self._save_state()
+            events, self._pending = self._pending, []
+        self._dispatch(events)
+
+    # --- Thread ---
+
+    def _loop(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Alert scheduler iteration failed")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        """เริ่ม thread เบื้องหลัง (เรียกซ้ำได้อย่างปลอดภัย)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="alert-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """หยุด thread เบื้องหลัง"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+@st.cache_resource
+def get_alert_scheduler() -> AlertScheduler:
+    """
+    คืน AlertScheduler ตัวเดียวของ process (สร้างและเริ่มทำงานในครั้งแรกที่ถูกเรียก)
+    """
+    scheduler = AlertScheduler()
+    scheduler.start()
+    return scheduler
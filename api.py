@@ -0,0 +1,307 @@
+"""
+Telemetry service ที่เป็นเจ้าของ connection ของ MongoDB, cache และ rollup
+ให้ทุก session และทุก replica ของ dashboard อ่านข้อมูลผ่าน service นี้แทนการ query MongoDB เอง
+
+    uvicorn api:app --host 0.0.0.0 --port 8600
+    TELEMETRY_API_URL=http://localhost:8600 python warmup.py
+
+ทุก endpoint ส่ง ETag ที่ผูกกับเวอร์ชันของข้อมูลและพารามิเตอร์ของ request
+client ที่ส่ง If-None-Match ตรงกันจะได้ 304 โดยไม่ต้องรับข้อมูลซ้ำ
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+
+from utils import DATA_SOURCES, UTC_OFFSET, fetch_telemetry, probe_data_version, calculate_statistics
+from rollups import RollupStore, ROLLUP_AGGREGATIONS, DEFAULT_MAX_POINTS
+from metrics import render_metrics
+
+# การตั้งค่าของ service
+API_RETENTION_DAYS = 7
+VERSION_PROBE_SECONDS = 2.0
+API_FORMATS = ['arrow', 'json']
+
+# --- 1. Cache ของแต่ละแหล่งข้อมูล ---
+
+class SourceCache:
+    """
+    เก็บข้อมูลดิบย้อนหลัง retention_days วันของแหล่งข้อมูลหนึ่งไว้ในหน่วยความจำ พร้อม RollupStore
+
+    ทุก request จะตรวจเวอร์ชันของข้อมูล (ไม่เกินทุก probe_interval วินาที) และดึงเฉพาะแถวที่ใหม่กว่า
+    แถวล่าสุดที่มีอยู่เมื่อเวอร์ชันเปลี่ยน จำนวน query ไปยัง MongoDB จึงไม่ขึ้นกับจำนวนผู้ชม
+
+    Args:
+        name: ชื่อแหล่งข้อมูล
+        collection_name: ชื่อ collection ใน MongoDB
+        device_name: ชื่ออุปกรณ์
+        retention_days: จำนวนวันที่เก็บไว้ในหน่วยความจำ
+        probe_interval: ระยะห่างขั้นต่ำระหว่างการตรวจเวอร์ชัน (วินาที)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection_name: str,
+        device_name: str,
+        retention_days: int = API_RETENTION_DAYS,
+        probe_interval: float = VERSION_PROBE_SECONDS
+    ):
+        self.name = name
+        self.collection_name = collection_name
+        self.device_name = device_name
+        self.retention = timedelta(days=retention_days)
+        self.probe_interval = probe_interval
+        self.version: Optional[str] = None
+        self.frame = pd.DataFrame()
+        self.covered_from: Optional[datetime] = None
+        self.rollups = RollupStore(retention=f'{retention_days}D')
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> str:
+        """ตรวจเวอร์ชันและดึงแถวใหม่ถ้ามี คืนเวอร์ชันปัจจุบัน"""
+        with self._lock:
+            now = time.monotonic()
+            if self.version is not None and now - self._checked_at < self.probe_interval:
+                return self.version
+            self._checked_at = now
+            version = probe_data_version(self.collection_name, self.device_name)
+            if version != self.version:
+                self._load_new_rows()
+                self.version = version
+            return self.version
+
+    def _load_new_rows(self):
+        window_start = datetime.utcnow() - self.retention
+        end_utc = datetime.utcnow() + timedelta(minutes=1)
+        if self.frame.empty:
+            start_utc = window_start
+        else:
+            # $gte จะดึงแถวที่เวลาเท่ากับแถวล่าสุดซ้ำ จึงตัดซ้ำด้วย _id
+            start_utc = self.frame['timestamp_utc_dt'].max().to_pydatetime()
+
+        new_rows = fetch_telemetry(self.collection_name, self.device_name, start_utc, end_utc)
+        # หน่วยความจำครอบคลุมตั้งแต่ window_start แม้ว่าแถวแรกจะใหม่กว่านั้น (ไม่มีข้อมูลในช่วงต้น)
+        self.covered_from = window_start
+        if new_rows.empty:
+            if not self.frame.empty:
+                self.frame = self.frame[self.frame['timestamp_utc_dt'] >= window_start].reset_index(drop=True)
+            return
+        new_rows['_id'] = new_rows['_id'].astype(str)
+        combined = pd.concat([self.frame, new_rows]) if not self.frame.empty else new_rows
+        combined = combined.drop_duplicates('_id', keep='last').sort_values('timestamp_utc_dt', ignore_index=True)
+        self.frame = combined[combined['timestamp_utc_dt'] >= window_start].reset_index(drop=True)
+        self.rollups.update(new_rows)
+
+    def window_start(self) -> Optional[datetime]:
+        """เวลาท้องถิ่นเริ่มต้นของช่วงที่หน่วยความจำครอบคลุม (None = ยังไม่เคยโหลด)"""
+        return self.covered_from + UTC_OFFSET if self.covered_from is not None else None
+
+    def slice(self, start: Optional[datetime], end: Optional[datetime]) -> pd.DataFrame:
+        """
+        คืนข้อมูลดิบในช่วงเวลาท้องถิ่น [start, end) ถ้า start เก่ากว่าช่วงที่หน่วยความจำครอบคลุมจะดึงจาก MongoDB โดยตรง
+        """
+        frame = self.frame
+        first = self.window_start()
+        if start is not None and (first is None or pd.Timestamp(start) < pd.Timestamp(first)):
+            end_utc = (end - UTC_OFFSET) if end is not None else datetime.utcnow() + timedelta(minutes=1)
+            df = fetch_telemetry(self.collection_name, self.device_name, start - UTC_OFFSET, end_utc)
+            if not df.empty:
+                df['_id'] = df['_id'].astype(str)
+                df = df.sort_values('timestamp_utc_dt', ignore_index=True)
+            return df
+        if frame.empty:
+            return frame
+        times = frame['timestamp_local_dt'].to_numpy()
+        lo = times.searchsorted(pd.Timestamp(start).to_datetime64()) if start is not None else 0
+        hi = times.searchsorted(pd.Timestamp(end).to_datetime64()) if end is not None else len(times)
+        return frame.iloc[lo:hi]
+
+_caches: Dict[str, SourceCache] = {
+    name: SourceCache(name, collection_name, device_name)
+    for name, (collection_name, device_name) in DATA_SOURCES.items()
+}
+
+def get_source(source: str) -> SourceCache:
+    if source not in _caches:
+        raise HTTPException(status_code=404, detail=f"Unknown source '{source}'. Use one of {list(_caches)}.")
+    return _caches[source]
+
+# --- 2. การตอบกลับ ---
+
+def _etag(*parts) -> str:
+    return 'W/"' + hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+def _respond(request: Request, etag: str, build: Callable[[], Response]) -> Response:
+    """ตอบ 304 ถ้า If-None-Match ตรงกับ etag มิฉะนั้นสร้างผลลัพธ์ด้วย build()"""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+    response = build()
+    response.headers.update(headers)
+    return response
+
+def _json_response(payload) -> Response:
+    return Response(json.dumps(payload, ensure_ascii=False, default=str), media_type='application/json')
+
+def _frame_response(df: pd.DataFrame, format_type: str) -> Response:
+    """ส่ง DataFrame เป็น Arrow IPC stream (บีบอัด zstd) หรือ JSON แบบ split"""
+    if format_type == 'arrow':
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue().to_pybytes(), media_type='application/vnd.apache.arrow.stream')
+    return Response(df.to_json(orient='split', index=False, date_format='iso'), media_type='application/json')
+
+def _parse_columns(df: pd.DataFrame, columns: Optional[str], keep: List[str]) -> pd.DataFrame:
+    if not columns:
+        return df
+    requested = [c.strip() for c in columns.split(',') if c.strip()]
+    missing = [c for c in requested if c not in df.columns]
+    if missing and not df.empty:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {missing}")
+    return df[[c for c in keep if c in df.columns and c not in requested] + [c for c in requested if c in df.columns]]
+
+def _local_time(value: Optional[datetime]) -> Optional[datetime]:
+    """แปลงเวลาที่มี timezone (เช่น ...T00:00:00+07:00 หรือ ...Z) เป็นเวลาท้องถิ่นแบบไม่มี timezone ที่ทุก cache ใช้"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone(UTC_OFFSET)).replace(tzinfo=None)
+
+def _check_format(format_type: str):
+    if format_type not in API_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format_type}'. Use one of {API_FORMATS}.")
+
+# --- 3. Endpoints ---
+
+app = FastAPI(title="SmartFarm Telemetry API")
+
+@app.get("/healthz")
+def healthz():
+    return {name: {'version': cache.version, 'rows': len(cache.frame)} for name, cache in _caches.items()}
+
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.get("/v1/sources")
+def list_sources():
+    return {'sources': list(_caches)}
+
+@app.get("/v1/sources/{source}/version")
+def get_version(source: str, request: Request):
+    version = get_source(source).refresh()
+    return _respond(request, _etag('version', source, version), lambda: _json_response({'version': version}))
+
+@app.get("/v1/sources/{source}/latest")
+def get_latest(source: str, request: Request):
+    cache = get_source(source)
+    version = cache.refresh()
+
+    def build():
+        frame = cache.frame
+        latest = None
+        if not frame.empty:
+            latest = json.loads(frame.iloc[[-1]].to_json(orient='records', date_format='iso'))[0]
+        return _json_response({'version': version, 'latest': latest})
+
+    return _respond(request, _etag('latest', source, version), build)
+
+@app.get("/v1/sources/{source}/range")
+def get_range(
+    source: str,
+    request: Request,
+    start: Optional[datetime] = Query(None, description="เวลาท้องถิ่น (UTC+7)"),
+    end: Optional[datetime] = Query(None, description="เวลาท้องถิ่น (UTC+7)"),
+    days: Optional[float] = Query(None, description="ย้อนหลังจากปัจจุบัน (ใช้แทน start และ end)"),
+    columns: Optional[str] = Query(None, description="คอลัมน์คั่นด้วยจุลภาค"),
+    format: str = 'arrow'
+):
+    _check_format(format)
+    start, end = _local_time(start), _local_time(end)
+    cache = get_source(source)
+    version = cache.refresh()
+    # ช่วงย้อนหลังถูกแปลงเป็นเวลาที่ฝั่ง service ส่วน ETag ผูกกับ days ไม่ใช่เวลาที่แปลงแล้ว
+    # URL และ ETag ของ client จึงคงเดิมจนกว่าเวอร์ชันของข้อมูลจะเปลี่ยน
+    etag = _etag('range', source, version, start, end, days, columns, format)
+    if days is not None:
+        start, end = datetime.utcnow() + UTC_OFFSET - timedelta(days=days), None
+    keep = ['timestamp_utc', 'timestamp_utc_dt', 'timestamp_local_dt']
+    return _respond(request, etag, lambda: _frame_response(_parse_columns(cache.slice(start, end), columns, keep), format))
+
+@app.get("/v1/sources/{source}/aggregate")
+def get_aggregate(
+    source: str,
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: str = 'auto',
+    agg: str = 'mean',
+    columns: Optional[str] = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    format: str = 'arrow'
+):
+    _check_format(format)
+    if agg not in ROLLUP_AGGREGATIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported aggregation '{agg}'. Use one of {ROLLUP_AGGREGATIONS}.")
+    start, end = _local_time(start), _local_time(end)
+    cache = get_source(source)
+    version = cache.refresh()
+    etag = _etag('aggregate', source, version, start, end, resolution, agg, columns, max_points, format)
+
+    def build():
+        requested = [c.strip() for c in columns.split(',')] if columns else None
+        try:
+            result = cache.rollups.query(start, end, resolution, agg, requested, max_points)
+        except (KeyError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return _frame_response(result.reset_index(), format)
+
+    return _respond(request, etag, build)
+
+@app.get("/v1/sources/{source}/stats")
+def get_stats(
+    source: str,
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    columns: Optional[str] = None
+):
+    start, end = _local_time(start), _local_time(end)
+    cache = get_source(source)
+    version = cache.refresh()
+
+    def build():
+        df = cache.slice(start, end)
+        numeric = df.select_dtypes('number').columns.tolist()
+        requested = [c.strip() for c in columns.split(',')] if columns else numeric
+        unknown = [c for c in requested if c not in numeric]
+        if unknown and not df.empty:
+            raise HTTPException(status_code=400, detail=f"Unknown or non-numeric columns: {unknown}")
+        stats = calculate_statistics(df, requested) if not df.empty else pd.DataFrame(columns=requested)
+        return _json_response(json.loads(stats.to_json(orient='split')))
+
+    return _respond(request, _etag('stats', source, version, start, end, columns), build)
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
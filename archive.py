@@ -0,0 +1,269 @@
+"""
+คลังข้อมูล telemetry ย้อนหลังแบบ Parquet แบ่ง partition แบบ Hive ตาม device/year/month/day (วันตามเวลา UTC)
+
+    python archive.py                                   # backfill ทุกแหล่งข้อมูลตั้งแต่เอกสารแรกจนถึงปัจจุบัน
+    python archive.py --sources SmartFarm --start 2025-01-01 --workers 8
+    python archive.py --overwrite --start 2025-06-01 --end 2025-07-01
+
+แต่ละวันของแต่ละอุปกรณ์เป็นหนึ่ง slice ที่ถูกดึงจาก MongoDB และเขียนเป็นไฟล์เดียวแบบ atomic
+slice ที่เสร็จแล้วถูกบันทึกใน _backfill_state.json การรันซ้ำหลังถูกขัดจังหวะจึงทำต่อเฉพาะ slice ที่เหลือ
+วันที่ยังไม่จบ (ใหม่กว่า SETTLE_DELAY) ถูกเขียนแต่ไม่ถูกบันทึกว่าเสร็จ จึงถูกดึงใหม่ในรอบถัดไป
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+# ไดเรกทอรีของคลังข้อมูล (หน้าเว็บอ่านคลังเฉพาะเมื่อไดเรกทอรีนี้มีอยู่)
+ARCHIVE_DIR = os.environ.get("TELEMETRY_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_WORKERS = 4
+# วันที่สิ้นสุดไม่ถึงช่วงนี้อาจยังมีเอกสารเข้ามาเพิ่ม
+SETTLE_DELAY = timedelta(hours=1)
+
+STATE_FILE = "_backfill_state.json"
+# pyarrow.dataset / pyarrow.parquet ถูก import เมื่ออ่านหรือเขียนคลังจริงเท่านั้น หน้าเว็บจึง import โมดูลนี้ได้โดยไม่เสียเวลา
+DAY_PARTITION_SCHEMA = pa.schema([('year', pa.int16()), ('month', pa.int8()), ('day', pa.int8())])
+
+def _partition_dir(root: str, device_name: str, day: datetime) -> str:
+    return os.path.join(root, f"device={device_name}", f"year={day.year}", f"month={day.month}", f"day={day.day}")
+
+# --- 1. Backfill ---
+
+class ArchiveBackfill:
+    """
+    ดึงข้อมูลจาก MongoDB ทีละวันแบบขนานแล้วเขียนลงคลัง Parquet
+
+    Args:
+        root: ไดเรกทอรีของคลังข้อมูล
+        compression: codec ของ Parquet (zstd, snappy, gzip, ...)
+        workers: จำนวน slice ที่ดึงพร้อมกัน (pymongo และการเขียน Parquet ปล่อย GIL ระหว่าง I/O)
+        overwrite: ดึงใหม่แม้ slice จะถูกบันทึกว่าเสร็จแล้ว
+    """
+
+    def __init__(
+        self,
+        root: str = ARCHIVE_DIR,
+        compression: str = ARCHIVE_COMPRESSION,
+        workers: int = ARCHIVE_WORKERS,
+        overwrite: bool = False
+    ):
+        self.root = root
+        self.compression = compression
+        self.workers = workers
+        self.overwrite = overwrite
+        self._state_path = os.path.join(root, STATE_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.completed: Dict[str, int] = self._load_state()
+
+    def _load_state(self) -> Dict[str, int]:
+        try:
+            with open(self._state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _mark_done(self, key: str, rows: int):
+        with self._lock:
+            self.completed[key] = rows
+            tmp_path = f"{self._state_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.completed, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self._state_path)
+
+    def plan(self, device_name: str, start: datetime, end: datetime) -> List[datetime]:
+        """คืนวัน (UTC) ในช่วง [start, end) ที่ยังต้องดึง"""
+        days = []
+        day = datetime(start.year, start.month, start.day)
+        while day < end:
+            if self.overwrite or f"{device_name}/{day:%Y-%m-%d}" not in self.completed:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def write_day(self, collection_name: str, device_name: str, day: datetime) -> int:
+        """ดึงข้อมูลหนึ่งวันของอุปกรณ์แล้วเขียนแทนที่ partition เดิม คืนจำนวนแถว"""
+        import pyarrow.parquet as pq
+        from utils import fetch_telemetry
+
+        df = fetch_telemetry(collection_name, device_name, day, day + timedelta(days=1))
+        directory = _partition_dir(self.root, device_name, day)
+        path = os.path.join(directory, "part-0.parquet")
+        if df.empty:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            df = df.drop(columns=['deviceName', 'timestamp_local_dt'], errors='ignore')
+            if '_id' in df.columns:
+                df['_id'] = df['_id'].astype(str)
+            # ค่าเซนเซอร์ที่บางวันเป็นจำนวนเต็มถูกเก็บเป็น float เพื่อให้ schema ของทุกวันรวมกันได้
+            integer_columns = df.select_dtypes(include='integer').columns
+            df[integer_columns] = df[integer_columns].astype('float64')
+            table = pa.Table.from_pandas(df.sort_values('timestamp_utc_dt'), preserve_index=False)
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = os.path.join(directory, f".part-0.{uuid.uuid4().hex}.tmp")
+            pq.write_table(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, path)
+        if day + timedelta(days=1) <= datetime.utcnow() - SETTLE_DELAY:
+            self._mark_done(f"{device_name}/{day:%Y-%m-%d}", len(df))
+        return len(df)
+
+    def run(self, sources: Dict[str, Tuple[str, str]], start: Optional[datetime], end: datetime) -> Dict[str, int]:
+        """
+        Backfill ทุกแหล่งข้อมูลในช่วง [start, end) (UTC)
+
+        Args:
+            sources: Dictionary ของแหล่งข้อมูล {ชื่อ: (collection, deviceName)}
+            start: วันเริ่มต้น (None = วันของเอกสารแรกของแต่ละแหล่งข้อมูล)
+            end: เวลาสิ้นสุด
+
+        Returns:
+            จำนวนแถวที่เขียนต่อแหล่งข้อมูล
+        """
+        tasks = []
+        for source, (collection_name, device_name) in sources.items():
+            source_start = start or first_timestamp(collection_name, device_name)
+            if source_start is None:
+                logger.warning("%s: no documents", source)
+                continue
+            tasks += [(source, collection_name, device_name, day) for day in self.plan(device_name, source_start, end)]
+
+        totals = {source: 0 for source in sources}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.write_day, *task[1:]): task for task in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                source, _, _, day = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    # slice ที่ล้มเหลวไม่ถูกบันทึกว่าเสร็จ จึงถูกดึงใหม่เมื่อรันอีกครั้ง
+                    logger.error("%s %s failed: %s", source, f"{day:%Y-%m-%d}", e)
+                    continue
+                totals[source] += rows
+                logger.info("[%d/%d] %s %s: %s rows", done, len(tasks), source, f"{day:%Y-%m-%d}", f"{rows:,}")
+        logger.info("Backfill of %d slices finished in %.1f s", len(tasks), time.perf_counter() - started)
+        return totals
+
+def first_timestamp(collection_name: str, device_name: str) -> Optional[datetime]:
+    """คืนเวลา (UTC) ของเอกสารแรกของอุปกรณ์ หรือ None ถ้าไม่มีเอกสาร"""
+    from utils import get_mongo_client, MONGO_DB_NAME
+
+    collection = get_mongo_client()[MONGO_DB_NAME][collection_name]
+    first = collection.find_one({"deviceName": device_name}, projection={"timestamp_utc": 1}, sort=[("timestamp_utc", 1)])
+    return pd.Timestamp(first['timestamp_utc']).to_pydatetime() if first else None
+
+# --- 2. Reading ---
+
+def archive_available(device_name: str, root: str = ARCHIVE_DIR) -> bool:
+    """คลังมีข้อมูลของอุปกรณ์นี้หรือไม่"""
+    return os.path.isdir(os.path.join(root, f"device={device_name}"))
+
+def partition_ranges(start: datetime, end: datetime) -> List[Tuple[int, int, int, int]]:
+    """
+    แบ่งช่วง [start, end] (UTC) เป็นรายเดือนสำหรับกรอง partition
+
+    Returns:
+        รายการ (year, month, วันแรก, วันสุดท้าย) หนึ่งรายการต่อเดือน
+    """
+    ranges = []
+    month = datetime(start.year, start.month, 1)
+    while month <= end:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        first_day = start.day if (month.year, month.month) == (start.year, start.month) else 1
+        last_day = end.day if (month.year, month.month) == (end.year, end.month) else (next_month - timedelta(days=1)).day
+        ranges.append((month.year, month.month, first_day, last_day))
+        month = next_month
+    return ranges
+
+def _day_filter(start: datetime, end: datetime):
+    """Expression ของ partition year/month/day ที่ครอบคลุมช่วง [start, end] (หนึ่งเงื่อนไขต่อเดือน)"""
+    import pyarrow.dataset as ds
+
+    expression = None
+    for year, month, first_day, last_day in partition_ranges(start, end):
+        condition = (ds.field('year') == year) & (ds.field('month') == month) & \
+            (ds.field('day') >= first_day) & (ds.field('day') <= last_day)
+        expression = condition if expression is None else expression | condition
+    return expression
+
+def read_archive(
+    device_name: str,
+    start_date_utc: datetime,
+    end_date_utc: datetime,
+    columns: Optional[Sequence[str]] = None,
+    root: str = ARCHIVE_DIR
+) -> pd.DataFrame:
+    """
+    อ่านข้อมูลช่วงเวลา [start, end) (UTC) ของอุปกรณ์จากคลัง
+
+    partition ที่อยู่นอกช่วงถูกข้ามจากชื่อไดเรกทอรี และ row group ถูกกรองด้วยสถิติของ timestamp_utc_dt
+    จึงอ่านเฉพาะไฟล์และคอลัมน์ที่ต้องใช้
+
+    Args:
+        device_name: ชื่ออุปกรณ์
+        start_date_utc: เวลาเริ่มต้น (UTC)
+        end_date_utc: เวลาสิ้นสุด (UTC)
+        columns: คอลัมน์ที่ต้องการ (None = ทุกคอลัมน์) timestamp_utc_dt ถูกเพิ่มให้เสมอ
+        root: ไดเรกทอรีของคลังข้อมูล
+
+    Returns:
+        DataFrame เรียงตามเวลา มีคอลัมน์ deviceName และ timestamp_utc_dt (ว่างถ้าไม่มีข้อมูล)
+    """
+    import pyarrow.dataset as ds
+
+    directory = os.path.join(root, f"device={device_name}")
+    if not os.path.isdir(directory):
+        return pd.DataFrame()
+    dataset = ds.dataset(directory, format='parquet', partitioning=ds.partitioning(DAY_PARTITION_SCHEMA, flavor='hive'))
+    day_filter = _day_filter(start_date_utc, end_date_utc)
+    fragments = list(dataset.get_fragments(filter=day_filter))
+    if not fragments:
+        return pd.DataFrame()
+    # คอลัมน์อาจต่างกันระหว่างวัน (เช่น เซนเซอร์ที่เพิ่มภายหลัง) จึงรวม schema ของไฟล์ที่ถูกเลือกเท่านั้น
+    schema = pa.unify_schemas([f.physical_schema for f in fragments], promote_options='permissive')
+    dataset = ds.FileSystemDataset.from_paths(
+        [f.path for f in fragments], schema=schema, format=ds.ParquetFileFormat(), filesystem=dataset.filesystem
+    )
+    if columns is not None:
+        columns = [c for c in dict.fromkeys(['timestamp_utc_dt', *columns]) if c in schema.names]
+    time_field, time_type = ds.field('timestamp_utc_dt'), schema.field('timestamp_utc_dt').type
+    row_filter = (time_field >= pa.scalar(pd.Timestamp(start_date_utc), type=time_type)) & \
+        (time_field < pa.scalar(pd.Timestamp(end_date_utc), type=time_type))
+    df = dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+    df.insert(0, 'deviceName', device_name)
+    return df.sort_values('timestamp_utc_dt', ignore_index=True)
+
+def main():
+    from utils import DATA_SOURCES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', nargs='+', choices=list(DATA_SOURCES), default=list(DATA_SOURCES))
+    parser.add_argument('--start', type=datetime.fromisoformat, help="วันเริ่มต้น UTC (ค่าเริ่มต้น: เอกสารแรก)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="เวลาสิ้นสุด UTC (ค่าเริ่มต้น: ปัจจุบัน)")
+    parser.add_argument('--output', default=ARCHIVE_DIR)
+    parser.add_argument('--workers', type=int, default=ARCHIVE_WORKERS)
+    parser.add_argument('--compression', default=ARCHIVE_COMPRESSION)
+    parser.add_argument('--overwrite', action='store_true', help="ดึงใหม่แม้ slice ถูกบันทึกว่าเสร็จแล้ว")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    backfill = ArchiveBackfill(args.output, args.compression, args.workers, args.overwrite)
+    totals = backfill.run({s: DATA_SOURCES[s] for s in args.sources}, args.start, args.end or datetime.utcnow())
+    for source, rows in totals.items():
+        print(f"{source:<16} {rows:>12,} rows")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark เวลาและขนาดไฟล์ของแต่ละ format ใน prepare_export_data (ต่อข้อมูล 1 ล้านแถว)
+
+เปรียบเทียบ to_csv ทั้งไฟล์ / pd.ExcelWriter (เดิม) กับ CSV แบบทีละช่วง, CSV บีบอัด gzip/zstd,
+Parquet, Arrow IPC และ Excel แบบ write_only
+
+    python benchmarks/bench_exports.py --rows 100000 500000 --columns 6
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils import prepare_export_data, EXPORT_FORMAT_TYPES  # noqa: E402
+
+def make_frame(rows: int, columns: int) -> pd.DataFrame:
+    """สร้างข้อมูลจำลองทุก 5 วินาทีเหมือน telemetry จริง"""
+    rng = np.random.default_rng(0)
+    data = {'timestamp_local_dt': pd.date_range('2025-01-01', periods=rows, freq='5s')}
+    for i in range(columns):
+        data[f'sensor_{i}'] = np.round(25 + 5 * np.sin(np.arange(rows) / 500 + i) + rng.normal(0, 0.3, rows), 2)
+    return pd.DataFrame(data)
+
+def legacy_export(df: pd.DataFrame, format_type: str) -> bytes:
+    """วิธีเดิม: สร้างสตริง CSV ทั้งไฟล์ หรือเขียน Excel ผ่าน pd.ExcelWriter"""
+    if format_type == 'csv':
+        return df.to_csv(index=False).encode('utf-8')
+    output_buffer = BytesIO()
+    with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='data_export')
+    return output_buffer.getvalue()
+
+def measure(export, memory: bool):
+    """คืน (เวลา วินาที, ขนาด bytes, หน่วยความจำ Python สูงสุด bytes หรือ None)"""
+    started = time.perf_counter()
+    payload = export()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if memory:
+        # tracemalloc ทำให้ช้าลงมาก จึงวัดหน่วยความจำแยกอีกรอบ
+        del payload
+        tracemalloc.start()
+        payload = export()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, len(payload), peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--columns', type=int, default=6)
+    parser.add_argument('--formats', nargs='+', default=EXPORT_FORMAT_TYPES)
+    parser.add_argument('--skip-legacy', action='store_true', help="ไม่วัดวิธีเดิม (Excel แบบเดิมช้ามาก)")
+    parser.add_argument('--memory', action='store_true', help="วัดหน่วยความจำ Python สูงสุดด้วย tracemalloc (ช้า)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'format':<16} {'s / 1M rows':>12} {'MB / 1M rows':>13} {'peak MB':>9}")
+    for rows in args.rows:
+        df = make_frame(rows, args.columns)
+        variants = {fmt: (lambda fmt=fmt: prepare_export_data(df, fmt)) for fmt in args.formats}
+        if not args.skip_legacy:
+            for fmt in ('csv', 'excel'):
+                if fmt in args.formats:
+                    variants[f'{fmt} (legacy)'] = lambda fmt=fmt: legacy_export(df, fmt)
+        scale = 1_000_000 / rows
+        for name, export in variants.items():
+            try:
+                seconds, size, peak = measure(export, args.memory)
+            except (ImportError, ValueError) as e:
+                print(f"{rows:>8} {name:<16} skipped: {e}")
+                continue
+            peak_mb = f"{peak / 1e6:>9.1f}" if peak is not None else f"{'-':>9}"
+            print(f"{rows:>8} {name:<16} {seconds * scale:>12.2f} {size * scale / 1e6:>13.1f} {peak_mb}")
+
+if __name__ == '__main__':
+    main()
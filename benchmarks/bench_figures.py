@@ -0,0 +1,64 @@
+"""
+Benchmark เวลาในการสร้างกราฟและขนาด payload (JSON ที่ส่งไปยัง browser)
+
+เปรียบเทียบ Plotly Express (เดิม) กับ build_timeseries_figure แบบ SVG / WebGL
+และผลของการ downsample ก่อนพล็อต
+
+    python benchmarks/bench_figures.py --rows 10000 50000 200000 --series 3
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from charting import build_timeseries_figure, downsample, DEFAULT_POINT_BUDGET  # noqa: E402
+
+def make_frame(rows: int, series: int) -> pd.DataFrame:
+    """สร้างข้อมูลจำลองทุก 5 วินาทีเหมือน telemetry จริง"""
+    rng = np.random.default_rng(0)
+    data = {'timestamp_local_dt': pd.date_range('2025-01-01', periods=rows, freq='5s')}
+    for i in range(series):
+        data[f'sensor_{i}'] = 25 + 5 * np.sin(np.arange(rows) / 500 + i) + rng.normal(0, 0.3, rows)
+    return pd.DataFrame(data)
+
+def measure(build, repeat: int):
+    """คืน (เวลาสร้างกราฟเฉลี่ย ms, เวลา serialize เฉลี่ย ms, ขนาด payload bytes)"""
+    build_times, json_times = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fig = build()
+        built = time.perf_counter()
+        payload = fig.to_json()
+        build_times.append((built - started) * 1000)
+        json_times.append((time.perf_counter() - built) * 1000)
+    return np.median(build_times), np.median(json_times), len(payload.encode('utf-8'))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 50_000, 200_000])
+    parser.add_argument('--series', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'variant':<22} {'build ms':>9} {'json ms':>9} {'payload KB':>11}")
+    for rows in args.rows:
+        df = make_frame(rows, args.series)
+        x, y = 'timestamp_local_dt', [c for c in df.columns if c.startswith('sensor_')]
+        variants = {
+            'px.line': lambda: px.line(df, x=x, y=y),
+            'go svg': lambda: build_timeseries_figure(df, x, y, 'line', render_mode='svg'),
+            'go webgl': lambda: build_timeseries_figure(df, x, y, 'line', render_mode='webgl'),
+            'downsample + go auto': lambda: build_timeseries_figure(
+                downsample(df, x, y, DEFAULT_POINT_BUDGET)[0], x, y, 'line'),
+        }
+        for name, build in variants.items():
+            build_ms, json_ms, size = measure(build, args.repeat)
+            print(f"{rows:>8} {name:<22} {build_ms:>9.1f} {json_ms:>9.1f} {size / 1024:>11.1f}")
+
+if __name__ == '__main__':
+    main()
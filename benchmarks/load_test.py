@@ -0,0 +1,244 @@
+"""
+Load test ของหน้า Home และ Analysis Tool ด้วย session พร้อมกันหลายจำนวน
+
+แต่ละ session เป็น AppTest ของหน้าหนึ่งหน้าที่ rerun ทุก --interval วินาที (เหมือน auto-refresh)
+ทุก session อยู่ใน process เดียวกันจึงใช้ cache, MongoClient และ thread เบื้องหลังร่วมกันเหมือน server จริง
+รายงาน throughput, latency percentile ต่อหน้า, อัตรา query ของ MongoDB และหน่วยความจำที่เพิ่มขึ้นในแต่ละระดับ
+
+    python benchmarks/load_test.py --sessions 1 5 10 20 --duration 60
+    python benchmarks/load_test.py --mongo mongodb://localhost:27017 --pages home
+
+ค่าเริ่มต้นใช้ mongomock (pip install mongomock) เป็นฐานข้อมูลจำลองพร้อมข้อมูลสังเคราะห์และ thread ที่เขียนข้อมูลใหม่
+ทุก --ingest-interval วินาทีเพื่อให้เวอร์ชันของข้อมูลเปลี่ยนเหมือนอุปกรณ์จริง
+หมายเหตุ: AppTest rerun ทั้งหน้า (รวมทุก fragment) ผลของหน้า Home จึงเป็นขอบบนของภาระจริง
+ที่ fragment แต่ละส่วน rerun แยกกัน
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+PAGES = {
+    'home': ROOT / '01_Home.py',
+    'analysis': ROOT / 'pages' / 'Analysis Tool.py',
+}
+
+# --- 1. ฐานข้อมูลจำลอง ---
+
+def make_documents(source: str, timestamps: List[datetime], rng: np.random.Generator) -> List[Dict]:
+    """สร้างเอกสาร telemetry สังเคราะห์ตามรูปแบบของแต่ละแหล่งข้อมูล"""
+    from utils import DATA_SOURCES
+
+    device_name = DATA_SOURCES[source][1]
+    documents = []
+    for ts in timestamps:
+        phase = ts.timestamp() / 3600
+        document = {'deviceName': device_name, 'timestamp_utc': ts.strftime('%Y-%m-%dT%H:%M:%S')}
+        if source == 'SmartFarm':
+            document.update(
+                temperature=float(25 + 4 * np.sin(phase / 4) + rng.normal(0, 0.3)),
+                humidity=float(65 + 10 * np.cos(phase / 4) + rng.normal(0, 1)),
+                **{f'soil_raw_{i}': float(500 + 10 * i + rng.normal(0, 5)) for i in range(1, 5)}
+            )
+        else:
+            document.update(
+                cpu_temp=float(55 + 10 * np.sin(phase) + rng.normal(0, 1)),
+                cpu_percent=float(rng.uniform(5, 90)),
+                memory_percent=float(rng.uniform(40, 60)),
+                disk_percent=40.0,
+                network_latency_ms=float(rng.uniform(10, 200)),
+            )
+        documents.append(document)
+    return documents
+
+def install_stand_in(days: int, step: int):
+    """
+    แทน pymongo.MongoClient ด้วย mongomock และเติมข้อมูลย้อนหลัง days วัน ทุก step วินาที
+
+    Returns:
+        mongomock client ที่ใช้ร่วมกันทั้ง process
+    """
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("mongomock is required for the stand-in database (pip install mongomock) or pass --mongo URI")
+    import pymongo
+    from utils import DATA_SOURCES, MONGO_DB_NAME
+
+    client = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *args, **kwargs: client
+    os.environ.setdefault('MONGO_URI', 'mongodb://stand-in')
+
+    rng = np.random.default_rng(0)
+    now = datetime.utcnow()
+    timestamps = [now - timedelta(seconds=s) for s in range(days * 86400, 0, -step)]
+    for source, (collection_name, _) in DATA_SOURCES.items():
+        client[MONGO_DB_NAME][collection_name].insert_many(make_documents(source, timestamps, rng))
+    print(f"stand-in database: {len(timestamps):,} documents per source ({days} days every {step} s)")
+    return client
+
+def ingest(client, interval: float, stop: threading.Event):
+    """เขียนเอกสารใหม่หนึ่งฉบับต่อแหล่งข้อมูลทุก interval วินาที"""
+    from utils import DATA_SOURCES, MONGO_DB_NAME
+
+    rng = np.random.default_rng(1)
+    while not stop.wait(interval):
+        for source, (collection_name, _) in DATA_SOURCES.items():
+            client[MONGO_DB_NAME][collection_name].insert_many(make_documents(source, [datetime.utcnow()], rng))
+
+# --- 2. Sessions ---
+
+class Session(threading.Thread):
+    """
+    ผู้ชมหนึ่งคนที่เปิดหน้าหนึ่งค้างไว้ rerun ทุก interval วินาทีจนกว่า stop จะถูกตั้ง
+
+    Args:
+        page: ชื่อหน้าใน PAGES
+        interval: ระยะห่างระหว่างการ rerun (วินาที)
+        stop: Event สำหรับหยุด
+        offset: หน่วงก่อนเริ่ม เพื่อไม่ให้ทุก session rerun พร้อมกัน
+    """
+
+    def __init__(self, page: str, interval: float, stop: threading.Event, offset: float, timeout: float):
+        super().__init__(daemon=True)
+        self.page = page
+        self.interval = interval
+        self.stop = stop
+        self.offset = offset
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        if self.stop.wait(self.offset):
+            return
+        app = AppTest.from_file(str(PAGES[self.page]), default_timeout=self.timeout)
+        next_run = time.perf_counter()
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            try:
+                app.run()
+                failed = len(app.exception) > 0
+            except Exception:
+                failed = True
+            self.latencies.append(time.perf_counter() - started)
+            self.errors += failed
+            next_run += self.interval
+            # ถ้า rerun ช้ากว่า interval ให้ rerun ต่อทันทีแทนการสะสมรอบค้าง
+            next_run = max(next_run, time.perf_counter())
+            self.stop.wait(next_run - time.perf_counter())
+
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+def mongo_totals():
+    from metrics import MONGO_QUERY_SECONDS, MONGO_DOCUMENTS
+
+    queries: Dict[str, int] = {}
+    for (_, operation), (count, _) in MONGO_QUERY_SECONDS.totals().items():
+        queries[operation] = queries.get(operation, 0) + count
+    return queries, sum(MONGO_DOCUMENTS.totals().values())
+
+def run_level(sessions: int, pages: List[str], duration: float, interval: float, timeout: float) -> Dict:
+    """รัน sessions พร้อมกันเป็นเวลา duration วินาที แล้วคืนผลสรุปของระดับนี้"""
+    stop = threading.Event()
+    workers = [
+        Session(pages[i % len(pages)], interval, stop, offset=interval * i / sessions, timeout=timeout)
+        for i in range(sessions)
+    ]
+    rss_before = rss_bytes()
+    queries_before, documents_before = mongo_totals()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    queries_after, documents_after = mongo_totals()
+    rss_after = rss_bytes()
+
+    result = {'sessions': sessions, 'elapsed': elapsed, 'pages': {}}
+    for page in pages:
+        latencies = np.array([s for w in workers if w.page == page for s in w.latencies])
+        result['pages'][page] = {
+            'reruns': len(latencies),
+            'errors': sum(w.errors for w in workers if w.page == page),
+            'percentiles': np.percentile(latencies, [50, 95, 99]) * 1000 if len(latencies) else [np.nan] * 3,
+        }
+    result['reruns_per_s'] = sum(p['reruns'] for p in result['pages'].values()) / elapsed
+    result['queries_per_s'] = {
+        op: (queries_after.get(op, 0) - queries_before.get(op, 0)) / elapsed for op in sorted(queries_after)
+    }
+    result['documents_per_s'] = (documents_after - documents_before) / elapsed
+    result['rss_before'], result['rss_after'] = rss_before, rss_after
+    return result
+
+def print_result(result: Dict, interval: float):
+    mb = lambda value: f"{value / 2**20:,.0f} MB" if value is not None else "n/a"
+    demand = result['sessions'] / interval
+    print(f"\n=== {result['sessions']} sessions ({result['elapsed']:.0f} s) ===")
+    print(f"throughput: {result['reruns_per_s']:.2f} reruns/s (demand {demand:.2f}/s)")
+    print(f"{'page':<10} {'reruns':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for page, stats in result['pages'].items():
+        p50, p95, p99 = stats['percentiles']
+        print(f"{page:<10} {stats['reruns']:>7} {stats['errors']:>7} {p50:>9.0f} {p95:>9.0f} {p99:>9.0f}")
+    rates = ', '.join(f"{op} {rate:.2f}/s" for op, rate in result['queries_per_s'].items()) or 'none'
+    print(f"mongo queries: {rates}; documents {result['documents_per_s']:,.0f}/s")
+    growth = (
+        mb(result['rss_after'] - result['rss_before'])
+        if result['rss_before'] is not None else "n/a (pip install psutil)"
+    )
+    print(f"memory: {mb(result['rss_before'])} -> {mb(result['rss_after'])} (growth {growth})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 5, 10])
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--duration', type=float, default=30, help="เวลาของแต่ละระดับ (วินาที)")
+    parser.add_argument('--interval', type=float, default=5, help="ระยะห่างระหว่าง rerun ของแต่ละ session (วินาที)")
+    parser.add_argument('--timeout', type=float, default=120, help="timeout ของหนึ่ง rerun (วินาที)")
+    parser.add_argument('--mongo', help="URI ของ MongoDB ที่ใช้ทดสอบ (ค่าเริ่มต้น: mongomock ใน process)")
+    parser.add_argument('--days', type=int, default=7, help="จำนวนวันของข้อมูลจำลอง")
+    parser.add_argument('--step', type=int, default=60, help="ระยะห่างระหว่างเอกสารของข้อมูลจำลอง (วินาที)")
+    parser.add_argument('--ingest-interval', type=float, default=5, help="0 = ไม่เขียนข้อมูลใหม่ระหว่างทดสอบ")
+    args = parser.parse_args()
+
+    # ไม่เปิด metrics endpoint ของ process ทดสอบ และไม่แสดงคำเตือน bare mode ของ thread เบื้องหลัง
+    os.environ.setdefault('METRICS_PORT', '0')
+    from streamlit.runtime.scriptrunner_utils import script_run_context
+    logging.getLogger(script_run_context.__name__).setLevel(logging.ERROR)
+    os.chdir(ROOT)
+    stop_ingest = threading.Event()
+    if args.mongo:
+        os.environ['MONGO_URI'] = args.mongo
+    else:
+        client = install_stand_in(args.days, args.step)
+        if args.ingest_interval > 0:
+            threading.Thread(target=ingest, args=(client, args.ingest_interval, stop_ingest), daemon=True).start()
+
+    try:
+        for sessions in args.sessions:
+            print_result(run_level(sessions, args.pages, args.duration, args.interval, args.timeout), args.interval)
+    finally:
+        stop_ingest.set()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+รายงานเวลา import ของแต่ละโมดูลของแอป (แยกจากเวลา import ของ streamlit / pandas / numpy ที่หลีกเลี่ยงไม่ได้)
+
+แต่ละโมดูลถูก import ใน process ใหม่ด้วย python -X importtime แล้วแสดงเวลารวม
+และโมดูลที่ใช้เวลามากที่สุดซึ่งถูกโหลดเพิ่มเติมจาก baseline
+
+    python benchmarks/profile_imports.py --modules utils charting alerts --top 8
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE = ['streamlit', 'pandas', 'numpy']
+APP_MODULES = [
+    'utils', 'shared_cache', 'rollups', 'charting', 'alerts', 'exports', 'parallel', 'jobs', 'api', 'metrics', 'archive', 'sql_engine'
+]
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def run_import(modules: List[str]) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """
+    import baseline แล้วจึง import modules ใน process ใหม่
+
+    Returns:
+        (เวลา import ของ modules วินาที, รายการ (ชื่อโมดูล, self µs, cumulative µs) จาก -X importtime)
+    """
+    code = (
+        f"import sys, time; sys.path.insert(0, {str(ROOT)!r}); import {', '.join(BASELINE)}; "
+        f"t = time.perf_counter(); import {', '.join(modules) if modules else 'sys'}; "
+        f"print(time.perf_counter() - t)"
+    )
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, cwd=str(ROOT)
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return float(proc.stdout.strip().splitlines()[-1]), entries
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=APP_MODULES)
+    parser.add_argument('--top', type=int, default=5, help="จำนวนโมดูลที่ช้าที่สุดที่แสดงต่อโมดูลของแอป")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    baseline_modules = {name for name, _, _ in run_import([])[1]}
+    print(f"{'module':<14} {'import ms':>10}   heaviest new imports (self ms)")
+    for module in args.modules:
+        try:
+            runs = [run_import([module]) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:<14} {'failed':>10}   {e}")
+            continue
+        seconds, entries = min(runs, key=lambda run: run[0])
+        added: Dict[str, int] = {name: own for name, own, _ in entries if name not in baseline_modules}
+        heaviest = sorted(added.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        details = ', '.join(f"{name} {own / 1000:.0f}" for name, own in heaviest)
+        print(f"{module:<14} {seconds * 1000:>10.1f}   {details}")
+
+if __name__ == '__main__':
+    main()
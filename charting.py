@@ -0,0 +1,530 @@
+import streamlit as st
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# งบจำนวนจุดต่อ trace คิดจากความกว้างของกราฟ (จุดที่มากกว่าจำนวน pixel มองไม่เห็นความต่าง)
+DEFAULT_CHART_WIDTH_PX = 1200
+POINTS_PER_PIXEL = 2
+
+def point_budget(width_px: int = DEFAULT_CHART_WIDTH_PX, points_per_pixel: float = POINTS_PER_PIXEL) -> int:
+    """
+    คำนวณจำนวนจุดสูงสุดต่อ trace จากความกว้างของกราฟ
+
+    Args:
+        width_px: ความกว้างของกราฟ (pixel)
+        points_per_pixel: จำนวนจุดต่อ pixel
+
+    Returns:
+        จำนวนจุดสูงสุดต่อ trace
+    """
+    return max(int(width_px * points_per_pixel), 3)
+
+DEFAULT_POINT_BUDGET = point_budget()
+
+# --- 1. อัลกอริทึม Downsampling ---
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    เลือกจุดด้วย Largest-Triangle-Three-Buckets (รักษารูปร่างและยอดของกราฟ)
+
+    Args:
+        x: ค่าแกน x ที่เรียงจากน้อยไปมาก (float)
+        y: ค่าแกน y (ไม่มี NaN)
+        n_out: จำนวนจุดที่ต้องการ
+
+    Returns:
+        index ของจุดที่ถูกเลือก เรียงจากน้อยไปมาก
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # แบ่งจุดกลาง (ไม่รวมจุดแรกและจุดสุดท้าย) เป็น n_out - 2 bucket
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.concatenate(([0.0], np.cumsum(y)))
+    avg_x = (csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts
+    avg_y = (csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts
+    # จุดอ้างอิงของ bucket ถัดไป (bucket สุดท้ายใช้จุดสุดท้าย)
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[anchor] - next_x[i]) * (y[lo:hi] - y[anchor])
+            - (x[anchor] - x[lo:hi]) * (next_y[i] - y[anchor])
+        )
+        anchor = lo + int(np.argmax(area))
+        selected[i + 1] = anchor
+    return selected
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    เลือกค่าต่ำสุดและสูงสุดของแต่ละ bucket (เร็วมาก และไม่ทำให้ยอด/ค่าผิดปกติหายไป)
+
+    Args:
+        y: ค่าแกน y (NaN จะถูกข้าม)
+        n_out: จำนวนจุดที่ต้องการโดยประมาณ
+
+    Returns:
+        index ของจุดที่ถูกเลือก เรียงจากน้อยไปมาก
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+
+    n_buckets = max(n_out // 2, 1)
+    size = -(-n // n_buckets)
+    low = np.full(n_buckets * size, np.inf)
+    high = np.full(n_buckets * size, -np.inf)
+    finite = np.isfinite(y)
+    low[:n] = np.where(finite, y, np.inf)
+    high[:n] = np.where(finite, y, -np.inf)
+    low, high = low.reshape(n_buckets, size), high.reshape(n_buckets, size)
+
+    base = np.arange(n_buckets) * size
+    valid = np.isfinite(low.min(axis=1))
+    imin = (base + low.argmin(axis=1))[valid]
+    imax = (base + high.argmax(axis=1))[valid]
+    return np.unique(np.concatenate((imin, imax, [0, n - 1])))
+
+def _numeric_axis(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        ns = values.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        return (ns - ns[0]).astype(np.float64) if len(ns) else ns.astype(np.float64)
+    return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+def _select_rows(frame: pd.DataFrame, x: str, y_columns: List[str], max_points: int, method: str) -> np.ndarray:
+    """คืนตำแหน่งแถวที่ต้องเก็บ (union ของทุก y) โดยแต่ละ y ได้งบเท่ากัน"""
+    per_column = max(max_points // max(len(y_columns), 1), 3)
+    x_values = _numeric_axis(frame[x])
+    keep = []
+    for column in y_columns:
+        y_values = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        finite = np.flatnonzero(np.isfinite(y_values) & np.isfinite(x_values))
+        if method == 'lttb':
+            chosen = lttb_indices(x_values[finite], y_values[finite], per_column)
+        elif method == 'minmax':
+            chosen = minmax_indices(y_values[finite], per_column)
+        else:
+            raise ValueError(f"Unsupported downsampling method: '{method}'. Please use 'lttb' or 'minmax'.")
+        keep.append(finite[chosen])
+    return np.unique(np.concatenate(keep)) if keep else np.arange(len(frame))
+
+def downsample(
+    df: pd.DataFrame,
+    x: str,
+    y_columns: List[str],
+    max_points: int = DEFAULT_POINT_BUDGET,
+    method: str = 'lttb',
+    group_by: Optional[str] = None
+) -> Tuple[pd.DataFrame, int]:
+    """
+    ลดจำนวนจุดของแต่ละ trace ก่อนส่งให้ Plotly/Streamlit โดยยังรักษารูปร่างและค่ายอดไว้
+
+    Args:
+        df: DataFrame ที่ต้องการพล็อต
+        x: คอลัมน์แกน x (ข้อมูลจะถูกเรียงตามคอลัมน์นี้)
+        y_columns: คอลัมน์แกน y (แต่ละคอลัมน์คือหนึ่ง trace)
+        max_points: จำนวนจุดสูงสุดต่อ trace
+        method: 'lttb' หรือ 'minmax'
+        group_by: คอลัมน์ที่แยก trace ตามสี (เช่น color_by) ถ้ามี
+
+    Returns:
+        Tuple ของ (DataFrame ที่ถูกลดจุดแล้ว, จำนวนแถวที่ถูกตัดออก)
+    """
+    if df.empty or len(df) <= max_points:
+        return df, 0
+
+    ordered = df.sort_values(x, kind='stable') if not df[x].is_monotonic_increasing else df
+    if group_by is None:
+        positions = _select_rows(ordered, x, y_columns, max_points, method)
+    else:
+        positions = np.concatenate([
+            rows[_select_rows(ordered.iloc[rows], x, y_columns, max_points, method)]
+            for rows in ordered.groupby(group_by, sort=False, dropna=False).indices.values()
+        ])
+        positions.sort()
+    result = ordered.iloc[positions]
+    return result, len(df) - len(result)
+
+# --- 2. สร้างกราฟด้วย graph_objects (SVG / WebGL) ---
+
+# เมื่อจำนวนจุดรวมทุก trace เกินค่านี้จะเปลี่ยนไปใช้ Scattergl (WebGL)
+WEBGL_POINT_THRESHOLD = 5000
+RENDER_MODES = ['auto', 'svg', 'webgl']
+
+def use_webgl(n_points: int, render_mode: str = 'auto', threshold: int = WEBGL_POINT_THRESHOLD) -> bool:
+    """
+    ตัดสินใจว่าจะใช้ WebGL หรือไม่
+
+    Args:
+        n_points: จำนวนจุดรวมของทุก trace
+        render_mode: 'auto', 'svg' หรือ 'webgl'
+        threshold: จำนวนจุดที่เริ่มใช้ WebGL เมื่อเป็นโหมด 'auto'
+
+    Returns:
+        True ถ้าควรใช้ Scattergl
+    """
+    if render_mode not in RENDER_MODES:
+        raise ValueError(f"Unsupported render mode: '{render_mode}'. Please use one of {RENDER_MODES}.")
+    if render_mode == 'auto':
+        return n_points > threshold
+    return render_mode == 'webgl'
+
+def build_timeseries_figure(
+    df: pd.DataFrame,
+    x: str,
+    y_columns: List[str],
+    chart_type: str = 'line',
+    color_by: Optional[str] = None,
+    title: str = '',
+    render_mode: str = 'auto',
+    hover_columns: Optional[List[str]] = None
+) -> go.Figure:
+    """
+    สร้างกราฟเส้น/พื้นที่/จุด ด้วย graph_objects โดยตรง (ไม่ผ่านการประมวลผล DataFrame ของ Plotly Express)
+
+    กราฟเส้นและกราฟจุดจะใช้ Scattergl อัตโนมัติเมื่อจำนวนจุดเกิน WEBGL_POINT_THRESHOLD
+    ส่วนกราฟพื้นที่ใช้ Scatter (SVG) เสมอเพราะ Scattergl ไม่รองรับการซ้อน (stackgroup)
+
+    Args:
+        df: DataFrame ที่ต้องการพล็อต
+        x: คอลัมน์แกน x
+        y_columns: คอลัมน์แกน y (หนึ่ง trace ต่อคอลัมน์ต่อกลุ่มสี)
+        chart_type: 'line', 'area' หรือ 'scatter'
+        color_by: คอลัมน์ที่ใช้แยกกลุ่มสี (optional)
+        title: ชื่อกราฟ
+        render_mode: 'auto', 'svg' หรือ 'webgl'
+        hover_columns: คอลัมน์เพิ่มเติมที่แสดงใน hover (optional)
+
+    Returns:
+        plotly Figure
+    """
+    if chart_type not in ('line', 'area', 'scatter'):
+        raise ValueError(f"Unsupported chart type: '{chart_type}'. Please use 'line', 'area' or 'scatter'.")
+
+    webgl = chart_type != 'area' and use_webgl(len(df) * len(y_columns), render_mode)
+    trace_class = go.Scattergl if webgl else go.Scatter
+    mode = 'markers' if chart_type == 'scatter' else 'lines'
+    groups = df.groupby(color_by, sort=False).indices.items() if color_by else [(None, None)]
+
+    hover_columns = [c for c in (hover_columns or []) if c not in (x, *y_columns)]
+    hovertemplate = None
+    if hover_columns:
+        hovertemplate = (
+            f"{x}=%{{x}}<br>%{{fullData.name}}=%{{y}}<br>"
+            + "<br>".join(f"{c}=%{{customdata[{i}]}}" for i, c in enumerate(hover_columns))
+            + "<extra></extra>"
+        )
+
+    fig = go.Figure()
+    for group, rows in groups:
+        frame = df if rows is None else df.iloc[rows]
+        x_values = frame[x].to_numpy()
+        customdata = frame[hover_columns].to_numpy() if hover_columns else None
+        for column in y_columns:
+            if group is None:
+                name = column
+            else:
+                name = str(group) if len(y_columns) == 1 else f"{column}, {group}"
+            trace = dict(x=x_values, y=frame[column].to_numpy(), name=name, mode=mode,
+                         customdata=customdata, hovertemplate=hovertemplate)
+            if chart_type == 'area':
+                trace.update(stackgroup='one')
+            fig.add_trace(trace_class(**trace))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=x,
+        yaxis_title=y_columns[0] if len(y_columns) == 1 else 'value',
+        showlegend=len(fig.data) > 1 or color_by is not None,
+    )
+    return fig
+
+# --- 3. สรุปการกระจายตัวฝั่ง server (Histogram / Box Plot) ---
+
+DEFAULT_HISTOGRAM_BINS = 30
+# จำนวน outlier สูงสุดที่ส่งไปยัง browser (เลือกค่าที่สุดโต่งที่สุดจากทั้งสองฝั่ง)
+MAX_BOX_OUTLIERS = 100
+_DISTRIBUTION_CACHE_SIZE = 64
+_distribution_cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+_distribution_cache_lock = threading.Lock()
+
+def summarize_distribution(values: np.ndarray, bins: int = DEFAULT_HISTOGRAM_BINS) -> Dict:
+    """
+    คำนวณ bin counts และ five-number summary พร้อม outliers จากข้อมูลดิบ
+
+    Args:
+        values: ค่าที่ต้องการสรุป (NaN จะถูกข้าม)
+        bins: จำนวน bin ของ histogram
+
+    Returns:
+        Dictionary ที่มี counts, edges, min, q1, median, q3, max, mean,
+        lowerfence, upperfence, outliers และ n (ขนาดคงที่ไม่ขึ้นกับจำนวนแถว)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {'n': 0}
+
+    counts, edges = np.histogram(values, bins=bins)
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    outliers = np.sort(values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)])
+    if len(outliers) > MAX_BOX_OUTLIERS:
+        half = MAX_BOX_OUTLIERS // 2
+        outliers = np.concatenate((outliers[:half], outliers[-half:]))
+    return {
+        'n': len(values),
+        'counts': counts,
+        'edges': edges,
+        'min': values.min(),
+        'q1': q1,
+        'median': median,
+        'q3': q3,
+        'max': values.max(),
+        'mean': values.mean(),
+        'lowerfence': inside.min() if len(inside) else q1,
+        'upperfence': inside.max() if len(inside) else q3,
+        'outliers': outliers,
+    }
+
+def distribution_summary(
+    df: pd.DataFrame,
+    column: str,
+    bins: int = DEFAULT_HISTOGRAM_BINS,
+    time_column: str = 'timestamp_local_dt',
+    version: Hashable = None
+) -> Dict:
+    """
+    คืนสรุปการกระจายตัวของคอลัมน์ โดย cache ตาม (version, คอลัมน์, ช่วงเวลาของข้อมูล, จำนวนแถว, bins)
+
+    Args:
+        df: DataFrame ที่ต้องการวิเคราะห์
+        column: คอลัมน์ที่ต้องการสรุป
+        bins: จำนวน bin ของ histogram
+        time_column: คอลัมน์เวลาที่ใช้ระบุช่วงของข้อมูลใน cache key
+        version: ค่าที่ระบุที่มาของข้อมูล เช่น (แหล่งข้อมูล, เวอร์ชันข้อมูล) เพื่อไม่ให้ข้อมูลต่างแหล่ง
+            ที่บังเอิญมีช่วงเวลาและจำนวนแถวเท่ากันใช้ผลสรุปร่วมกัน
+
+    Returns:
+        Dictionary จาก summarize_distribution
+    """
+    if time_column in df.columns and not df.empty:
+        key = (version, column, bins, len(df), df[time_column].min(), df[time_column].max())
+    else:
+        key = (version, column, bins, len(df), None, None)
+
+    with _distribution_cache_lock:
+        summary = _distribution_cache.get(key)
+        if summary is not None:
+            _distribution_cache.move_to_end(key)
+            return summary
+
+    summary = summarize_distribution(df[column].to_numpy(), bins)
+    with _distribution_cache_lock:
+        _distribution_cache[key] = summary
+        while len(_distribution_cache) > _DISTRIBUTION_CACHE_SIZE:
+            _distribution_cache.popitem(last=False)
+    return summary
+
+def _box_traces(name: str, summary: Dict, horizontal: bool = False) -> List:
+    """สร้าง box จากค่าสรุป และ outliers เป็น scatter แยก (ไม่ส่งข้อมูลดิบไปยัง browser)"""
+    position = [name] * len(summary['outliers'])
+    box = go.Box(
+        q1=[summary['q1']], median=[summary['median']], q3=[summary['q3']],
+        lowerfence=[summary['lowerfence']], upperfence=[summary['upperfence']],
+        mean=[summary['mean']], name=name, boxpoints=False, showlegend=False,
+        orientation='h' if horizontal else 'v', **({'y': [name]} if horizontal else {'x': [name]})
+    )
+    outlier_axes = {'x': summary['outliers'], 'y': position} if horizontal else {'x': position, 'y': summary['outliers']}
+    outliers = go.Scatter(mode='markers', marker=dict(size=4), name=f"{name} outliers", showlegend=False, **outlier_axes)
+    return [box, outliers]
+
+def build_histogram_figure(summary: Dict, column: str, title: str = '', marginal_box: bool = False) -> go.Figure:
+    """
+    สร้าง histogram จาก bin counts ที่คำนวณไว้แล้ว
+
+    Args:
+        summary: ผลลัพธ์จาก distribution_summary
+        column: ชื่อตัวแปร (ใช้เป็นชื่อแกน x)
+        title: ชื่อกราฟ
+        marginal_box: แสดง box plot ด้านบน histogram
+
+    Returns:
+        plotly Figure
+    """
+    if marginal_box:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+    else:
+        fig = go.Figure()
+    if summary.get('n', 0) == 0:
+        return fig.update_layout(title=title)
+
+    edges = summary['edges']
+    bars = go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2, y=summary['counts'], width=np.diff(edges),
+        name=column, showlegend=False,
+    )
+    if marginal_box:
+        fig.add_trace(bars, row=2, col=1)
+        # box แนวนอนใช้แกน x ร่วมกับ histogram
+        for trace in _box_traces(column, summary, horizontal=True):
+            fig.add_trace(trace, row=1, col=1)
+        fig.update_yaxes(showticklabels=False, row=1, col=1)
+        fig.update_yaxes(title_text='count', row=2, col=1)
+        fig.update_xaxes(title_text=column, row=2, col=1)
+    else:
+        fig.add_trace(bars)
+        fig.update_layout(xaxis_title=column, yaxis_title='count')
+    fig.update_layout(title=title, bargap=0)
+    return fig
+
+def build_box_figure(summaries: Dict[str, Dict], title: str = '') -> go.Figure:
+    """
+    สร้าง box plot จาก five-number summary ที่คำนวณไว้แล้ว
+
+    Args:
+        summaries: Dictionary ของ {ชื่อตัวแปร: ผลลัพธ์จาก distribution_summary}
+        title: ชื่อกราฟ
+
+    Returns:
+        plotly Figure
+    """
+    fig = go.Figure()
+    for name, summary in summaries.items():
+        if summary.get('n', 0):
+            fig.add_traces(_box_traces(name, summary))
+    fig.update_layout(title=title, yaxis_title='value' if len(summaries) > 1 else next(iter(summaries), ''))
+    return fig
+
+# --- 4. Cache ของกราฟที่สร้างแล้ว ---
+
+FIGURE_CACHE_MAX_ENTRIES = 128
+FIGURE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def _estimate_bytes(value: Any) -> int:
+    """ประมาณขนาดหน่วยความจำของ figure / DataFrame / tuple ที่อยู่ใน cache"""
+    if isinstance(value, go.Figure):
+        total = 0
+        for trace in value.data:
+            for prop in ('x', 'y', 'z', 'customdata', 'text'):
+                data = getattr(trace, prop, None)
+                if data is not None:
+                    total += np.asarray(data).nbytes
+        return total + 4096
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_estimate_bytes(v) for v in value)
+    return 64
+
+class FigureCache:
+    """
+    LRU cache ของกราฟที่สร้างแล้ว จำกัดทั้งจำนวนรายการและขนาดหน่วยความจำโดยประมาณ
+
+    key ควรประกอบด้วยเวอร์ชันของข้อมูลและการตั้งค่ากราฟทั้งหมด (ประเภทกราฟ, แกน,
+    aggregation, color_by, theme) เมื่อไม่มีข้อมูลใหม่และไม่มี widget เปลี่ยน การ rerun
+    จึงได้ figure เดิมกลับมาทันทีโดยไม่ต้องสร้างใหม่
+
+    Args:
+        max_entries: จำนวนรายการสูงสุด
+        max_bytes: ขนาดรวมสูงสุด (bytes โดยประมาณ)
+    """
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_MAX_ENTRIES, max_bytes: int = FIGURE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _put(self, key: Hashable, value: Any):
+        size = _estimate_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_build(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """
+        คืนค่าที่อยู่ใน cache หรือเรียก build() แล้วเก็บผลลัพธ์
+
+        Args:
+            key: key ที่ hash ได้ (tuple ของเวอร์ชันข้อมูลและการตั้งค่ากราฟ)
+            build: ฟังก์ชันสร้าง figure (หรือ tuple ที่มี figure)
+
+        Returns:
+            ค่าที่ build() คืน (อาจมาจาก cache)
+        """
+        entry = self._get(key)
+        if entry is not None:
+            return entry[0]
+        value = build()
+        self._put(key, value)
+        return value
+
+    def get_json(self, key: Hashable, build: Callable[[], go.Figure]) -> str:
+        """
+        คืน JSON ของ figure ที่ serialize ไว้แล้ว (เก็บแยกจาก figure ด้วย key เดียวกัน)
+
+        Args:
+            key: key ของ figure
+            build: ฟังก์ชันสร้าง figure
+
+        Returns:
+            JSON string ของ figure
+        """
+        return self.get_or_build(('json', key), lambda: self.get_or_build(key, build).to_json())
+
+    def clear(self):
+        """ล้าง cache ทั้งหมด"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """คืนสถิติของ cache (entries, bytes, hits, misses, evictions)"""
+        with self._lock:
+            return {
+                'entries': len(self._entries), 'bytes': self._bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            }
+
+@st.cache_resource
+def get_figure_cache() -> FigureCache:
+    """คืน FigureCache ที่ใช้ร่วมกันทุก session ใน process"""
+    return FigureCache()
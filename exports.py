@@ -0,0 +1,146 @@
+import streamlit as st
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+from utils import prepare_export_data
+
+EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# นามสกุลไฟล์และ MIME type ของแต่ละ format ใน utils.EXPORT_FORMAT_TYPES
+EXPORT_FORMATS = {
+    'csv': {'label': 'CSV', 'extension': 'csv', 'mime': 'text/csv'},
+    'csv.gz': {'label': 'CSV (gzip)', 'extension': 'csv.gz', 'mime': 'application/gzip'},
+    'csv.zst': {'label': 'CSV (zstd)', 'extension': 'csv.zst', 'mime': 'application/zstd'},
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+    'arrow': {'label': 'Arrow IPC', 'extension': 'arrow', 'mime': 'application/vnd.apache.arrow.file'},
+    'excel': {'label': 'Excel', 'extension': 'xlsx', 'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+}
+
+class ExportStore:
+    """
+    เก็บไฟล์ export ที่สร้างแล้วตาม key (สิ่งที่ผู้ใช้เลือกเมื่อกดเตรียมไฟล์และ format)
+
+    ไฟล์ถูกสร้างเมื่อผู้ใช้ขอเท่านั้น และถูกปล่อยเมื่อดาวน์โหลดเสร็จ (release) หรือเมื่อขนาดรวม
+    เกิน max_bytes (ลบรายการที่ใช้ล่าสุดนานที่สุดก่อน)
+
+    Args:
+        max_bytes: ขนาดรวมสูงสุดของไฟล์ที่เก็บไว้ (bytes)
+    """
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """คืนไฟล์ที่สร้างไว้แล้ว หรือ None ถ้ายังไม่มี"""
+        with self._lock:
+            data = self._files.get(key)
+            if data is not None:
+                self._files.move_to_end(key)
+            return data
+
+    def prepare(self, key: Hashable, build: Callable[[], bytes]) -> bytes:
+        """
+        คืนไฟล์ของ key ถ้ามีอยู่แล้ว มิฉะนั้นเรียก build() เพื่อสร้างและเก็บไว้
+
+        Args:
+            key: key ของไฟล์
+            build: ฟังก์ชันสร้าง bytes ของไฟล์
+
+        Returns:
+            bytes ของไฟล์
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+        data = build()
+        with self._lock:
+            if key not in self._files:
+                self._files[key] = data
+                self._bytes += len(data)
+            while len(self._files) > 1 and self._bytes > self.max_bytes:
+                _, evicted = self._files.popitem(last=False)
+                self._bytes -= len(evicted)
+        return data
+
+    def release(self, key: Hashable):
+        """ปล่อยไฟล์ของ key ออกจากหน่วยความจำ"""
+        with self._lock:
+            data = self._files.pop(key, None)
+            if data is not None:
+                self._bytes -= len(data)
+
+    def stats(self) -> Dict[str, int]:
+        """คืนจำนวนไฟล์และขนาดรวม (bytes)"""
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self._bytes}
+
+@st.cache_resource
+def get_export_store() -> ExportStore:
+    """คืน ExportStore ที่ใช้ร่วมกันทุก session ใน process"""
+    return ExportStore()
+
+def lazy_download_button(
+    label: str,
+    key: Hashable,
+    build_frame: Callable[[], pd.DataFrame],
+    file_name: str,
+    format_type: str = 'csv',
+    index: bool = False,
+    widget_key: Optional[str] = None
+):
+    """
+    แสดงปุ่มเตรียมไฟล์ และแสดงปุ่มดาวน์โหลดเมื่อไฟล์พร้อมแล้ว
+
+    rerun ปกติ (เช่น auto-refresh) จะไม่ serialize ข้อมูล ไฟล์ถูกสร้างเมื่อกดปุ่มเตรียมไฟล์เท่านั้น
+    และถูกปล่อยจากหน่วยความจำหลังดาวน์โหลด ไฟล์ที่เตรียมแล้วเป็นข้อมูล ณ เวลาที่กดปุ่ม
+    จึงยังดาวน์โหลดได้แม้มีข้อมูลใหม่เข้ามา จนกว่าผู้ใช้จะเปลี่ยนสิ่งที่เลือก (key)
+
+    Args:
+        label: ข้อความบนปุ่มดาวน์โหลด
+        key: สิ่งที่ผู้ใช้เลือก เช่น แหล่งข้อมูล ช่วงเวลา และคอลัมน์ (ไม่รวมเวอร์ชันข้อมูลหรือค่าที่เปลี่ยนทุก rerun)
+        build_frame: ฟังก์ชันคืน DataFrame ที่จะ export (ถูกเรียกเมื่อเตรียมไฟล์เท่านั้น)
+        file_name: ชื่อไฟล์ (ไม่รวมนามสกุล)
+        format_type: รูปแบบไฟล์ (key ของ EXPORT_FORMATS)
+        index: รวม index ในไฟล์หรือไม่
+        widget_key: key ของ widget (ต้องไม่ซ้ำกันในหน้า)
+    """
+    store = get_export_store()
+    file_format = EXPORT_FORMATS[format_type]
+    widget_key = widget_key or str(abs(hash(key)))
+    request = (key, format_type, index)
+    state_key = f"export_{widget_key}"
+
+    # session_state เก็บ (request, key ใน ExportStore) ของไฟล์ที่เตรียมไว้ ถ้าสิ่งที่เลือกเปลี่ยนจะปล่อยไฟล์เดิมทันที
+    data = None
+    prepared = st.session_state.get(state_key)
+    if prepared is not None:
+        if prepared[0] == request:
+            data = store.get(prepared[1])
+        else:
+            store.release(prepared[1])
+        if data is None:
+            del st.session_state[state_key]
+    if data is None:
+        if not st.button(f"⚙️ เตรียมไฟล์ ({file_format['label']})", key=f"prepare_{widget_key}"):
+            return
+        prepared = (request, (request, uuid.uuid4().hex))
+        with st.spinner("กำลังเตรียมไฟล์..."):
+            data = store.prepare(prepared[1], lambda: prepare_export_data(build_frame(), format_type, index=index))
+        st.session_state[state_key] = prepared
+
+    st.download_button(
+        label=label,
+        data=data,
+        file_name=f"{file_name}.{file_format['extension']}",
+        mime=file_format['mime'],
+        key=f"download_{widget_key}",
+        on_click=store.release,
+        args=(prepared[1],)
+    )
@@ -0,0 +1,329 @@
+import streamlit as st
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+import pandas as pd
+
+from utils import fetch_telemetry, prepare_export_data, detect_anomalies
+from parallel import ParallelExecutor
+
+logger = logging.getLogger(__name__)
+
+# การตั้งค่าของ Job queue
+JOB_WORKERS = 2
+JOB_RETENTION_SECONDS = 60 * 60
+MAX_RETAINED_JOBS = 50
+JOB_RESULTS_MAX_BYTES = 512 * 1024 * 1024
+
+JOB_STATUSES = ['queued', 'running', 'done', 'failed', 'cancelled']
+
+class JobCancelled(Exception):
+    """ถูกโยนจาก Job.check_cancelled() เมื่อมีการยกเลิกงาน"""
+
+def _result_bytes(result: Any) -> int:
+    """ขนาดโดยประมาณ (bytes) ของผลลัพธ์ที่รู้จัก: bytes, DataFrame และ dict ที่มีค่าเหล่านี้"""
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, dict):
+        return sum(_result_bytes(value) for value in result.values())
+    return 0
+
+class Job:
+    """
+    งานเบื้องหลังหนึ่งงาน ฟังก์ชันของงานได้รับ Job เป็นอาร์กิวเมนต์แรกเพื่อรายงานความคืบหน้า
+    และตรวจสอบการยกเลิก
+
+    Args:
+        job_id: รหัสงาน
+        name: ชื่องานสำหรับแสดงผล
+        key: key สำหรับใช้ผลลัพธ์ซ้ำ (งานที่ key ตรงกันจะไม่ถูกคำนวณใหม่)
+    """
+
+    def __init__(self, job_id: str, name: str, key: Optional[Hashable] = None):
+        self.id = job_id
+        self.name = name
+        self.key = key
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result: Any = None
+        self.result_bytes = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # session ที่ติดตามงานนี้อยู่ (งานที่ key ตรงกันถูกใช้ร่วมกันหลาย session)
+        self.subscribers: Set[Hashable] = set()
+        self._cancel = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, progress: float, message: str = ''):
+        """
+        รายงานความคืบหน้า (เรียกจากภายในฟังก์ชันของงาน) และยกเลิกงานถ้ามีการขอยกเลิก
+
+        Args:
+            progress: ความคืบหน้า 0-1
+            message: ข้อความสถานะ
+        """
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message:
+            self.message = message
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        """โยน JobCancelled ถ้ามีการขอยกเลิกงาน"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        """เวลาที่ใช้ (วินาที) ตั้งแต่เริ่มทำงาน"""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+class JobQueue:
+    """
+    Job queue ภายใน process สำหรับงานหนัก เช่น export ข้อมูลหลายวันหรือสแกนค่าผิดปกติทุกคอลัมน์
+
+    งานทำงานใน thread pool จึงไม่บล็อก rerun ของ Streamlit และไม่ถูกยกเลิกหรือทำซ้ำเมื่อ auto-refresh
+    หน้าเว็บเก็บเพียง job id ไว้ใน session แล้วอ่านสถานะและผลลัพธ์ใน rerun ถัดไป
+    งานที่เสร็จแล้วถูกเก็บไว้ retention วินาที ไม่เกิน max_jobs งาน และผลลัพธ์รวมไม่เกิน max_bytes
+    (งานที่เสร็จก่อนถูกลบก่อน แต่เก็บงานล่าสุดไว้เสมอ) การยกเลิกและการลบผลลัพธ์นับตาม subscriber
+    งานที่หลาย session ใช้ร่วมกันจึงถูกยกเลิกหรือลบเมื่อไม่มี session ใดติดตามอยู่แล้วเท่านั้น
+
+    Args:
+        max_workers: จำนวนงานที่ทำพร้อมกันได้
+        retention: ระยะเวลาเก็บงานที่เสร็จแล้ว (วินาที)
+        max_jobs: จำนวนงานที่เสร็จแล้วสูงสุดที่เก็บไว้
+        max_bytes: ขนาดรวมสูงสุดของผลลัพธ์ที่เก็บไว้ (bytes)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = JOB_WORKERS,
+        retention: float = JOB_RETENTION_SECONDS,
+        max_jobs: int = MAX_RETAINED_JOBS,
+        max_bytes: int = JOB_RESULTS_MAX_BYTES
+    ):
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        *args,
+        key: Optional[Hashable] = None,
+        subscriber: Optional[Hashable] = None,
+        **kwargs
+    ) -> Job:
+        """
+        ส่งงานเข้า queue ถ้ามีงานที่ key เดียวกันกำลังทำหรือเสร็จแล้ว จะคืนงานเดิมแทนการคำนวณใหม่
+
+        Args:
+            name: ชื่องานสำหรับแสดงผล
+            fn: ฟังก์ชันของงาน fn(job, *args, **kwargs)
+            key: key สำหรับใช้ผลลัพธ์ซ้ำ (None = สร้างงานใหม่เสมอ)
+            subscriber: รหัสของผู้ติดตามงาน เช่น session (ใช้กับ cancel และ release)
+
+        Returns:
+            Job ที่ถูกส่งเข้า queue (หรืองานเดิมที่ key ตรงกัน)
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                existing = self._find(key)
+                if existing is not None:
+                    if subscriber is not None:
+                        existing.subscribers.add(subscriber)
+                    return existing
+            job = Job(f"job-{next(self._ids)}", name, key)
+            if subscriber is not None:
+                job.subscribers.add(subscriber)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        if job.cancel_requested:
+            job.status, job.finished_at = 'cancelled', time.time()
+            return
+        job.status, job.started_at = 'running', time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+            job.result, job.result_bytes = result, _result_bytes(result)
+            job.progress = 1.0
+            job.status = 'done'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.name)
+            job.status, job.error = 'failed', str(e)
+        finally:
+            job.finished_at = time.time()
+            # ตัดงานเก่าทันทีที่มีผลลัพธ์ใหม่ หน่วยความจำจึงไม่เกิน max_bytes แม้ไม่มีใครเปิดหน้าเว็บ
+            with self._lock:
+                self._prune()
+
+    def _find(self, key: Hashable) -> Optional[Job]:
+        # งานที่ล้มเหลวหรือถูกยกเลิกไม่นับ เพื่อให้ส่งงานเดิมซ้ำได้
+        for job in self._jobs.values():
+            if job.key == key and job.status in ('queued', 'running', 'done'):
+                return job
+        return None
+
+    def _prune(self):
+        now = time.time()
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        retained_bytes = sum(job.result_bytes for job in finished)
+        for i, job in enumerate(finished):
+            over_budget = retained_bytes > self.max_bytes and i < len(finished) - 1
+            if now - job.finished_at > self.retention or len(finished) - i > self.max_jobs or over_budget:
+                del self._jobs[job.id]
+                retained_bytes -= job.result_bytes
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """คืนงานตามรหัส หรือ None ถ้าไม่พบ (หมดอายุแล้ว)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, subscriber: Optional[Hashable] = None) -> bool:
+        """
+        เลิกติดตามงานและขอยกเลิกเมื่อไม่มีผู้ติดตามเหลืออยู่ งานที่ยังไม่เริ่มจะไม่ถูกรัน
+        งานที่กำลังทำจะหยุดเมื่อเรียก report/check_cancelled ครั้งถัดไป
+
+        Args:
+            job_id: รหัสงาน
+            subscriber: ผู้ติดตามที่ขอยกเลิก (None = ยกเลิกทันทีโดยไม่สนใจผู้ติดตามอื่น)
+
+        Returns:
+            True ถ้างานถูกขอยกเลิก (งานยังไม่เสร็จและไม่มีผู้ติดตามอื่น)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.subscribers.discard(subscriber)
+            if subscriber is not None and job.subscribers:
+                return False
+            job._cancel.set()
+            return True
+
+    def release(self, job_id: str, subscriber: Optional[Hashable] = None):
+        """
+        เลิกติดตามงาน และลบงานที่เสร็จแล้วพร้อมผลลัพธ์ออกจากหน่วยความจำเมื่อไม่มีผู้ติดตามเหลืออยู่
+        (ผู้ติดตามที่ปิดหน้าไปโดยไม่ release จะถูกล้างตาม retention ของ _prune)
+
+        Args:
+            job_id: รหัสงาน
+            subscriber: ผู้ติดตามที่เลิกใช้ผลลัพธ์ (None = ลบทันที)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.finished:
+                return
+            job.subscribers.discard(subscriber)
+            if subscriber is None or not job.subscribers:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict[str, int]:
+        """คืนจำนวนงานที่เก็บไว้และขนาดรวมของผลลัพธ์ (bytes)"""
+        with self._lock:
+            return {'jobs': len(self._jobs), 'bytes': sum(job.result_bytes for job in self._jobs.values())}
+
+    def jobs(self) -> List[Job]:
+        """คืนรายการงานทั้งหมด เรียงจากใหม่ไปเก่า"""
+        with self._lock:
+            self._prune()
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+# --- งานสำเร็จรูปสำหรับหน้า Analysis Tool ---
+
+def export_range_job(
+    job: Job,
+    collection_name: str,
+    device_name: str,
+    days: int,
+    format_type: str = 'parquet'
+) -> Dict[str, Any]:
+    """
+    ดึงข้อมูลย้อนหลัง days วันโดยตรงจาก MongoDB แล้ว export เป็นไฟล์
+
+    Returns:
+        {'data': bytes, 'rows': จำนวนแถว, 'format': format_type}
+    """
+    end_date_utc = datetime.utcnow()
+    start_date_utc = end_date_utc - timedelta(days=days)
+    df = fetch_telemetry(
+        collection_name, device_name, start_date_utc, end_date_utc,
+        progress=lambda fraction, rows: job.report(0.8 * fraction, f"Loaded {rows:,} rows")
+    )
+    if '_id' in df.columns:
+        df = df.drop(columns=['_id'])
+    job.report(0.8, f"Writing {len(df):,} rows as {format_type}")
+    data = prepare_export_data(df, format_type)
+    return {'data': data, 'rows': len(df), 'format': format_type}
+
+def anomaly_scan_job(
+    job: Job,
+    df: pd.DataFrame,
+    method: str = 'iqr',
+    threshold: float = 1.5,
+    executor: Optional[ParallelExecutor] = None
+) -> pd.DataFrame:
+    """
+    ตรวจหาค่าผิดปกติในทุกคอลัมน์ตัวเลข (ตรรกะเดียวกับ detect_anomalies)
+    ถ้าระบุ executor จะกระจายคอลัมน์ไปยัง process pool
+
+    Returns:
+        DataFrame สรุปต่อคอลัมน์ (column, anomalies, percent, first, last, min, max)
+    """
+    columns = df.select_dtypes('number').columns.tolist()
+    if executor is not None:
+        job.report(0.1, f"Scanning {len(columns)} columns on {executor.workers} workers")
+        masks = executor.anomaly_masks(df, columns, method, threshold)
+    else:
+        masks = {}
+        for i, column in enumerate(columns):
+            job.report(i / max(len(columns), 1), f"Scanning {column}")
+            masks[column] = detect_anomalies(df, column, method, threshold).fillna(False).to_numpy(dtype=bool)
+
+    rows = []
+    for column in columns:
+        mask = masks[column]
+        flagged = df.loc[mask]
+        rows.append({
+            'column': column,
+            'anomalies': int(mask.sum()),
+            'percent': 100.0 * mask.sum() / max(len(df), 1),
+            'first': flagged['timestamp_local_dt'].min() if 'timestamp_local_dt' in df.columns else None,
+            'last': flagged['timestamp_local_dt'].max() if 'timestamp_local_dt' in df.columns else None,
+            'min': flagged[column].min(),
+            'max': flagged[column].max(),
+        })
+    return pd.DataFrame(rows).sort_values('anomalies', ascending=False, ignore_index=True)
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """คืน JobQueue ตัวเดียวของ process"""
+    return JobQueue()
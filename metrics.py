@@ -0,0 +1,275 @@
+"""
+Metrics ของ process ในรูปแบบ Prometheus text exposition สำหรับ scrape จาก http://127.0.0.1:<METRICS_PORT>/metrics
+
+Counter และ Histogram ถูกอัปเดตเฉพาะในเส้นทางที่คุยกับ MongoDB หรือสร้างไฟล์ export
+ค่าอื่น (cache, หน่วยความจำ, จำนวน rerun, session) ถูกอ่านจาก object เดิมตอน scrape เท่านั้น
+refresh ทุก 5 วินาทีจึงไม่มีต้นทุนเพิ่ม
+"""
+import bisect
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# พอร์ตของ metrics endpoint (กำหนด METRICS_PORT=0 เพื่อปิด)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """
+    Counter ที่เพิ่มขึ้นอย่างเดียว แยกตาม label
+
+    Args:
+        name: ชื่อ metric
+        documentation: คำอธิบาย (HELP)
+        labelnames: ชื่อ label
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def totals(self) -> Dict[Tuple, float]:
+        """คืนสำเนาค่าปัจจุบัน {ค่าของ label: ค่า}"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """
+    Histogram แบบ bucket คงที่ แยกตาม label (observe ใช้ bisect หนึ่งครั้งและการบวกสามค่า)
+
+    Args:
+        name: ชื่อ metric
+        documentation: คำอธิบาย (HELP)
+        labelnames: ชื่อ label
+        buckets: ขอบบนของแต่ละ bucket (เรียงจากน้อยไปมาก)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self) -> Dict[Tuple, Tuple[int, float]]:
+        """คืนสำเนา {ค่าของ label: (จำนวนครั้ง, ผลรวม)}"""
+        with self._lock:
+            return {key: (count, total) for key, (_, total, count) in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+# --- 1. Metrics ที่ถูกอัปเดตระหว่างทำงาน ---
+
+MONGO_QUERY_SECONDS = Histogram(
+    'smartfarm_mongo_query_seconds', 'MongoDB query latency including cursor iteration.', ('collection', 'operation')
+)
+MONGO_DOCUMENTS = Counter('smartfarm_mongo_documents_total', 'Documents fetched from MongoDB.', ('collection',))
+DATA_CACHE_MISSES = Counter(
+    'smartfarm_data_cache_misses_total', 'load_data_from_mongo executions (st.cache_data misses).', ('collection',)
+)
+EXPORT_BYTES = Counter('smartfarm_export_bytes_total', 'Bytes produced by prepare_export_data.', ('format',))
+
+_METRICS = [MONGO_QUERY_SECONDS, MONGO_DOCUMENTS, DATA_CACHE_MISSES, EXPORT_BYTES]
+
+# --- 2. Metrics ที่อ่านตอน scrape ---
+
+def _sample(name: str, kind: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+def _collect_caches() -> List[str]:
+    from charting import get_figure_cache
+    from exports import get_export_store
+    from jobs import get_job_queue
+    from rollups import get_rollup_store
+    from shared_cache import get_shared_cache
+    from utils import DATA_SOURCES
+
+    counters = {'hits': [], 'misses': [], 'evictions': []}
+    sizes = []
+    figures = get_figure_cache().stats()
+    for field in counters:
+        counters[field].append(({'cache': 'figures'}, figures[field]))
+    sizes.append(({'cache': 'figures'}, figures['bytes']))
+    sizes.append(({'cache': 'exports'}, get_export_store().stats()['bytes']))
+    sizes.append(({'cache': 'job_results'}, get_job_queue().stats()['bytes']))
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared = shared_cache.stats()
+        for field in counters:
+            counters[field].append(({'cache': 'shared_disk'}, shared[field]))
+        sizes.append(({'cache': 'shared_disk'}, shared['bytes']))
+    for source in DATA_SOURCES:
+        levels = get_rollup_store(source).stats()
+        sizes.append(({'cache': f'rollups:{source}'}, sum(b for _, b in levels.values())))
+
+    lines = []
+    for field, samples in counters.items():
+        lines += _sample(f'smartfarm_cache_{field}_total', 'counter', f'Cache {field}.', samples)
+    lines += _sample('smartfarm_cache_bytes', 'gauge', 'Approximate bytes held by each cache.', sizes)
+    return lines
+
+def _collect_pages() -> List[str]:
+    from profiling import get_stage_recorder
+
+    recorder = get_stage_recorder()
+    reruns = [({'page': page}, count) for page, count in sorted(recorder.refresh_counts.items())]
+    lines = _sample('smartfarm_page_reruns_total', 'counter', 'Page and fragment reruns.', reruns)
+    summary = recorder.summary()
+    quantiles = []
+    for stage, row in summary.iterrows():
+        for quantile, column in (('0.5', 'p50_ms'), ('0.95', 'p95_ms'), ('0.99', 'p99_ms')):
+            quantiles.append(({'stage': stage, 'quantile': quantile}, row[column] / 1000))
+    lines += _sample(
+        'smartfarm_stage_seconds', 'gauge', 'Stage latency quantiles over the in-memory timing buffer.', quantiles
+    )
+    return lines
+
+def _collect_process() -> List[str]:
+    lines = []
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        lines += _sample('process_resident_memory_bytes', 'gauge', 'Resident memory size in bytes.', [({}, memory.rss)])
+    except ImportError:
+        pass
+    try:
+        from streamlit.runtime import Runtime
+        if Runtime.exists():
+            session_mgr = getattr(Runtime.instance(), '_session_mgr', None)
+            if session_mgr is not None:
+                lines += _sample(
+                    'smartfarm_active_sessions', 'gauge', 'Connected Streamlit sessions.',
+                    [({}, session_mgr.num_active_sessions())]
+                )
+    except Exception:
+        pass
+    return lines
+
+_COLLECTORS: List[Callable[[], List[str]]] = [_collect_caches, _collect_pages, _collect_process]
+
+def render_metrics() -> str:
+    """คืน metrics ทั้งหมดในรูปแบบ Prometheus text exposition"""
+    lines = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for collect in _COLLECTORS:
+        try:
+            lines += collect()
+        except Exception as e:
+            logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+    return '\n'.join(lines) + '\n'
+
+# --- 3. HTTP server ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    เริ่ม metrics endpoint ใน thread เบื้องหลัง (ครั้งเดียวต่อ process)
+
+    Returns:
+        server ที่ทำงานอยู่ หรือ None ถ้าปิดใช้งาน (port=0) หรือพอร์ตถูกใช้อยู่
+    """
+    global _server, _server_failed
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None and not _server_failed:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                # เช่น มี Streamlit process อื่นบนเครื่องใช้พอร์ตนี้อยู่แล้ว ไม่ลองใหม่ทุก rerun
+                logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+                _server_failed = True
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+        return _server
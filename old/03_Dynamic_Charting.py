@@ -75,7 +75,7 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from utils import load_data_from_mongo, calculate_vpd
+from utils import load_data_from_mongo, calculate_vpd, build_calendar_features
 from datetime import datetime, timedelta
 import numpy as np
 
@@ -520,12 +520,7 @@ elif chart_type == "Sunburst":
     
     # Example: Show data distribution by hour and device
     df_sunburst = df_plot.copy()
-    df_sunburst['hour'] = pd.to_datetime(df_sunburst['timestamp_local_dt']).dt.hour
-    df_sunburst['period'] = df_sunburst['hour'].apply(
-        lambda x: 'Morning' if 6 <= x < 12 else 
-                  'Afternoon' if 12 <= x < 18 else 
-                  'Evening' if 18 <= x < 24 else 'Night'
-    )
+    df_sunburst['period'] = build_calendar_features(df_sunburst['timestamp_local_dt'])['time_period']
     
     # Calculate mean temperature for sizing
     if 'temperature' in df_sunburst.columns:
@@ -533,7 +528,7 @@ elif chart_type == "Sunburst":
     else:
         value_col = numeric_columns[0]
     
-    df_grouped = df_sunburst.groupby(['period', 'deviceName'])[value_col].mean().reset_index()
+    df_grouped = df_sunburst.groupby(['period', 'deviceName'], observed=True)[value_col].mean().reset_index()
     
     fig = px.sunburst(
         df_grouped,
@@ -3,9 +3,10 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils import load_data_from_mongo
+from utils import load_data_from_mongo, check_rules, find_rule_intervals, RPI_HEALTH_RULES
 
 st.set_page_config(layout="wide")
+
 st.title("🍓 Raspberry Pi Health Monitoring")
 
 # --- 1. โหลดข้อมูล ---
@@ -30,23 +31,23 @@ else:
     col5.metric("🌐 Net Latency", f"{latest_data['network_latency_ms']:.1f} ms")
 
     # --- สรุปสถานะล่าสุดแบบอัจฉริยะ ---
-    summary = []
-    if latest_data['cpu_temp'] > 70:
-        summary.append("⚠️ CPU ร้อนเกินไป ควรตรวจสอบระบบระบายความร้อน")
-    if latest_data['cpu_percent'] > 90:
-        summary.append("⚠️ CPU ใช้งานสูง อาจมีโปรเซสหนัก")
-    if latest_data['memory_percent'] > 90:
-        summary.append("⚠️ หน่วยความจำใกล้เต็ม")
-    if latest_data['disk_percent'] > 90:
-        summary.append("⚠️ พื้นที่จัดเก็บใกล้เต็ม")
-    if latest_data['network_latency_ms'] > 200:
-        summary.append("⚠️ เครือข่ายช้า อาจมีปัญหาอินเทอร์เน็ต")
+    summary = check_rules(latest_data, RPI_HEALTH_RULES)
 
     if summary:
         st.error(" ".join(summary))
     else:
         st.success("สถานะล่าสุดอยู่ในเกณฑ์ปกติ 👍")
 
+    # --- ช่วงเวลาที่เกินเกณฑ์ (Alert Intervals) ---
+    alert_intervals = find_rule_intervals(df, RPI_HEALTH_RULES)
+    with st.expander(f"🚨 ช่วงเวลาที่เกินเกณฑ์ ({len(alert_intervals)} ช่วง)"):
+        if alert_intervals.empty:
+            st.write("ไม่พบช่วงเวลาที่เกินเกณฑ์")
+        else:
+            total_duration = alert_intervals.groupby('column')['duration'].sum()
+            st.write(" | ".join(f"{col}: {duration}" for col, duration in total_duration.items()))
+            st.dataframe(alert_intervals, use_container_width=True)
+
     # --- 3. ส่วนวิเคราะห์แนวโน้ม (Historical Trends) ---
     st.divider()
     st.subheader("กราฟแนวโน้มย้อนหลัง (Historical Trends)")
@@ -1,13 +1,26 @@
 # pages/02_Analysis_Tool.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from utils import load_data_from_mongo, calculate_vpd, get_vpd_status
-from streamlit_autorefresh import st_autorefresh
+from utils import (
+    load_data_from_mongo, load_history, query_telemetry, aggregate_telemetry, get_data_version,
+    calculate_vpd, get_vpd_status, DATA_SOURCES, HISTORY_RECENT_DAYS
+)
+from rollups import get_rollup_store, ROLLUP_AGGREGATIONS
+from charting import (
+    downsample, build_timeseries_figure, distribution_summary, build_histogram_figure, build_box_figure,
+    get_figure_cache, DEFAULT_POINT_BUDGET, RENDER_MODES
+)
+from exports import lazy_download_button, EXPORT_FORMATS
+from jobs import get_job_queue, export_range_job, anomaly_scan_job
+from parallel import get_parallel_executor
+from profiling import begin_refresh, stage
+from metrics import start_metrics_server
+from warmup import get_cache_warmup
+from archive import archive_available
+from sql_engine import SQL_AGGREGATIONS, DERIVED_COLUMNS
 from datetime import datetime, time, timedelta
 import numpy as np
+import uuid
 
 # Page configuration
 st.set_page_config(
@@ -16,6 +29,13 @@ st.set_page_config(
     layout="wide"
 )
 
+# ทุกขั้นตอนที่จับเวลาใน rerun นี้ถูกจัดกลุ่มเป็น refresh เดียวกัน
+begin_refresh("analysis")
+start_metrics_server()
+
+# ผู้ใช้คนแรกอาจเปิดหน้านี้ก่อนหน้า Home จึงเริ่ม warm-up จากที่นี่ด้วย (ครั้งเดียวต่อ process)
+cache_warmup = get_cache_warmup()
+
 # --- 2. Initialize Session State (The Correct Way) ---
 # We manage the state of the filter using these clear variables.
 if 'is_paused' not in st.session_state:
@@ -38,10 +58,13 @@ if 'selected_stats' not in st.session_state:
 
 # --- Auto-refresh control ---
 if not st.session_state.is_paused:
+    from streamlit_autorefresh import st_autorefresh
     st_autorefresh(interval=5000, key="analysis_refresh")
 
 # --- Main Title ---
 st.title("🔬 In-Depth Analysis")
+if cache_warmup.running:
+    st.caption(f"⏳ Warming caches in the background ({cache_warmup.progress:.0%})")
 st.caption("Advanced Data Analysis Tool with Real-time Capabilities")
 
 # --- 5. Sidebar (Control Panel) ---
@@ -89,7 +112,11 @@ with st.sidebar:
             temp_end_time = st.time_input("End Time", value=temp_end_time)
 
     else: # Quick Select
-        quick_option = st.selectbox("Quick Select:", ["Last 1 Hour", "Last 6 Hours", "Last 24 Hours", "Last 3 Days", "Last 7 Days"])
+        quick_options = ["Last 1 Hour", "Last 6 Hours", "Last 24 Hours", "Last 3 Days", "Last 7 Days"]
+        # ช่วงที่ยาวกว่า 7 วันอ่านจากคลัง Parquet (python archive.py) จึงแสดงเฉพาะเมื่อมีคลังของอุปกรณ์นี้
+        if archive_available(DATA_SOURCES[st.session_state.data_source][1]):
+            quick_options += ["Last 30 Days", "Last 90 Days"]
+        quick_option = st.selectbox("Quick Select:", quick_options)
         now = datetime.now()
         if quick_option == "Last 1 Hour":
             start_dt, end_dt = now - timedelta(hours=1), now
@@ -99,8 +126,10 @@ with st.sidebar:
             start_dt, end_dt = now - timedelta(days=1), now
         elif quick_option == "Last 3 Days":
             start_dt, end_dt = now - timedelta(days=3), now
-        else: # Last 7 Days
+        elif quick_option == "Last 7 Days":
             start_dt, end_dt = now - timedelta(days=7), now
+        else: # Last 30 / 90 Days
+            start_dt, end_dt = now - timedelta(days=int(quick_option.split()[1])), now
             
         temp_start_date, temp_end_date = start_dt.date(), end_dt.date()
         temp_start_time, temp_end_time = start_dt.time(), end_dt.time()
@@ -143,15 +172,35 @@ with st.sidebar:
 
 # --- Load Data Based on Selection ---
 # --- 6. Load and Filter Data ---
-@st.cache_data(ttl=60 if not st.session_state.is_paused else 3600)
-def load_full_data(source):
-    if source == "SmartFarm":
-        return load_data_from_mongo("telemetry_data_clean", "SmartFarm", time_delta_days=7)
-    elif source == "Raspberry Pi":
-        return load_data_from_mongo("raspberry_pi_telemetry_clean", "raspberry_pi_status", time_delta_days=7)
+# เวอร์ชันของข้อมูล (เปลี่ยนเมื่อมีเอกสารใหม่) ใช้เป็น key ของ cache ข้อมูลและกราฟ
+# auto-refresh ที่ไม่มีข้อมูลใหม่จึงเสียเพียงการตรวจเวอร์ชันหนึ่งครั้ง
+source_version = get_data_version(*DATA_SOURCES[st.session_state.data_source])
+
+@st.cache_data(ttl=600 if not st.session_state.is_paused else 3600, max_entries=8)
+def load_full_data(source, version):
+    if source in DATA_SOURCES:
+        return load_data_from_mongo(*DATA_SOURCES[source], time_delta_days=7, data_version=version)
     return pd.DataFrame()
 
-df_full = load_full_data(st.session_state.data_source)
+if st.session_state.is_filtered:
+    start_filter, end_filter = st.session_state.start_datetime_filter, st.session_state.end_datetime_filter
+else:
+    start_filter, end_filter = datetime.now() - timedelta(days=1), datetime.now()
+
+# ช่วงที่เก่ากว่า 7 วันอ่านส่วนเก่าจากคลัง Parquet (ถ้ามี) ส่วนล่าสุดยังมาจาก MongoDB
+long_range = (
+    start_filter < datetime.now() - timedelta(days=HISTORY_RECENT_DAYS)
+    and archive_available(DATA_SOURCES[st.session_state.data_source][1])
+)
+
+with stage('page.load') as load_stage:
+    if long_range:
+        df_full = load_history(
+            *DATA_SOURCES[st.session_state.data_source], start_date=start_filter, end_date=end_filter, data_version=source_version
+        )
+    else:
+        df_full = load_full_data(st.session_state.data_source, source_version)
+    load_stage.rows = len(df_full)
 # Remove the MongoDB ObjectId column as it's not serializable for plotting
 if '_id' in df_full.columns:
     df_full = df_full.drop(columns=['_id'])
@@ -160,17 +209,18 @@ if df_full.empty:
     st.error(f"❌ No data found for '{st.session_state.data_source}' in the last 7 days.")
     st.stop()
 
-# ## <-- KEY CHANGE: Filtering logic is now simpler and cleaner
-if st.session_state.is_filtered:
-    start_filter, end_filter = st.session_state.start_datetime_filter, st.session_state.end_datetime_filter
-else:
-    start_filter, end_filter = datetime.now() - timedelta(days=1), datetime.now()
+# Rollup ที่ใช้ร่วมกันทุก session จะรับเฉพาะแถวที่ใหม่กว่าที่เคยเห็น (ข้ามเมื่อเวอร์ชันข้อมูลไม่เปลี่ยน)
+rollup_store = get_rollup_store(st.session_state.data_source)
+if not long_range:
+    rollup_store.update(df_full, version=source_version)
 
 
-df_display = df_full[
-    (df_full['timestamp_local_dt'] >= start_filter) &
-    (df_full['timestamp_local_dt'] <= end_filter)
-].copy()
+with stage('page.filter') as filter_stage:
+    df_display = df_full[
+        (df_full['timestamp_local_dt'] >= start_filter) &
+        (df_full['timestamp_local_dt'] <= end_filter)
+    ].copy()
+    filter_stage.rows = len(df_display)
 
 if df_display.empty:
     st.warning("No data available for the selected time range. Try expanding the filter.")
@@ -200,11 +250,18 @@ with st.sidebar:
 
     with st.expander("⚙️ Advanced Options"):
         if chart_type in ["Line Chart", "Bar Chart", "Area Chart"] and x_axis == 'timestamp_local_dt':
-            aggregation = st.selectbox("Time Aggregation:", ["None", "1min", "5min", "15min", "30min", "1H", "1D"])
+            aggregation = st.selectbox("Time Aggregation:", ["None", "Auto", "1min", "5min", "15min", "30min", "1H", "1D"])
             if aggregation != "None":
                 agg_function = st.selectbox("Function:", ["mean", "sum", "max", "min", "median", "std"])
             else: agg_function = "mean"
         else: aggregation, agg_function = "None", "mean"
+        if chart_type in ["Line Chart", "Area Chart", "Scatter Plot"] and x_axis == 'timestamp_local_dt':
+            max_points = st.slider("Max Points per Trace:", 500, 10000, DEFAULT_POINT_BUDGET, step=100)
+            downsample_method = st.selectbox("Downsampling:", ["lttb", "minmax"], format_func=str.upper)
+        else: max_points, downsample_method = None, None
+        if chart_type in ["Line Chart", "Area Chart", "Scatter Plot"]:
+            render_mode = st.selectbox("Rendering:", RENDER_MODES, format_func=lambda x: {"auto": "Auto (WebGL for large data)", "svg": "SVG", "webgl": "WebGL"}[x])
+        else: render_mode = "auto"
         show_table = st.checkbox("Show Raw Data Table")
         available_stats = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max', 'variance', 'skewness']
         st.multiselect("Statistics for Table:", available_stats, key='selected_stats')
@@ -229,10 +286,21 @@ for i, var in enumerate(display_vars[:4]):
 st.divider()
 
 # --- Apply Time Aggregation if Needed ---
+parallel_executor = get_parallel_executor()
+resolution = None
 if aggregation != "None" and x_axis == 'timestamp_local_dt':
     try:
-        df_plot = df_display.set_index('timestamp_local_dt')[numeric_columns].resample(aggregation).agg(agg_function).reset_index()
-        st.success(f"✅ Data aggregated by **{aggregation}** using **{agg_function}**.")
+        resolution = rollup_store.choose_resolution(start_filter, end_filter) if aggregation == "Auto" else aggregation
+        rollup_columns = [col for col in numeric_columns if col in (rollup_store.columns or [])]
+        with stage('page.resample') as resample_stage:
+            if not long_range and agg_function in ROLLUP_AGGREGATIONS and rollup_columns == numeric_columns:
+                # อ่านจาก rollup ที่คำนวณไว้ล่วงหน้าแทนการ resample ข้อมูลดิบทุก rerun (rollup ครอบคลุมเฉพาะ 7 วันล่าสุด)
+                df_plot = rollup_store.query(start_filter, end_filter, resolution, agg_function, columns=numeric_columns).reset_index()
+            else:
+                # ฟังก์ชันที่ rollup ไม่รองรับ (เช่น median) กระจายตามช่วงเวลาไปยัง process pool
+                df_plot = parallel_executor.resample(df_display, 'timestamp_local_dt', numeric_columns, resolution, agg_function).reset_index()
+            resample_stage.rows = len(df_plot)
+        st.success(f"✅ Data aggregated by **{resolution}** using **{agg_function}**.")
     except Exception as e:
         st.error(f"Aggregation failed: {e}"); df_plot = df_display.copy()
 else:
@@ -241,27 +309,68 @@ else:
 st.subheader(f"📊 {chart_type}")
 if not y_axes: st.warning("Please select at least one variable for the Y-Axis in the sidebar."); st.stop()
 
-fig = None
-if chart_type == "Line Chart":
-    fig = px.line(df_plot, x=x_axis, y=y_axes, color=color_by, title=f"{', '.join(y_axes)} vs {x_axis}")
-elif chart_type == "Area Chart":
-    fig = px.area(df_plot, x=x_axis, y=y_axes, color=color_by, title=f"{', '.join(y_axes)} vs {x_axis}")
-elif chart_type == "Bar Chart":
-    fig = px.bar(df_plot, x=x_axis, y=y_axes[0], color=color_by, title=f"{y_axes[0]} vs {x_axis}")
-elif chart_type == "Scatter Plot":
-    fig = px.scatter(df_plot, x=x_axis, y=y_axes[0], color=color_by, title=f"{y_axes[0]} vs {x_axis}", hover_data=df_plot.columns)
-elif chart_type == "Box Plot":
-    fig = px.box(df_plot, y=y_axes, title="Box Plot Analysis")
-elif chart_type == "Histogram":
-    fig = px.histogram(df_plot, x=y_axes[0], marginal="box", title=f"Distribution of {y_axes[0]}")
-elif chart_type == "Heatmap":
-    if len(y_axes) < 2: st.warning("Heatmap requires at least 2 variables."); st.stop()
-    corr_matrix = df_plot[y_axes].corr()
-    fig = px.imshow(corr_matrix, text_auto=True, color_continuous_scale='RdBu_r', aspect='auto', title="Correlation Heatmap")
+if chart_type == "Heatmap" and len(y_axes) < 2: st.warning("Heatmap requires at least 2 variables."); st.stop()
+
+# กราฟถูก cache ตามเวอร์ชันของข้อมูลที่แสดงและการตั้งค่ากราฟ rerun ที่ไม่มีอะไรเปลี่ยนจึงไม่ต้องสร้างใหม่
+figure_cache = get_figure_cache()
+CHART_THEME = "plotly_white"
+data_version = (
+    st.session_state.data_source, source_version, len(df_display),
+    df_display['timestamp_local_dt'].min(), df_display['timestamp_local_dt'].max()
+)
+# ไฟล์ export ผูกกับสิ่งที่ผู้ใช้เลือก ไม่ใช่ data_version ที่เปลี่ยนเมื่อมีข้อมูลใหม่ ไฟล์ที่เตรียมไว้จึงไม่หายเมื่อ auto-refresh
+export_selection = (
+    st.session_state.data_source,
+    (start_filter, end_filter) if st.session_state.is_filtered else 'last_24h'
+)
+
+def build_main_figure():
+    """สร้างกราฟหลักตาม Chart Builder คืนค่า (figure, จำนวนจุดที่แสดง, จำนวนจุดที่ถูกตัด)"""
+    # ลดจำนวนจุดต่อ trace ก่อนส่งไปยัง browser (df_plot เดิมยังใช้สำหรับตารางและการดาวน์โหลด)
+    dropped_points = 0
+    if max_points:
+        df_chart, dropped_points = downsample(df_plot, x_axis, y_axes, max_points, downsample_method, group_by=color_by)
+    else:
+        df_chart = df_plot
+
+    fig = None
+    # df_plot ที่ resample แล้วมีจำนวนแถวและช่วงเวลาเท่ากันทุก agg function จึงรวมการตั้งค่าไว้ใน key ของผลสรุป
+    plot_version = (st.session_state.data_source, source_version, resolution, agg_function)
+    if chart_type == "Line Chart":
+        fig = build_timeseries_figure(df_chart, x_axis, y_axes, 'line', color_by, f"{', '.join(y_axes)} vs {x_axis}", render_mode)
+    elif chart_type == "Area Chart":
+        fig = build_timeseries_figure(df_chart, x_axis, y_axes, 'area', color_by, f"{', '.join(y_axes)} vs {x_axis}", render_mode)
+    elif chart_type == "Bar Chart":
+        import plotly.express as px
+        fig = px.bar(df_plot, x=x_axis, y=y_axes[0], color=color_by, title=f"{y_axes[0]} vs {x_axis}")
+    elif chart_type == "Scatter Plot":
+        fig = build_timeseries_figure(df_chart, x_axis, y_axes[:1], 'scatter', color_by, f"{y_axes[0]} vs {x_axis}", render_mode, hover_columns=list(df_chart.columns))
+    elif chart_type == "Box Plot":
+        fig = build_box_figure({var: distribution_summary(df_plot, var, version=plot_version) for var in y_axes}, title="Box Plot Analysis")
+    elif chart_type == "Histogram":
+        fig = build_histogram_figure(distribution_summary(df_plot, y_axes[0], version=plot_version), y_axes[0], title=f"Distribution of {y_axes[0]}", marginal_box=True)
+    elif chart_type == "Heatmap":
+        corr_matrix = parallel_executor.corr(df_plot, y_axes)
+        import plotly.express as px
+        fig = px.imshow(corr_matrix, text_auto=True, color_continuous_scale='RdBu_r', aspect='auto', title="Correlation Heatmap")
+
+    if fig:
+        fig.update_layout(height=600, template=CHART_THEME, legend_title_text='')
+    return fig, len(df_chart), dropped_points
+
+main_figure_key = (
+    'main', data_version, chart_type, x_axis, tuple(y_axes), resolution, agg_function, color_by,
+    max_points, downsample_method, render_mode, CHART_THEME
+)
+with stage('page.figure'):
+    fig, shown_points, dropped_points = figure_cache.get_or_build(main_figure_key, build_main_figure)
 
 if fig:
-    fig.update_layout(height=600, template="plotly_white", legend_title_text='')
-    st.plotly_chart(fig, use_container_width=True)
+    # st.plotly_chart แปลง figure เป็น JSON และส่งไปยัง browser
+    with stage('page.render', rows=shown_points):
+        st.plotly_chart(fig, use_container_width=True)
+    if dropped_points:
+        st.caption(f"⚡ Downsampled with {downsample_method.upper()}: showing {shown_points:,} of {len(df_plot):,} points ({dropped_points:,} dropped)")
 else:
     st.error("Could not generate the selected chart.")
 
@@ -269,7 +378,7 @@ else:
 st.divider()
 st.subheader("🔬 Advanced Analysis Tool")
 
-tab1, tab2, tab3 = st.tabs(["📋 Statistics", "📈 Distribution", "🔥 Correlation"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 Statistics", "📈 Distribution", "🔥 Correlation", "🧰 Background Jobs", "🦆 Long-range SQL"])
 
 with tab1:
     st.write("### ตารางสถิติ")
@@ -325,13 +434,14 @@ with tab1:
         
         st.dataframe(styled_stats, use_container_width=True)
         
-        # Download button
-        csv = stats_df.to_csv()
-        st.download_button(
+        # Download button (สร้างไฟล์เมื่อผู้ใช้ขอเท่านั้น)
+        lazy_download_button(
             label="📥 ดาวน์โหลดสถิติ (CSV)",
-            data=csv,
-            file_name=f"statistics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+            key=('statistics', export_selection, tuple(y_axes), tuple(st.session_state.selected_stats)),
+            build_frame=lambda: stats_df,
+            file_name=f"statistics_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            index=True,
+            widget_key="statistics_export"
         )
 
 with tab2:
@@ -342,39 +452,42 @@ with tab2:
             if var in df_display.columns:
                 col1, col2 = st.columns(2)
                 
+                # สรุป bin counts และ five-number summary ฝั่ง server (cache ตามคอลัมน์และช่วงข้อมูล)
+                var_summary = distribution_summary(df_display, var, bins=30, version=(st.session_state.data_source, source_version))
+                
                 with col1:
-                    fig_hist = px.histogram(
-                        df_display,
-                        x=var,
-                        nbins=30,
-                        title=f"Histogram: {var}"
+                    fig_hist = figure_cache.get_or_build(
+                        ('histogram', data_version, var, 30),
+                        lambda: build_histogram_figure(var_summary, var, title=f"Histogram: {var}").update_layout(height=300)
                     )
-                    fig_hist.update_layout(height=300)
                     st.plotly_chart(fig_hist, use_container_width=True)
                 
                 with col2:
-                    fig_box = px.box(
-                        df_display,
-                        y=var,
-                        title=f"Box Plot: {var}"
+                    fig_box = figure_cache.get_or_build(
+                        ('box', data_version, var),
+                        lambda: build_box_figure({var: var_summary}, title=f"Box Plot: {var}").update_layout(height=300)
                     )
-                    fig_box.update_layout(height=300)
                     st.plotly_chart(fig_box, use_container_width=True)
 
 with tab3:
     st.write("### ความสัมพันธ์ระหว่างตัวแปร")
     
     if len(y_axes) >= 2:
-        corr_matrix = df_display[y_axes].corr()
+        def build_correlation_figure():
+            """คำนวณ correlation matrix และสร้าง heatmap"""
+            corr_matrix = parallel_executor.corr(df_display, y_axes)
+            import plotly.express as px
+            fig_corr = px.imshow(
+                corr_matrix,
+                text_auto=True,
+                color_continuous_scale='RdBu',
+                aspect='auto',
+                title="Correlation Matrix"
+            )
+            fig_corr.update_layout(height=500)
+            return fig_corr, corr_matrix
         
-        fig_corr = px.imshow(
-            corr_matrix,
-            text_auto=True,
-            color_continuous_scale='RdBu',
-            aspect='auto',
-            title="Correlation Matrix"
-        )
-        fig_corr.update_layout(height=500)
+        fig_corr, corr_matrix = figure_cache.get_or_build(('correlation', data_version, tuple(y_axes)), build_correlation_figure)
         st.plotly_chart(fig_corr, use_container_width=True)
         
         # Correlation insights
@@ -392,6 +505,85 @@ with tab3:
     else:
         st.info("เลือกตัวแปรอย่างน้อย 2 ตัวเพื่อดูความสัมพันธ์")
 
+with tab4:
+    st.write("### งานเบื้องหลัง")
+    st.caption("งานหนักทำงานเบื้องหลังโดยไม่บล็อกหน้าเว็บ ผลลัพธ์จะแสดงที่นี่เมื่อเสร็จ (เก็บไว้ 1 ชั่วโมง)")
+
+    job_queue = get_job_queue()
+    if 'job_ids' not in st.session_state:
+        st.session_state.job_ids = []
+    # งานที่ key ตรงกันถูกใช้ร่วมกันทุก session จึงยกเลิกหรือลบผลลัพธ์ตามผู้ติดตามของแต่ละ session
+    if 'job_subscriber' not in st.session_state:
+        st.session_state.job_subscriber = uuid.uuid4().hex
+
+    def leave_job(job_id, cancel=False):
+        """เอางานออกจากรายการของ session นี้ งานถูกยกเลิกหรือลบจริงเมื่อไม่มี session อื่นติดตามอยู่"""
+        if cancel:
+            job_queue.cancel(job_id, st.session_state.job_subscriber)
+        else:
+            job_queue.release(job_id, st.session_state.job_subscriber)
+        if job_id in st.session_state.job_ids:
+            st.session_state.job_ids.remove(job_id)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        export_days = st.number_input("Export days:", min_value=1, max_value=90, value=30)
+        job_format = st.selectbox(
+            "Job export format:", [f for f in EXPORT_FORMATS if f != 'excel'], index=3,
+            format_func=lambda f: EXPORT_FORMATS[f]['label']
+        )
+        if st.button(f"📦 Export {export_days} days ({EXPORT_FORMATS[job_format]['label']})"):
+            job = job_queue.submit(
+                f"Export {st.session_state.data_source} {export_days}d as {EXPORT_FORMATS[job_format]['label']}",
+                export_range_job, *DATA_SOURCES[st.session_state.data_source], export_days, job_format,
+                key=('export', st.session_state.data_source, source_version, export_days, job_format),
+                subscriber=st.session_state.job_subscriber
+            )
+            if job.id not in st.session_state.job_ids:
+                st.session_state.job_ids.append(job.id)
+    with col2:
+        scan_method = st.selectbox("Anomaly method:", ['iqr', 'zscore'])
+        scan_threshold = st.number_input("Threshold:", min_value=0.5, max_value=10.0, value=1.5 if scan_method == 'iqr' else 3.0, step=0.5)
+        if st.button("🔎 Scan all columns for anomalies (7 days)"):
+            # df_full อาจเป็นข้อมูลช่วงยาวจากคลัง (long_range) จึงส่งเฉพาะ 7 วันล่าสุดตามที่ปุ่มระบุ
+            df_scan = df_full[df_full['timestamp_local_dt'] >= datetime.now() - timedelta(days=HISTORY_RECENT_DAYS)]
+            job = job_queue.submit(
+                f"Anomaly scan {st.session_state.data_source} ({scan_method}, {scan_threshold})",
+                anomaly_scan_job, df_scan, scan_method, scan_threshold, parallel_executor,
+                key=('anomaly', st.session_state.data_source, source_version, scan_method, scan_threshold),
+                subscriber=st.session_state.job_subscriber
+            )
+            if job.id not in st.session_state.job_ids:
+                st.session_state.job_ids.append(job.id)
+
+    # แสดงสถานะของงานที่ session นี้ส่ง (งานที่หมดอายุแล้วจะถูกตัดออก)
+    session_jobs = [job for job in map(job_queue.get, st.session_state.job_ids) if job is not None]
+    st.session_state.job_ids = [job.id for job in session_jobs]
+    if not session_jobs:
+        st.info("ยังไม่มีงานเบื้องหลัง")
+    for job in reversed(session_jobs):
+        with st.container(border=True):
+            elapsed = f" · {job.elapsed:.1f}s" if job.elapsed is not None else ""
+            st.write(f"**{job.name}** — `{job.status}`{elapsed}")
+            if not job.finished:
+                st.progress(job.progress, text=job.message or "Queued")
+                st.button("✖ Cancel", key=f"cancel_{job.id}", on_click=leave_job, args=(job.id, True))
+            elif job.status == 'failed':
+                st.error(f"Job failed: {job.error}")
+            elif job.status == 'done' and isinstance(job.result, pd.DataFrame):
+                st.dataframe(job.result, use_container_width=True, hide_index=True)
+            elif job.status == 'done':
+                file_format = EXPORT_FORMATS[job.result['format']]
+                st.download_button(
+                    label=f"📥 Download {job.result['rows']:,} rows ({len(job.result['data']) / 1e6:.1f} MB)",
+                    data=job.result['data'],
+                    file_name=f"{st.session_state.data_source}_{datetime.now():%Y%m%d_%H%M%S}.{file_format['extension']}",
+                    mime=file_format['mime'],
+                    key=f"download_{job.id}",
+                    on_click=leave_job,
+                    args=(job.id,)
+                )
+
 # --- Show Data Table if Requested ---
 if show_table:
     st.divider()
@@ -407,14 +599,94 @@ if show_table:
                 height=400
             )
             
-            # Download button
-            csv = df_plot[display_cols].to_csv(index=False)
-            st.download_button(
-                label="📥 ดาวน์โหลดข้อมูล (CSV)",
-                data=csv,
-                file_name=f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
+            # Download button (สร้างไฟล์เมื่อผู้ใช้ขอเท่านั้น)
+            export_format = st.selectbox(
+                "Export format:", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f]['label'],
+                help="CSV แบบบีบอัด, Parquet และ Arrow มีขนาดเล็กและสร้างเร็วกว่า Excel มากสำหรับข้อมูลหลายวัน"
+            )
+            lazy_download_button(
+                label=f"📥 ดาวน์โหลดข้อมูล ({EXPORT_FORMATS[export_format]['label']})",
+                key=('data', export_selection, resolution, agg_function, tuple(display_cols)),
+                build_frame=lambda: df_plot[display_cols],
+                file_name=f"data_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                format_type=export_format,
+                widget_key="data_export"
+            )
+
+with tab5:
+    st.write("### สรุปข้อมูลย้อนหลังด้วย SQL")
+    st.caption("คำนวณบนคลัง Parquet ด้วย DuckDB โดยอ่านเฉพาะไฟล์และคอลัมน์ที่ต้องใช้ ไม่โหลดข้อมูลดิบเข้าหน่วยความจำ")
+
+    archived_sources = [source for source, (_, device) in DATA_SOURCES.items() if archive_available(device)]
+    if not archived_sources:
+        st.info("ยังไม่มีคลังข้อมูลย้อนหลัง รัน `python archive.py` เพื่อสร้างจาก MongoDB")
+    else:
+        try:
+            archive_columns = query_telemetry(
+                "SELECT column_name FROM (DESCRIBE telemetry) WHERE column_type IN ('DOUBLE', 'BIGINT', 'FLOAT', 'INTEGER') "
+                "AND column_name NOT IN ('year', 'month', 'day')"
+            )['column_name'].tolist()
+        except Exception as e:
+            st.error(f"❌ เปิดคลังข้อมูลไม่สำเร็จ: {e}")
+            archive_columns = []
+
+        with st.form("sql_aggregate"):
+            c1, c2, c3, c4 = st.columns(4)
+            sql_sources = c1.multiselect("Sources:", archived_sources, default=archived_sources)
+            sql_days = c2.number_input("Days:", min_value=1, max_value=3650, value=90)
+            sql_resolution = c3.selectbox("Resolution:", ["15min", "1h", "1D", "7D"], index=1)
+            sql_agg = c4.selectbox("Function:", list(SQL_AGGREGATIONS))
+            sql_columns = st.multiselect(
+                "Variables:", list(DERIVED_COLUMNS) + archive_columns, default=list(DERIVED_COLUMNS)
             )
+            if st.form_submit_button("▶️ Run aggregation") and sql_sources and sql_columns:
+                # เก็บช่วงเวลาไว้ตอนกด เพื่อให้ auto-refresh ใช้ผลจาก cache เดิม
+                now = datetime.now().replace(second=0, microsecond=0)
+                st.session_state.sql_aggregate = dict(
+                    sources=sql_sources, start_date=now - timedelta(days=int(sql_days)), end_date=now,
+                    columns=sql_columns, resolution=sql_resolution, agg=sql_agg
+                )
+
+        if 'sql_aggregate' in st.session_state:
+            try:
+                with stage('page.sql'):
+                    df_sql = aggregate_telemetry(**st.session_state.sql_aggregate)
+                params = st.session_state.sql_aggregate
+                st.caption(
+                    f"{params['agg']} per {params['resolution']} · {params['start_date']:%Y-%m-%d} → "
+                    f"{params['end_date']:%Y-%m-%d} · {len(df_sql):,} rows"
+                )
+                for column in params['columns']:
+                    series = df_sql.pivot(index='timestamp_local_dt', columns='source', values=column).dropna(axis=1, how='all')
+                    if not series.empty:
+                        st.write(f"**{column}**")
+                        st.line_chart(series, height=250)
+            except Exception as e:
+                st.error(f"❌ Aggregation failed: {e}")
+
+        with st.expander("🧮 SQL query"):
+            st.caption("Read-only: one SELECT statement over the archive (no file access outside it).")
+            with st.form("sql_query"):
+                sql_text = st.text_area(
+                    "SQL (view: telemetry, macro: vpd(temperature, humidity))",
+                    value=st.session_state.get('sql_text', (
+                        "SELECT device, time_bucket(INTERVAL 1 DAY, timestamp_local_dt) AS day,\n"
+                        "       avg(vpd(temperature, humidity)) AS vpd, max(temperature) AS max_temperature\n"
+                        "FROM telemetry\n"
+                        "WHERE device = 'SmartFarm' AND timestamp_utc_dt >= now() - INTERVAL 90 DAY\n"
+                        "GROUP BY ALL ORDER BY day"
+                    )),
+                    height=160
+                )
+                if st.form_submit_button("▶️ Run query"):
+                    st.session_state.sql_text = sql_text
+            if st.session_state.get('sql_text'):
+                try:
+                    with stage('page.sql'):
+                        df_query = query_telemetry(st.session_state.sql_text)
+                    st.dataframe(df_query, use_container_width=True, hide_index=True)
+                except Exception as e:
+                    st.error(f"❌ Query failed: {e}")
 
 # --- Footer Information ---
 st.divider()
@@ -0,0 +1,220 @@
+# pages/Diagnostics.py
+import streamlit as st
+import pandas as pd
+import time
+from datetime import datetime
+
+from utils import DATA_SOURCES
+from profiling import get_stage_recorder
+from charting import get_figure_cache
+from exports import get_export_store
+from rollups import get_rollup_store
+from shared_cache import get_shared_cache
+from jobs import get_job_queue
+from warmup import get_cache_warmup
+
+# Page configuration
+st.set_page_config(
+    page_title="Diagnostics | SmartFarm Dashboard",
+    page_icon="🩺",
+    layout="wide"
+)
+
+st.title("🩺 Performance Diagnostics")
+st.caption("เวลาแต่ละขั้นตอนของการ refresh, cache, MongoDB และหน่วยความจำของ process นี้ ใช้แยกว่าความช้ามาจากฐานข้อมูล pandas หรือ Plotly")
+
+recorder = get_stage_recorder()
+
+# กลุ่มของขั้นตอนสำหรับสรุปว่าเวลาหมดไปกับส่วนไหน (รวมเฉพาะ self time ของแต่ละขั้นตอน
+# เช่น page.load นับเฉพาะเวลาที่ไม่อยู่ใน load_data / mongo.query / frame.* ที่ซ้อนอยู่ข้างใน)
+STAGE_GROUPS = {
+    'mongo.': 'Database', 'load_data': 'Database', 'load_history': 'Database', 'load_archive': 'Database',
+    'sql.': 'Database', 'page.load': 'Database', 'page.sql': 'Database',
+    'frame.': 'pandas', 'page.filter': 'pandas', 'page.resample': 'pandas', 'stats': 'pandas',
+    'anomalies': 'pandas', 'moving_averages': 'pandas', 'calendar': 'pandas', 'export': 'pandas',
+    'page.figure': 'Plotly', 'page.render': 'Plotly', 'home.': 'Rendering',
+}
+
+def stage_group(stage):
+    for prefix, group in STAGE_GROUPS.items():
+        if stage.startswith(prefix):
+            return group
+    return 'Other'
+
+def format_bytes(value):
+    if value is None or pd.isna(value):
+        return "-"
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(value) < 1024 or unit == 'GB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+def get_runtime():
+    """คืน Streamlit Runtime ถ้ามี (ไม่มีเมื่อรันผ่าน AppTest หรือ bare mode)"""
+    try:
+        from streamlit.runtime import Runtime
+        return Runtime.instance() if Runtime.exists() else None
+    except Exception:
+        return None
+
+if not recorder.enabled:
+    st.warning("การจับเวลาถูกปิดอยู่ (PIPELINE_PROFILING=0) ส่วนเวลาแต่ละขั้นตอนจะว่างเปล่า")
+
+with st.sidebar:
+    auto_refresh = st.toggle("Auto-refresh (10s)", value=False)
+    if st.button("🗑️ Clear timing buffer"):
+        recorder.clear()
+
+@st.fragment(run_every="10s" if auto_refresh else None)
+def diagnostics_section():
+    records = recorder.records()
+    st.caption(f"อัปเดตล่าสุด: {datetime.now().strftime('%H:%M:%S')} · {len(records):,} records in buffer")
+
+    # --- 1. Refresh latency ---
+    st.subheader("⏱️ Refresh latency by stage")
+    refreshes = recorder.refreshes(limit=30)
+    if refreshes.empty:
+        st.info("ยังไม่มีข้อมูล refresh (เปิดหน้า Home หรือ Analysis Tool ก่อน)")
+    else:
+        stage_columns = [c for c in refreshes.columns if c != 'started_at']
+        chart = refreshes.set_index('started_at')[stage_columns].sort_index()
+        st.bar_chart(chart, height=300, y_label="ms")
+        st.caption("เวลาของแต่ละขั้นตอนไม่รวมขั้นตอนย่อยที่ซ้อนอยู่ข้างใน (self time) ผลรวมของแถวจึงไม่นับเวลาซ้ำ")
+        table = refreshes.copy()
+        table.insert(1, 'total_ms', table[stage_columns].sum(axis=1))
+        st.dataframe(table.round(1), use_container_width=True)
+
+    summary = recorder.summary()
+    if not summary.empty:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.write("**Stage percentiles** (ทุก record ใน buffer, percentile รวมขั้นตอนย่อย, self_s ไม่รวม)")
+            st.dataframe(summary.round(2), use_container_width=True)
+        with col2:
+            st.write("**Time by component**")
+            by_group = summary['self_s'].groupby(summary.index.map(stage_group)).sum().sort_values(ascending=False)
+            st.dataframe(by_group.round(2).rename('self_s'), use_container_width=True)
+
+    # --- 2. MongoDB ---
+    st.subheader("🗄️ MongoDB")
+    mongo = records[records['stage'].str.startswith('mongo.')] if not records.empty else records
+    if mongo.empty:
+        st.info("ยังไม่มีการ query MongoDB ใน buffer")
+    else:
+        window = max(time.time() - mongo['started_at'].min(), 1.0)
+        queries = mongo[mongo['stage'] == 'mongo.query']
+        docs_per_second = queries['rows'].sum() / queries['seconds'].sum() if queries['seconds'].sum() > 0 else 0.0
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Round-trips", f"{len(mongo):,}", help="find ของข้อมูลช่วงเวลา, การตรวจเวอร์ชัน และการอ่านเอกสารล่าสุด")
+        col2.metric("Round-trips / min", f"{len(mongo) / window * 60:.1f}")
+        col3.metric("Documents fetched", f"{int(queries['rows'].sum()):,}")
+        col4.metric("Documents / s (while reading)", f"{docs_per_second:,.0f}")
+        per_kind = mongo.groupby('stage')['seconds'].agg(['count', 'mean', 'max'])
+        per_kind[['mean', 'max']] *= 1000
+        st.dataframe(per_kind.rename(columns={'mean': 'mean_ms', 'max': 'max_ms'}).round(2), use_container_width=True)
+
+    # --- 3. Caches ---
+    st.subheader("🧠 Caches")
+    page_loads = (records['stage'] == 'page.load').sum() if not records.empty else 0
+    data_loads = (records['stage'] == 'load_data').sum() if not records.empty else 0
+    cache_rows = []
+    figure_stats = get_figure_cache().stats()
+    lookups = figure_stats['hits'] + figure_stats['misses']
+    cache_rows.append({
+        'cache': 'Figures', 'entries': figure_stats['entries'], 'bytes': figure_stats['bytes'],
+        'hit_rate': figure_stats['hits'] / lookups if lookups else None, 'evictions': figure_stats['evictions'],
+    })
+    if page_loads:
+        # load_data ถูกบันทึกเฉพาะเมื่อ cache miss จึงประมาณ hit rate จากจำนวนครั้งที่หน้าโหลดข้อมูล
+        cache_rows.append({
+            'cache': 'Data frames (st.cache_data)', 'entries': None, 'bytes': None,
+            'hit_rate': max(0.0, 1 - data_loads / page_loads), 'evictions': None,
+        })
+    export_stats = get_export_store().stats()
+    cache_rows.append({'cache': 'Export files', 'entries': export_stats['files'], 'bytes': export_stats['bytes'], 'hit_rate': None, 'evictions': None})
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared = shared_cache.stats()
+        lookups = shared['hits'] + shared['misses']
+        cache_rows.append({
+            'cache': 'Shared disk cache', 'entries': shared['entries'], 'bytes': shared['bytes'],
+            'hit_rate': shared['hits'] / lookups if lookups else None, 'evictions': shared['evictions'],
+        })
+    for source in DATA_SOURCES:
+        levels = get_rollup_store(source).stats()
+        cache_rows.append({
+            'cache': f'Rollups: {source}', 'entries': sum(n for n, _ in levels.values()),
+            'bytes': sum(b for _, b in levels.values()), 'hit_rate': None, 'evictions': None,
+        })
+    caches = pd.DataFrame(cache_rows)
+    caches['size'] = caches['bytes'].map(format_bytes)
+    caches['hit_rate'] = caches['hit_rate'].map(lambda v: f"{v:.0%}" if v is not None and not pd.isna(v) else "-")
+    st.dataframe(caches.drop(columns=['bytes']), use_container_width=True, hide_index=True)
+
+    # --- 4. Memory ---
+    st.subheader("💾 Memory")
+    runtime = get_runtime()
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        try:
+            import psutil
+            rss = psutil.Process().memory_info().rss
+            st.metric("Process RSS", format_bytes(rss))
+        except ImportError:
+            st.metric("Process RSS", "n/a", help="ติดตั้ง psutil เพื่อดูหน่วยความจำของ process")
+    with col2:
+        if runtime is None:
+            st.info("ไม่พบ Streamlit runtime (ขนาดของ st.cache_data แสดงได้เฉพาะเมื่อรันด้วย python warmup.py หรือ streamlit run)")
+        else:
+            stats = pd.DataFrame(
+                [(s.category_name, s.cache_name, s.byte_length) for s in runtime.stats_mgr.get_stats()],
+                columns=['category', 'cache', 'bytes']
+            )
+            if not stats.empty:
+                per_cache = stats.groupby(['category', 'cache'])['bytes'].agg(['count', 'sum']).reset_index()
+                per_cache = per_cache.rename(columns={'count': 'entries'}).sort_values('sum', ascending=False)
+                per_cache['size'] = per_cache.pop('sum').map(format_bytes)
+                st.write("**Resident size per cached function / session state**")
+                st.dataframe(per_cache, use_container_width=True, hide_index=True)
+
+    # --- 5. Sessions and refresh load ---
+    st.subheader("👥 Sessions and auto-refresh load")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        session_mgr = getattr(runtime, '_session_mgr', None) if runtime is not None else None
+        if session_mgr is not None:
+            st.metric("Active sessions", session_mgr.num_active_sessions())
+            st.metric("Sessions (incl. disconnected)", session_mgr.num_sessions())
+        else:
+            st.metric("Active sessions", "n/a")
+    with col2:
+        recent = records.dropna(subset=['refresh']) if not records.empty else records
+        recent = recent[recent['started_at'] >= time.time() - 60] if not recent.empty else recent
+        if recent.empty:
+            st.info("ไม่มี refresh ใน 1 นาทีที่ผ่านมา")
+        else:
+            load = recent.groupby(recent['refresh'].str.split('#').str[0])['refresh'].nunique()
+            st.write("**Refreshes in the last minute**")
+            st.dataframe(load.rename('refreshes / min'), use_container_width=True)
+
+    # --- 6. Background work ---
+    st.subheader("🧰 Background work")
+    col1, col2 = st.columns(2)
+    with col1:
+        warmup = get_cache_warmup()
+        st.write(f"**Cache warm-up** — {warmup.progress:.0%} complete")
+        st.dataframe(pd.DataFrame(warmup.status()), use_container_width=True, hide_index=True)
+    with col2:
+        jobs = get_job_queue().jobs()
+        retained_bytes = sum(j.result_bytes for j in jobs)
+        st.write(f"**Job queue** — {sum(not j.finished for j in jobs)} active, {len(jobs)} retained ({format_bytes(retained_bytes)})")
+        if jobs:
+            st.dataframe(
+                pd.DataFrame([
+                    {'job': j.name, 'status': j.status, 'elapsed_s': j.elapsed, 'result': format_bytes(j.result_bytes)}
+                    for j in jobs
+                ]),
+                use_container_width=True, hide_index=True
+            )
+
+diagnostics_section()
@@ -0,0 +1,371 @@
+import streamlit as st
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# จำนวน worker process (กำหนดผ่าน environment variable ANALYTICS_WORKERS ได้)
+ANALYTICS_WORKERS = int(os.environ.get("ANALYTICS_WORKERS", "0")) or (os.cpu_count() or 1)
+# ข้อมูลที่เล็กกว่านี้คำนวณใน process เดิม เพราะต้นทุนการกระจายงานสูงกว่างานจริง
+PARALLEL_MIN_ROWS = 200_000
+TASKS_PER_WORKER = 2
+
+# --- 1. Shared memory ---
+
+def _create_shared(shape, dtype) -> shared_memory.SharedMemory:
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    return shared_memory.SharedMemory(create=True, size=size)
+
+def _attach(spec: Dict):
+    """เปิด shared memory ที่สร้างโดย process หลัก (process หลักเป็นผู้ unlink)"""
+    # worker ที่สร้างด้วย spawn ใช้ resource tracker ตัวเดียวกับ process หลัก
+    # การ attach จึงไม่ทำให้ segment ถูกลบเมื่อ worker จบการทำงาน
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    return shm, np.ndarray(spec['shape'], dtype=spec['dtype'], buffer=shm.buf)
+
+class SharedFrame:
+    """
+    คัดลอกคอลัมน์ตัวเลข (และเวลา) ของ DataFrame ลง shared memory ครั้งเดียว
+    worker ทุกตัวอ่านอาร์เรย์เดียวกันโดยไม่ต้อง pickle DataFrame ไปกับทุกงาน
+
+    Args:
+        df: DataFrame ต้นทาง
+        columns: คอลัมน์ตัวเลขที่ต้องการแชร์ (เก็บเป็น float64 ขนาด (คอลัมน์, แถว))
+        time_column: คอลัมน์เวลา (เก็บเป็น int64 nanoseconds) หรือ None
+        sort_by_time: เรียงแถวตามเวลาก่อนแชร์
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        columns: Sequence[str],
+        time_column: Optional[str] = None,
+        sort_by_time: bool = False
+    ):
+        self.columns = list(columns)
+        self.index = df.index
+        order = None
+        times = None
+        if time_column is not None:
+            times = pd.to_datetime(df[time_column]).to_numpy(dtype='datetime64[ns]').view('int64')
+            if sort_by_time and len(times) and np.any(np.diff(times) < 0):
+                order = np.argsort(times, kind='stable')
+                times = times[order]
+                self.index = df.index[order]
+
+        self._segments = []
+        self.values = self._share((len(self.columns), len(df)), np.float64)
+        for i, column in enumerate(self.columns):
+            column_values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            self.values[i] = column_values[order] if order is not None else column_values
+        self.times = None
+        if times is not None:
+            self.times = self._share(times.shape, np.int64)
+            self.times[:] = times
+
+    def _share(self, shape, dtype) -> np.ndarray:
+        shm = _create_shared(shape, dtype)
+        self._segments.append((shm, {'name': shm.name, 'shape': shape, 'dtype': np.dtype(dtype).str}))
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @property
+    def spec(self) -> Dict:
+        """คำอธิบาย segment ที่ส่งให้ worker (pickle ได้และมีขนาดเล็ก)"""
+        return {
+            'values': self._segments[0][1],
+            'times': self._segments[1][1] if self.times is not None else None,
+        }
+
+    def close(self):
+        """ปิดและลบ shared memory ทั้งหมด"""
+        self.values = self.times = None
+        for shm, _ in self._segments:
+            shm.close()
+            shm.unlink()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# --- 2. Kernels (ทำงานได้ทั้งใน worker และใน process เดิม) ---
+
+def _corr_kernel(values: np.ndarray, times: Optional[np.ndarray], rows: List[int]) -> np.ndarray:
+    # Pearson แบบ pairwise-complete เหมือน DataFrame.corr() สำหรับแถว rows ของ matrix
+    present = ~np.isnan(values)
+    if present.all():
+        # ไม่มีค่าว่าง: คำนวณทั้ง block ด้วยการคูณ matrix ครั้งเดียว
+        centered = values - values.mean(axis=1, keepdims=True)
+        norms = np.sqrt((centered * centered).sum(axis=1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            block = (centered[rows] @ centered.T) / np.outer(norms[rows], norms)
+        return np.clip(block, -1.0, 1.0)
+
+    out = np.full((len(rows), values.shape[0]), np.nan)
+    for k, i in enumerate(rows):
+        valid = present & present[i]
+        n = valid.sum(axis=1)
+        x = np.where(valid, values[i], 0.0)
+        y = np.where(valid, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dx = np.where(valid, x - (x.sum(axis=1) / n)[:, None], 0.0)
+            dy = np.where(valid, y - (y.sum(axis=1) / n)[:, None], 0.0)
+            r = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+        r[n < 2] = np.nan
+        out[k] = np.clip(r, -1.0, 1.0)
+    return out
+
+def _anomaly_kernel(values: np.ndarray, times: Optional[np.ndarray], rows: List[int], method: str, threshold: float) -> List[np.ndarray]:
+    # ตรรกะเดียวกับ utils.detect_anomalies คืนตำแหน่งแถวที่ผิดปกติของแต่ละคอลัมน์
+    results = []
+    for i in rows:
+        column = values[i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if method == 'zscore':
+                mask = np.abs((column - np.nanmean(column)) / np.nanstd(column, ddof=1)) > threshold
+            else:
+                q1, q3 = np.nanquantile(column, [0.25, 0.75]) if np.isfinite(column).any() else (np.nan, np.nan)
+                iqr = q3 - q1
+                mask = (column < q1 - threshold * iqr) | (column > q3 + threshold * iqr)
+        results.append(np.flatnonzero(mask))
+    return results
+
+def _rolling_kernel(
+    values: np.ndarray, times: Optional[np.ndarray], start: int, stop: int, windows: List[int], min_periods: Optional[int]
+) -> np.ndarray:
+    # ค่าเฉลี่ยเคลื่อนที่ของแถว [start, stop) โดยอ่านย้อนหลังเพิ่ม (halo) เท่ากับหน้าต่างที่ยาวที่สุด
+    halo_start = max(0, start - max(windows) + 1)
+    segment = values[:, halo_start:stop]
+    present = ~np.isnan(segment)
+    sums = np.concatenate([np.zeros((len(segment), 1)), np.cumsum(np.where(present, segment, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((len(segment), 1)), np.cumsum(present, axis=1)], axis=1)
+    offset = start - halo_start
+    ends = np.arange(offset, stop - halo_start) + 1
+    out = np.empty((len(windows), len(segment), stop - start))
+    for w, window in enumerate(windows):
+        begins = np.maximum(ends - window, 0)
+        # แถวต้นข้อมูลที่ยังไม่ครบหน้าต่าง (ตำแหน่งจริงน้อยกว่า window-1) ใช้ min_periods เหมือน pandas
+        count = counts[:, ends] - counts[:, begins]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (sums[:, ends] - sums[:, begins]) / count
+        needed = window if min_periods is None else min_periods
+        mean[count < max(needed, 1)] = np.nan
+        out[w] = mean
+    return out
+
+def _resample_kernel(
+    values: np.ndarray, times: np.ndarray, start: int, stop: int, freq_ns: int, agg: str
+) -> pd.DataFrame:
+    buckets = times[start:stop] // freq_ns * freq_ns
+    frame = pd.DataFrame(values[:, start:stop].T)
+    return frame.groupby(buckets, sort=True).agg(agg)
+
+_KERNELS = {
+    'corr': _corr_kernel,
+    'anomaly': _anomaly_kernel,
+    'rolling': _rolling_kernel,
+    'resample': _resample_kernel,
+}
+
+def _run_task(kernel: str, spec: Dict, kwargs: Dict):
+    """จุดเริ่มต้นของงานใน worker process: attach shared memory แล้วเรียก kernel"""
+    handles = []
+    values = times = None
+    try:
+        shm, values = _attach(spec['values'])
+        handles.append(shm)
+        if spec['times'] is not None:
+            shm, times = _attach(spec['times'])
+            handles.append(shm)
+        return _KERNELS[kernel](values, times, **kwargs)
+    finally:
+        del values, times
+        for shm in handles:
+            shm.close()
+
+# --- 3. Executor ---
+
+def _split(n: int, parts: int) -> List[range]:
+    bounds = np.linspace(0, n, max(1, min(parts, n)) + 1).astype(int)
+    return [range(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+class ParallelExecutor:
+    """
+    กระจายงานวิเคราะห์ที่ใช้ CPU มากไปยัง process pool โดยแบ่งตามคอลัมน์หรือตามช่วงเวลา
+    อาร์เรย์ต้นทางถูกแชร์ผ่าน shared memory แล้วรวมผลลัพธ์ย่อยกลับเป็น DataFrame
+
+    ข้อมูลที่มีน้อยกว่า min_rows แถว หรือเมื่อ workers=1 จะใช้ pandas ใน process เดิม
+
+    Args:
+        workers: จำนวน worker process
+        min_rows: จำนวนแถวขั้นต่ำที่จะใช้ process pool
+    """
+
+    def __init__(self, workers: int = ANALYTICS_WORKERS, min_rows: int = PARALLEL_MIN_ROWS):
+        self.workers = max(1, int(workers))
+        self.min_rows = min_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn ปลอดภัยกับ process ที่มีหลาย thread (เช่น Streamlit) และใช้ได้ทุกระบบปฏิบัติการ
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn'))
+            return self._pool
+
+    def shutdown(self):
+        """ปิด process pool"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def use_pool(self, n_rows: int) -> bool:
+        """ใช้ process pool หรือไม่ (ข้อมูลเล็กใช้ pandas ใน process เดิมซึ่งเร็วกว่า)"""
+        return self.workers > 1 and n_rows >= self.min_rows
+
+    def _map(self, kernel: str, shared: SharedFrame, tasks: List[Dict]) -> List:
+        pool = self._get_pool()
+        futures = [pool.submit(_run_task, kernel, shared.spec, task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def _parts(self) -> int:
+        return self.workers * TASKS_PER_WORKER
+
+    def corr(self, df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Correlation matrix (Pearson, pairwise-complete) แบ่งงานตามแถวของ matrix
+
+        Args:
+            df: DataFrame ที่ต้องการวิเคราะห์
+            columns: คอลัมน์ที่ต้องการ (None = คอลัมน์ตัวเลขทั้งหมด)
+
+        Returns:
+            DataFrame ของ correlation matrix เหมือน df[columns].corr()
+        """
+        columns = columns or df.select_dtypes('number').columns.tolist()
+        if not self.use_pool(len(df)):
+            return df[columns].corr()
+        with SharedFrame(df, columns) as shared:
+            tasks = [{'rows': list(part)} for part in _split(len(columns), self._parts())]
+            blocks = self._map('corr', shared, tasks)
+        matrix = np.vstack(blocks) if blocks else np.empty((0, 0))
+        return pd.DataFrame(matrix, index=columns, columns=columns)
+
+    def anomaly_masks(
+        self, df: pd.DataFrame, columns: List[str], method: str = 'iqr', threshold: float = 1.5
+    ) -> Dict[str, np.ndarray]:
+        """
+        ตรวจหาค่าผิดปกติทุกคอลัมน์ (ตรรกะเดียวกับ utils.detect_anomalies) แบ่งงานตามคอลัมน์
+
+        Returns:
+            Dictionary {คอลัมน์: boolean mask ตามลำดับแถวของ df}
+        """
+        if not self.use_pool(len(df)):
+            values = np.vstack([df[c].to_numpy(dtype=np.float64, na_value=np.nan) for c in columns]) if columns else None
+            positions = _anomaly_kernel(values, None, list(range(len(columns))), method, threshold) if columns else []
+        else:
+            with SharedFrame(df, columns) as shared:
+                tasks = [
+                    {'rows': list(part), 'method': method, 'threshold': threshold}
+                    for part in _split(len(columns), self._parts())
+                ]
+                positions = [p for block in self._map('anomaly', shared, tasks) for p in block]
+        masks = {}
+        for column, flagged in zip(columns, positions):
+            mask = np.zeros(len(df), dtype=bool)
+            mask[flagged] = True
+            masks[column] = mask
+        return masks
+
+    def rolling_mean(
+        self,
+        df: pd.DataFrame,
+        columns: List[str],
+        windows: List[int],
+        time_column: Optional[str] = None,
+        min_periods: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        ค่าเฉลี่ยเคลื่อนที่หลายหน้าต่าง (จำนวนแถว) แบ่งงานตามช่วงแถว/ช่วงเวลา
+
+        Args:
+            df: DataFrame ที่ต้องการคำนวณ
+            columns: คอลัมน์ที่ต้องการ
+            windows: ขนาดหน้าต่าง (จำนวนแถว)
+            time_column: เรียงตามคอลัมน์เวลาก่อนคำนวณ (None = ใช้ลำดับแถวเดิม)
+            min_periods: จำนวนค่าขั้นต่ำในหน้าต่าง (None = เท่ากับขนาดหน้าต่าง เหมือน pandas)
+
+        Returns:
+            DataFrame คอลัมน์ '{column}_MA{window}' ที่ index ตรงกับ df
+        """
+        if not self.use_pool(len(df)):
+            ordered = df.sort_values(time_column, kind='stable') if time_column else df
+            return pd.DataFrame({
+                f'{c}_MA{w}': ordered[c].rolling(w, min_periods=min_periods).mean() for w in windows for c in columns
+            }, index=ordered.index).reindex(df.index)
+        with SharedFrame(df, columns, time_column, sort_by_time=True) as shared:
+            index = shared.index
+            tasks = [
+                {'start': part.start, 'stop': part.stop, 'windows': list(windows), 'min_periods': min_periods}
+                for part in _split(len(df), self._parts())
+            ]
+            blocks = self._map('rolling', shared, tasks)
+        data = np.concatenate(blocks, axis=2) if blocks else np.empty((len(windows), len(columns), 0))
+        result = pd.DataFrame({
+            f'{column}_MA{window}': data[w, c] for w, window in enumerate(windows) for c, column in enumerate(columns)
+        }, index=index)
+        return result.reindex(df.index)
+
+    def resample(
+        self, df: pd.DataFrame, time_column: str, columns: List[str], rule: str, agg: str = 'mean'
+    ) -> pd.DataFrame:
+        """
+        สรุปข้อมูลตามช่วงเวลา (เหมือน set_index(time).resample(rule).agg(agg)) แบ่งงานตามช่วงเวลา
+        ที่ตัดตรงขอบ bucket จึงรวมผลได้โดยไม่ต้องคำนวณซ้ำ (รองรับ rule ที่หาร 1 วันลงตัว)
+
+        Returns:
+            DataFrame ที่มี index เป็นเวลาเริ่มต้นของ bucket (ชื่อตาม time_column)
+        """
+        freq_ns = pd.Timedelta(rule.replace('H', 'h')).value
+        if not self.use_pool(len(df)):
+            return df.set_index(time_column)[columns].resample(pd.Timedelta(freq_ns)).agg(agg)
+        with SharedFrame(df, columns, time_column, sort_by_time=True) as shared:
+            times = shared.times
+            # ตัดขอบของแต่ละงานให้ตรงกับขอบ bucket
+            bounds = {0, len(times)}
+            for part in _split(len(times), self._parts())[1:]:
+                boundary = times[part.start] // freq_ns * freq_ns
+                bounds.add(int(np.searchsorted(times, boundary, side='left')))
+            bounds = sorted(bounds)
+            tasks = [
+                {'start': a, 'stop': b, 'freq_ns': freq_ns, 'agg': agg}
+                for a, b in zip(bounds[:-1], bounds[1:]) if b > a
+            ]
+            parts = self._map('resample', shared, tasks)
+
+        result = pd.concat(parts) if parts else pd.DataFrame()
+        result.columns = columns
+        if not result.empty:
+            full_range = pd.date_range(
+                pd.Timestamp(result.index[0]), pd.Timestamp(result.index[-1]), freq=pd.Timedelta(freq_ns)
+            )
+            result.index = pd.to_datetime(result.index)
+            result = result.reindex(full_range)
+            if agg in ('sum', 'count'):
+                result = result.fillna(0)
+        result.index.name = time_column
+        return result
+
+@st.cache_resource
+def get_parallel_executor() -> ParallelExecutor:
+    """คืน ParallelExecutor ตัวเดียวของ process (process pool ถูกสร้างเมื่อใช้งานครั้งแรก)"""
+    return ParallelExecutor()
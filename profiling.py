@@ -0,0 +1,239 @@
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# เปิด/ปิดการจับเวลาแต่ละขั้นตอน (กำหนด PIPELINE_PROFILING=0 เพื่อปิด)
+PROFILING_ENABLED = os.environ.get("PIPELINE_PROFILING", "1") != "0"
+PROFILE_BUFFER_SIZE = 5000
+
+# seconds รวมเวลาของขั้นตอนย่อยที่อยู่ข้างใน (เช่น page.load ⊃ load_data ⊃ mongo.query) ส่วน self_seconds ไม่รวม
+# ผลรวมของ self_seconds จึงไม่นับเวลาซ้ำ ส่วน parent คือขั้นตอนที่ครอบอยู่ใน thread เดียวกัน (None = ขั้นตอนบนสุด)
+PROFILE_COLUMNS = ['refresh', 'stage', 'parent', 'started_at', 'seconds', 'self_seconds', 'rows', 'bytes', 'thread']
+
+# refresh ปัจจุบันของ thread (หนึ่ง rerun ของหน้าหรือ fragment) ใช้จัดกลุ่มขั้นตอนที่เกิดในรอบเดียวกัน
+_current_refresh: ContextVar[Optional[str]] = ContextVar('current_refresh', default=None)
+# ขั้นตอนที่กำลังทำงานอยู่ใน thread ปัจจุบัน (ใช้หา parent และหักเวลาของขั้นตอนย่อย)
+_current_stage: ContextVar[Optional['_Stage']] = ContextVar('current_stage', default=None)
+_refresh_ids = itertools.count(1)
+
+def _measure(result: Any):
+    """คืน (จำนวนแถว, ขนาด bytes) ของผลลัพธ์ที่รู้จัก โดยไม่คำนวณขนาดแบบ deep"""
+    if isinstance(result, pd.DataFrame):
+        return len(result), int(result.memory_usage(index=False).sum())
+    if isinstance(result, pd.Series):
+        return len(result), int(result.nbytes)
+    if isinstance(result, (bytes, bytearray)):
+        return None, len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+        return _measure(result[0])
+    return None, None
+
+class StageRecorder:
+    """
+    เก็บระยะเวลา จำนวนแถว และขนาดข้อมูลของแต่ละขั้นตอนใน pipeline ไว้ใน ring buffer
+
+    แต่ละ record มีต้นทุนเพียงการเรียก perf_counter สองครั้งและการ append ลง deque
+    เมื่อปิดใช้งาน stage() และ timed() จะไม่บันทึกอะไรเลย
+
+    Args:
+        maxlen: จำนวน record สูงสุดที่เก็บไว้ (record เก่าสุดถูกทิ้งก่อน)
+        enabled: เปิดการบันทึกหรือไม่
+    """
+
+    def __init__(self, maxlen: int = PROFILE_BUFFER_SIZE, enabled: bool = PROFILING_ENABLED):
+        self.enabled = enabled
+        self.refresh_counts: Dict[str, int] = {}
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        stage: str,
+        seconds: float,
+        rows: Optional[int] = None,
+        nbytes: Optional[int] = None,
+        started_at: Optional[float] = None,
+        parent: Optional[str] = None,
+        self_seconds: Optional[float] = None
+    ):
+        """
+        บันทึกหนึ่งขั้นตอน
+
+        Args:
+            stage: ชื่อขั้นตอน เช่น "mongo.query"
+            seconds: ระยะเวลา (วินาที) รวมขั้นตอนย่อย
+            rows: จำนวนแถวที่ประมวลผล (ถ้ามี)
+            nbytes: ขนาดข้อมูล (bytes, ถ้ามี)
+            started_at: เวลาเริ่ม (epoch วินาที, None = คำนวณจากเวลาปัจจุบัน)
+            parent: ชื่อขั้นตอนที่ครอบขั้นตอนนี้ (ถ้ามี)
+            self_seconds: ระยะเวลาไม่รวมขั้นตอนย่อย (None = เท่ากับ seconds)
+        """
+        if not self.enabled:
+            return
+        if started_at is None:
+            started_at = time.time() - seconds
+        if self_seconds is None:
+            self_seconds = seconds
+        entry = (
+            _current_refresh.get(), stage, parent, started_at, seconds, self_seconds, rows, nbytes,
+            threading.current_thread().name
+        )
+        # ล็อกเพื่อไม่ให้ records() อ่าน deque ขณะถูกแก้ไข
+        with self._lock:
+            self._records.append(entry)
+
+    def records(self) -> pd.DataFrame:
+        """คืน record ทั้งหมดใน buffer เป็น DataFrame (คอลัมน์ตาม PROFILE_COLUMNS)"""
+        with self._lock:
+            snapshot = list(self._records)
+        return pd.DataFrame(snapshot, columns=PROFILE_COLUMNS)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        สรุปต่อขั้นตอน: จำนวนครั้ง, p50/p95/p99/mean/max (มิลลิวินาที, รวมขั้นตอนย่อย), เวลารวม,
+        เวลารวมเฉพาะของขั้นตอนเอง (self_s), จำนวนแถวและ bytes รวม
+
+        Returns:
+            DataFrame ที่มี index เป็นชื่อขั้นตอน เรียงตามเวลารวมจากมากไปน้อย
+        """
+        df = self.records()
+        columns = ['count', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'max_ms', 'total_s', 'self_s', 'rows', 'bytes']
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        rows = {}
+        for stage, group in df.groupby('stage', sort=False):
+            seconds = group['seconds'].to_numpy()
+            p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+            rows[stage] = [
+                len(seconds), p50, p95, p99, seconds.mean() * 1000, seconds.max() * 1000, seconds.sum(),
+                group['self_seconds'].sum(), group['rows'].sum(min_count=1), group['bytes'].sum(min_count=1),
+            ]
+        summary = pd.DataFrame.from_dict(rows, orient='index', columns=columns)
+        summary.index.name = 'stage'
+        return summary.sort_values('total_s', ascending=False)
+
+    def refreshes(self, limit: int = 20) -> pd.DataFrame:
+        """
+        เวลาของแต่ละขั้นตอนใน refresh ล่าสุด (หนึ่งแถวต่อ refresh, หนึ่งคอลัมน์ต่อขั้นตอน หน่วยมิลลิวินาที)
+        ใช้ self_seconds ผลรวมของแถวจึงเท่ากับเวลาที่วัดได้ของ refresh โดยไม่นับขั้นตอนซ้อนซ้ำ
+        """
+        df = self.records().dropna(subset=['refresh'])
+        if df.empty:
+            return pd.DataFrame()
+        started = df.groupby('refresh')['started_at'].min()
+        recent = started.sort_values(ascending=False).index[:limit]
+        df = df[df['refresh'].isin(recent)]
+        table = df.pivot_table(index='refresh', columns='stage', values='self_seconds', aggfunc='sum') * 1000
+        table.insert(0, 'started_at', pd.to_datetime(started[table.index], unit='s'))
+        return table.sort_values('started_at', ascending=False)
+
+    def clear(self):
+        """ลบ record ทั้งหมด"""
+        with self._lock:
+            self._records.clear()
+
+_recorder = StageRecorder()
+
+def get_stage_recorder() -> StageRecorder:
+    """คืน StageRecorder ของ process"""
+    return _recorder
+
+def begin_refresh(name: str) -> str:
+    """
+    เริ่ม refresh ใหม่ของ thread ปัจจุบัน ขั้นตอนที่ถูกบันทึกหลังจากนี้จะถูกจัดกลุ่มอยู่ใน refresh นี้
+
+    Args:
+        name: ชื่อหน้าหรือ fragment เช่น "analysis"
+
+    Returns:
+        รหัสของ refresh เช่น "analysis#12"
+    """
+    refresh_id = f"{name}#{next(_refresh_ids)}"
+    _current_refresh.set(refresh_id)
+    # นับจำนวน rerun ต่อหน้าแม้ปิดการจับเวลา (ใช้ใน metrics)
+    with _recorder._lock:
+        _recorder.refresh_counts[name] = _recorder.refresh_counts.get(name, 0) + 1
+    return refresh_id
+
+class _Stage:
+    __slots__ = ('name', 'rows', 'bytes', 'child_seconds', '_parent', '_token', '_started', '_wall')
+
+    def __init__(self, name: str, rows: Optional[int] = None):
+        self.name = name
+        self.rows = rows
+        self.bytes: Optional[int] = None
+        self.child_seconds = 0.0
+
+    def __enter__(self):
+        self._parent = _current_stage.get()
+        self._token = _current_stage.set(self)
+        self._wall = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._started
+        _current_stage.reset(self._token)
+        parent = self._parent
+        if parent is not None:
+            parent.child_seconds += seconds
+        _recorder.record(
+            self.name, seconds, self.rows, self.bytes, self._wall,
+            parent=parent.name if parent is not None else None,
+            self_seconds=max(seconds - self.child_seconds, 0.0)
+        )
+        return False
+
+class _NullStage:
+    __slots__ = ('rows', 'bytes')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+# ใช้ตัวเดียวร่วมกันเมื่อปิดการบันทึก (ค่า rows / bytes ที่ถูกกำหนดจะถูกทิ้ง)
+_NULL_STAGE = _NullStage()
+
+def stage(name: str, rows: Optional[int] = None):
+    """
+    Context manager สำหรับจับเวลาหนึ่งขั้นตอน กำหนด .rows / .bytes ของ object ที่ได้เพื่อบันทึกขนาดข้อมูล
+
+        with stage('page.filter') as s:
+            df = df[mask]
+            s.rows = len(df)
+    """
+    if not _recorder.enabled:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+def timed(name: str, refresh: bool = False) -> Callable:
+    """
+    Decorator สำหรับจับเวลาฟังก์ชัน จำนวนแถวและขนาดถูกอ่านจากผลลัพธ์ถ้าเป็น DataFrame, Series หรือ bytes
+
+    Args:
+        name: ชื่อขั้นตอน
+        refresh: เริ่ม refresh ใหม่ทุกครั้งที่ฟังก์ชันถูกเรียก (ใช้กับ fragment)
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _recorder.enabled:
+                return fn(*args, **kwargs)
+            if refresh:
+                begin_refresh(name)
+            with _Stage(name) as timing:
+                result = fn(*args, **kwargs)
+                timing.rows, timing.bytes = _measure(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,242 @@
+import streamlit as st
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ความละเอียดที่รองรับ (ต้องเป็นผลคูณของความละเอียดที่ละเอียดที่สุด)
+ROLLUP_RESOLUTIONS = ['1min', '5min', '15min', '30min', '1h', '1D']
+ROLLUP_STATS = ['count', 'sum', 'min', 'max', 'sumsq']
+# ฟังก์ชันที่คำนวณได้จาก count/sum/min/max/sumsq (median คำนวณไม่ได้)
+ROLLUP_AGGREGATIONS = ['mean', 'sum', 'min', 'max', 'count', 'std']
+DEFAULT_MAX_POINTS = 2000
+
+_MERGE_OPS = {'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max', 'sumsq': 'sum'}
+
+def _normalize_resolution(resolution: str) -> str:
+    """แปลงชื่อความละเอียดจาก UI (เช่น '1H') ให้ตรงกับ ROLLUP_RESOLUTIONS"""
+    delta = pd.Timedelta(resolution.replace('H', 'h'))
+    for name in ROLLUP_RESOLUTIONS:
+        if pd.Timedelta(name) == delta:
+            return name
+    raise ValueError(f"Unsupported rollup resolution: '{resolution}'. Use one of {ROLLUP_RESOLUTIONS}.")
+
+def _partial_aggregate(values: pd.DataFrame) -> pd.DataFrame:
+    """สรุป count/sum/min/max/sumsq ตาม index (bucket) ของ values"""
+    grouped = values.groupby(level=0, sort=True)
+    return pd.concat({
+        'count': grouped.count(),
+        'sum': grouped.sum(),
+        'min': grouped.min(),
+        'max': grouped.max(),
+        'sumsq': (values * values).groupby(level=0, sort=True).sum(),
+    }, axis=1)
+
+def _merge_aggregates(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """รวม partial aggregates ที่มี bucket ซ้ำกันให้เป็นชุดเดียว"""
+    combined = pd.concat(frames)
+    return pd.concat({
+        stat: combined[stat].groupby(level=0, sort=True).agg(op) for stat, op in _MERGE_OPS.items()
+    }, axis=1)
+
+class RollupStore:
+    """
+    เก็บค่าสรุป count/sum/min/max/sum-of-squares ต่อคอลัมน์ไว้หลายความละเอียด
+
+    ข้อมูลดิบใหม่จะถูกสรุปเป็นความละเอียดที่ละเอียดที่สุดก่อน แล้วค่อย roll up ต่อเป็นความละเอียด
+    ที่หยาบกว่า การ update ซ้ำด้วยข้อมูลชุดเดิมจะรับเฉพาะแถวที่ _id ยังไม่เคยถูกนำเข้า (แถวที่มาช้า
+    หรือมีเวลาเท่ากับแถวล่าสุดจึงไม่หาย) แถวที่ไม่มี _id รับเฉพาะเมื่อใหม่กว่า watermark
+    ทำให้ query ช่วงเวลายาวๆ มีต้นทุนตามจำนวน bucket ไม่ใช่จำนวนแถวดิบ
+
+    Args:
+        time_column: ชื่อคอลัมน์ที่เก็บข้อมูลเวลา
+        resolutions: รายการความละเอียดที่ต้องการเก็บ
+        retention: ระยะเวลาที่เก็บ bucket ไว้ (None = ไม่ลบ)
+    """
+
+    def __init__(
+        self,
+        time_column: str = 'timestamp_local_dt',
+        resolutions: List[str] = ROLLUP_RESOLUTIONS,
+        retention: Optional[str] = None
+    ):
+        self.time_column = time_column
+        self.resolutions = sorted((_normalize_resolution(r) for r in resolutions), key=pd.Timedelta)
+        finest = pd.Timedelta(self.resolutions[0])
+        if any(pd.Timedelta(r) % finest for r in self.resolutions):
+            raise ValueError("All rollup resolutions must be multiples of the finest resolution.")
+        self.retention = pd.Timedelta(retention) if retention else None
+        self.columns: Optional[List[str]] = None
+        self.watermark: Optional[pd.Timestamp] = None
+        self.version: Optional[str] = None
+        self._levels: Dict[str, pd.DataFrame] = {}
+        # _id ของแถวที่นำเข้าแล้ว -> เวลาของแถว (ลบตาม retention เดียวกับ bucket)
+        self._seen_ids = pd.Series(dtype='datetime64[ns]')
+        self._lock = threading.Lock()
+
+    def update(self, df: pd.DataFrame, version: Optional[str] = None) -> int:
+        """
+        เพิ่มข้อมูลดิบเข้า rollup (รับเฉพาะแถวที่ยังไม่เคยนำเข้า ตาม _id หรือ watermark ถ้าไม่มี _id)
+
+        Args:
+            df: DataFrame ข้อมูลดิบ (ลำดับแถวใดก็ได้)
+            version: เวอร์ชันของข้อมูลจาก get_data_version (ถ้าตรงกับครั้งก่อนจะข้ามทันที)
+
+        Returns:
+            จำนวนแถวที่ถูกนำเข้า
+        """
+        if df.empty or self.time_column not in df.columns:
+            return 0
+
+        with self._lock:
+            if version is not None and version == self.version:
+                return 0
+            self.version = version
+            if self.columns is None:
+                self.columns = df.select_dtypes(include=np.number).columns.tolist()
+            times = pd.to_datetime(df[self.time_column])
+            newer = times > self.watermark if self.watermark is not None else times.notna()
+            if '_id' in df.columns:
+                ids = df['_id']
+                has_id = ids.notna().to_numpy()
+                unseen = ~(ids.isin(self._seen_ids.index) | ids.duplicated()).to_numpy()
+                new_rows = times.notna() & np.where(has_id, unseen, newer)
+                recorded = new_rows.to_numpy() & has_id
+                added_ids = pd.Series(times[recorded].to_numpy(), index=ids[recorded].to_numpy())
+            else:
+                new_rows, added_ids = newer, None
+            if not new_rows.any():
+                return 0
+
+            times = times[new_rows]
+            values = df.loc[new_rows, [c for c in self.columns if c in df.columns]].astype('float64')
+            values = values.reindex(columns=self.columns)
+
+            partial = None
+            for resolution in self.resolutions:
+                if partial is None:
+                    values.index = pd.DatetimeIndex(times.dt.floor(resolution))
+                    partial = _partial_aggregate(values)
+                else:
+                    # roll up จากความละเอียดที่ละเอียดกว่าแทนการสรุปจากข้อมูลดิบซ้ำ
+                    partial.index = partial.index.floor(resolution)
+                    partial = _merge_aggregates([partial])
+                self._levels[resolution] = self._append(self._levels.get(resolution), partial)
+
+            if added_ids is not None:
+                self._seen_ids = pd.concat([self._seen_ids, added_ids])
+            self.watermark = times.max() if self.watermark is None else max(self.watermark, times.max())
+            if self.retention is not None:
+                cutoff = self.watermark - self.retention
+                for resolution, frame in self._levels.items():
+                    self._levels[resolution] = frame[frame.index >= cutoff.floor(resolution)]
+                self._seen_ids = self._seen_ids[self._seen_ids >= cutoff]
+            return int(new_rows.sum())
+
+    @staticmethod
+    def _append(existing: Optional[pd.DataFrame], partial: pd.DataFrame) -> pd.DataFrame:
+        if existing is None or existing.empty:
+            return partial.copy()
+        # เฉพาะ bucket ที่ทับซ้อนกันเท่านั้นที่ต้องรวมค่า ส่วนที่เหลือต่อท้ายได้เลย
+        split = existing.index.searchsorted(partial.index[0])
+        head, tail = existing.iloc[:split], existing.iloc[split:]
+        merged = _merge_aggregates([tail, partial]) if not tail.empty else partial
+        return pd.concat([head, merged])
+
+    def choose_resolution(self, start: pd.Timestamp, end: pd.Timestamp, max_points: int = DEFAULT_MAX_POINTS) -> str:
+        """
+        เลือกความละเอียดที่ละเอียดที่สุดที่จำนวนจุดไม่เกิน max_points
+
+        Args:
+            start: เวลาเริ่มต้น
+            end: เวลาสิ้นสุด
+            max_points: จำนวนจุดสูงสุดต่อ series
+
+        Returns:
+            ชื่อความละเอียด
+        """
+        span = pd.Timestamp(end) - pd.Timestamp(start)
+        for resolution in self.resolutions:
+            if span / pd.Timedelta(resolution) <= max_points:
+                return resolution
+        return self.resolutions[-1]
+
+    def query(
+        self,
+        start: Optional[pd.Timestamp] = None,
+        end: Optional[pd.Timestamp] = None,
+        resolution: str = 'auto',
+        agg: str = 'mean',
+        columns: Optional[List[str]] = None,
+        max_points: int = DEFAULT_MAX_POINTS
+    ) -> pd.DataFrame:
+        """
+        ดึงค่าสรุปของช่วงเวลาที่ต้องการ
+
+        Args:
+            start: เวลาเริ่มต้น (None = ตั้งแต่ bucket แรก)
+            end: เวลาสิ้นสุด (None = ถึง bucket ล่าสุด)
+            resolution: ความละเอียด หรือ 'auto' เพื่อเลือกตาม max_points
+            agg: ฟังก์ชันสรุป ('mean', 'sum', 'min', 'max', 'count', 'std')
+            columns: คอลัมน์ที่ต้องการ (None = ทั้งหมด)
+            max_points: จำนวนจุดสูงสุดเมื่อใช้ resolution='auto'
+
+        Returns:
+            DataFrame ที่มี index เป็นเวลาเริ่มต้นของ bucket (ชื่อตาม time_column)
+        """
+        if agg not in ROLLUP_AGGREGATIONS:
+            raise ValueError(f"Aggregation '{agg}' cannot be served from rollups. Use one of {ROLLUP_AGGREGATIONS}.")
+
+        with self._lock:
+            if not self._levels:
+                return pd.DataFrame(columns=columns or [])
+            if resolution == 'auto':
+                first = self._levels[self.resolutions[0]].index[0]
+                resolution = self.choose_resolution(start or first, end or self.watermark, max_points)
+            resolution = _normalize_resolution(resolution)
+            frame = self._levels[resolution]
+
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start).floor(resolution)]
+        if end is not None:
+            frame = frame[frame.index <= pd.Timestamp(end)]
+        columns = columns or self.columns
+        count = frame['count'][columns]
+        total = frame['sum'][columns]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if agg == 'mean':
+                result = total / count
+            elif agg == 'sum':
+                result = total
+            elif agg == 'count':
+                result = count
+            elif agg == 'std':
+                variance = (frame['sumsq'][columns] - total * total / count) / (count - 1)
+                result = np.sqrt(variance.clip(lower=0))
+            else:
+                result = frame[agg][columns]
+
+        # เติม bucket ที่ไม่มีข้อมูลเป็น NaN เหมือน DataFrame.resample
+        if not result.empty:
+            result = result.reindex(pd.date_range(result.index[0], result.index[-1], freq=resolution))
+            if agg in ('sum', 'count'):
+                result = result.fillna(0)
+        result.index.name = self.time_column
+        return result
+
+    def stats(self) -> Dict[str, Tuple[int, int]]:
+        """คืนจำนวน bucket และขนาดหน่วยความจำ (bytes) ของแต่ละความละเอียด"""
+        with self._lock:
+            return {r: (len(f), int(f.memory_usage(deep=True).sum())) for r, f in self._levels.items()}
+
+@st.cache_resource
+def get_rollup_store(source: str) -> RollupStore:
+    """
+    คืน RollupStore ของแหล่งข้อมูล (ใช้ร่วมกันทุก session ใน process)
+
+    Args:
+        source: ชื่อแหล่งข้อมูล เช่น "SmartFarm" หรือ "Raspberry Pi"
+    """
+    return RollupStore(retention='7D')
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# ไดเรกทอรีของ cache ที่ใช้ร่วมกันทุก process บนเครื่อง (ไม่กำหนด = ปิดใช้งาน)
+SHARED_CACHE_DIR = os.environ.get("SHARED_CACHE_DIR")
+SHARED_CACHE_MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+SHARED_CACHE_TTL = 600
+
+@contextmanager
+def _file_lock(path: str):
+    """ล็อกไฟล์แบบ exclusive ระหว่าง process (fcntl บน POSIX, msvcrt บน Windows)"""
+    with open(path, 'a+b') as handle:
+        try:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """แปลงคอลัมน์ object ที่ Arrow เขียนไม่ได้ (เช่น ObjectId ใน _id) เป็นสตริง"""
+    import pyarrow as pa
+
+    converted = None
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if converted is None:
+                converted = df.copy(deep=False)
+            converted[column] = df[column].astype(str)
+    return converted if converted is not None else df
+
+class SharedFrameCache:
+    """
+    Cache ของ DataFrame บนดิสก์ที่ใช้ร่วมกันทุก Streamlit process บนเครื่องเดียวกัน
+
+    แต่ละรายการเก็บเป็นไฟล์ Arrow IPC และอ่านกลับผ่าน memory map ส่วน index (index.json)
+    ถูกป้องกันด้วย file lock การเขียนเป็นแบบ atomic (เขียนไฟล์ชั่วคราวแล้ว os.replace)
+    รายการหมดอายุตาม TTL และเมื่อขนาดรวมเกิน max_bytes จะลบรายการที่ใช้ล่าสุดนานที่สุดก่อน
+
+    Args:
+        directory: ไดเรกทอรีของ cache
+        max_bytes: ขนาดรวมสูงสุดของไฟล์ใน cache (bytes)
+        ttl: อายุเริ่มต้นของรายการ (วินาที)
+    """
+
+    def __init__(self, directory: str, max_bytes: int = SHARED_CACHE_MAX_BYTES, ttl: float = SHARED_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, 'index.json')
+        self._lock_path = os.path.join(directory, 'index.lock')
+        self._counter_lock = threading.Lock()
+
+    @staticmethod
+    def _digest(key: Hashable) -> str:
+        return hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.arrow")
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict]):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _remove(self, index: Dict[str, Dict], digest: str):
+        index.pop(digest, None)
+        try:
+            os.remove(self._path(digest))
+        except OSError:
+            # ไฟล์อาจถูก process อื่นเปิดอยู่ (Windows) จะถูกเขียนทับในครั้งถัดไป
+            pass
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """
+        คืน DataFrame ของ key หรือ None ถ้าไม่มีหรือหมดอายุแล้ว
+        """
+        import pyarrow as pa
+
+        digest = self._digest(key)
+        now = time.time()
+        with _file_lock(self._lock_path):
+            index = self._read_index()
+            entry = index.get(digest)
+            if entry is None or entry['expires_at'] <= now:
+                if entry is not None:
+                    self._remove(index, digest)
+                    self._write_index(index)
+                self._count('misses')
+                return None
+            entry['accessed_at'] = now
+            self._write_index(index)
+
+        try:
+            with pa.memory_map(self._path(digest), 'r') as source:
+                df = pa.ipc.open_file(source).read_pandas()
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.warning("Shared cache entry %s is unreadable: %s", digest, e)
+            self._count('misses')
+            return None
+        self._count('hits')
+        return df
+
+    def put(self, key: Hashable, df: pd.DataFrame, ttl: Optional[float] = None) -> pd.DataFrame:
+        """
+        เก็บ DataFrame ไว้ใน cache (แทนที่รายการเดิมของ key)
+
+        Args:
+            key: key ของรายการ
+            df: DataFrame ที่ต้องการเก็บ
+            ttl: อายุของรายการ (วินาที, None = ใช้ค่าเริ่มต้น)
+
+        Returns:
+            DataFrame ที่ถูกเก็บจริง (คอลัมน์ที่ Arrow เขียนไม่ได้ถูกแปลงเป็นสตริง)
+        """
+        import pyarrow as pa
+
+        df = _arrow_safe(df)
+        digest = self._digest(key)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = os.path.join(self.directory, f"tmp-{uuid.uuid4().hex}.arrow")
+        try:
+            # ไม่บีบอัด เพื่อให้อ่านกลับผ่าน memory map ได้โดยไม่ต้องคลายข้อมูล
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return df
+
+            now = time.time()
+            with _file_lock(self._lock_path):
+                index = self._read_index()
+                os.replace(tmp_path, self._path(digest))
+                index[digest] = {
+                    'key': repr(key)[:200], 'bytes': size, 'created_at': now, 'accessed_at': now,
+                    'expires_at': now + (self.ttl if ttl is None else ttl),
+                }
+                self._evict(index, now)
+                self._write_index(index)
+        except OSError as e:
+            logger.warning("Could not write shared cache entry %s: %s", digest, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return df
+        self._count('writes')
+        return df
+
+    def _evict(self, index: Dict[str, Dict], now: float):
+        for digest in [d for d, entry in index.items() if entry['expires_at'] <= now]:
+            self._remove(index, digest)
+            self._count('evictions')
+        total = sum(entry['bytes'] for entry in index.values())
+        for digest in sorted(index, key=lambda d: index[d]['accessed_at']):
+            if total <= self.max_bytes:
+                break
+            total -= index[digest]['bytes']
+            self._remove(index, digest)
+            self._count('evictions')
+
+    def get_or_load(self, key: Hashable, load: Callable[[], pd.DataFrame], ttl: Optional[float] = None) -> pd.DataFrame:
+        """
+        คืน DataFrame จาก cache ถ้ามี มิฉะนั้นเรียก load() แล้วเก็บผลลัพธ์ (ยกเว้น DataFrame ว่าง)
+        """
+        df = self.get(key)
+        if df is not None:
+            return df
+        df = load()
+        return self.put(key, df, ttl) if not df.empty else df
+
+    def clear(self):
+        """ลบทุกรายการใน cache"""
+        with _file_lock(self._lock_path):
+            index = self._read_index()
+            for digest in list(index):
+                self._remove(index, digest)
+            self._write_index(index)
+
+    def stats(self) -> Dict[str, float]:
+        """คืนสถิติของ process นี้ (hits, misses, writes, evictions) และขนาดรวมของ cache บนดิสก์"""
+        with _file_lock(self._lock_path):
+            index = self._read_index()
+        return {
+            'hits': self.hits, 'misses': self.misses, 'writes': self.writes, 'evictions': self.evictions,
+            'entries': len(index), 'bytes': sum(entry['bytes'] for entry in index.values()),
+        }
+
+_shared_cache: Optional[SharedFrameCache] = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache() -> Optional[SharedFrameCache]:
+    """คืน SharedFrameCache ของ process ถ้ากำหนด SHARED_CACHE_DIR ไว้ มิฉะนั้นคืน None"""
+    global _shared_cache
+    if not SHARED_CACHE_DIR:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedFrameCache(SHARED_CACHE_DIR)
+        return _shared_cache
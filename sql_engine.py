@@ -0,0 +1,191 @@
+"""
+SQL เชิงวิเคราะห์บนคลัง Parquet ของ telemetry (archive.py) ด้วย DuckDB แบบ embedded
+
+view ``telemetry`` ครอบไฟล์ทุกไฟล์ในคลังโดยมีคอลัมน์ partition device, year, month, day
+และคอลัมน์ timestamp_local_dt ที่คำนวณจาก timestamp_utc_dt มี macro ``vpd(temperature, humidity)`` ให้ใช้
+
+    SELECT device, time_bucket(INTERVAL 1 HOUR, timestamp_local_dt) AS hour, avg(vpd(temperature, humidity)) AS vpd
+    FROM telemetry
+    WHERE device = 'SmartFarm' AND timestamp_utc_dt >= now() - INTERVAL 90 DAY
+    GROUP BY ALL ORDER BY hour
+
+DuckDB อ่านเฉพาะคอลัมน์ที่ query ใช้ ข้ามไฟล์จากเงื่อนไขบน device/year/month/day
+และข้าม row group จากสถิติของ timestamp_utc_dt การ aggregate ทำแบบ streaming และ spill ลงดิสก์เมื่อเกิน
+SQL_MEMORY_LIMIT จึงใช้กับข้อมูลที่ใหญ่กว่าหน่วยความจำได้
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+from archive import ARCHIVE_DIR, partition_ranges
+
+# จำกัดหน่วยความจำของ DuckDB (เช่น "1GB", ไม่กำหนด = ค่าเริ่มต้นของ DuckDB คือ 80% ของ RAM)
+SQL_MEMORY_LIMIT = os.environ.get("SQL_MEMORY_LIMIT")
+SQL_TEMP_DIR = os.environ.get("SQL_TEMP_DIR", os.path.join(tempfile.gettempdir(), "smartfarm-duckdb"))
+
+# ชื่อฟังก์ชัน aggregate ของหน้าเว็บ -> ฟังก์ชันของ DuckDB
+SQL_AGGREGATIONS = {
+    'mean': 'avg', 'sum': 'sum', 'min': 'min', 'max': 'max', 'median': 'median', 'std': 'stddev_samp', 'count': 'count',
+}
+# คอลัมน์คำนวณที่ใช้ใน aggregate() ได้เหมือนคอลัมน์จริง
+DERIVED_COLUMNS = {'vpd': 'vpd(temperature, humidity)'}
+
+_VPD_MACRO = "CREATE OR REPLACE MACRO vpd(t, h) AS 0.61078 * exp(17.27 * t / (t + 237.3)) * (1 - h / 100)"
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+class TelemetrySQL:
+    """
+    DuckDB database ในหน่วยความจำของ process ที่ query คลัง Parquet โดยตรง (ไม่คัดลอกข้อมูลเข้า database)
+
+    แต่ละ query ใช้ cursor ของตัวเอง จึงเรียกจากหลาย session / thread พร้อมกันได้
+
+    Args:
+        root: ไดเรกทอรีของคลังข้อมูล
+        memory_limit: ขีดจำกัดหน่วยความจำของ DuckDB (None = ค่าเริ่มต้น)
+        temp_directory: ไดเรกทอรีที่ DuckDB spill ข้อมูลเมื่อเกิน memory_limit
+    """
+
+    def __init__(
+        self,
+        root: str = ARCHIVE_DIR,
+        memory_limit: Optional[str] = SQL_MEMORY_LIMIT,
+        temp_directory: str = SQL_TEMP_DIR
+    ):
+        import duckdb
+
+        self.root = root
+        config = {'temp_directory': temp_directory}
+        if memory_limit:
+            config['memory_limit'] = memory_limit
+        self._con = duckdb.connect(config=config)
+        self._con.execute(_VPD_MACRO)
+        # query มาจากผู้ใช้หน้าเว็บได้ จึงจำกัดการเข้าถึงไฟล์ไว้เฉพาะคลังและไดเรกทอรี spill
+        # (ไม่อ่าน .streamlit/secrets.toml หรือไฟล์อื่นของเครื่อง) แล้วล็อกไม่ให้ SET ค่ากลับได้
+        self._con.execute("SET allowed_directories = ?", [[root, temp_directory]])
+        self._con.execute("SET enable_external_access = false")
+        self._con.execute("SET lock_configuration = true")
+        self._view_ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_view(self):
+        # สร้าง view เมื่อคลังมีไฟล์แล้วเท่านั้น (DuckDB ตรวจ glob ตอนสร้าง view) หลังจากนั้นไฟล์และคอลัมน์ใหม่
+        # จาก backfill รอบถัดไปถูกเห็นอัตโนมัติเพราะ view ถูก bind ใหม่ทุก query
+        with self._lock:
+            if self._view_ready:
+                return
+            pattern = os.path.join(self.root, "device=*", "year=*", "month=*", "day=*", "*.parquet").replace("'", "''")
+            if not os.path.isdir(self.root) or not any(
+                name.startswith("device=") for name in os.listdir(self.root)
+            ):
+                raise FileNotFoundError(f"No telemetry archive in {self.root} (run: python archive.py)")
+            self._con.execute(
+                "CREATE OR REPLACE VIEW telemetry AS "
+                "SELECT * EXCLUDE (_id), timestamp_utc_dt + INTERVAL 7 HOUR AS timestamp_local_dt "
+                f"FROM read_parquet('{pattern}', hive_partitioning = true, union_by_name = true)"
+            )
+            self._view_ready = True
+
+    def _execute(self, sql: str, params: Optional[Sequence] = None) -> pd.DataFrame:
+        self._ensure_view()
+        cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql, list(params or [])).df()
+        finally:
+            cursor.close()
+
+    def query(self, sql: str, params: Optional[Sequence] = None) -> pd.DataFrame:
+        """
+        รัน SELECT หนึ่งคำสั่งแล้วคืนผลเป็น DataFrame
+        (คำสั่งอื่น เช่น COPY, ATTACH, CREATE หรือ SET ถูกปฏิเสธ เพราะ SQL อาจมาจากผู้ใช้หน้าเว็บ)
+
+        Args:
+            sql: คำสั่ง SQL (อ้างถึง view telemetry)
+            params: ค่าของ placeholder ``?`` ใน sql
+
+        Returns:
+            DataFrame ของผลลัพธ์
+        """
+        import duckdb
+
+        statements = self._con.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Only a single SELECT statement is allowed")
+        return self._execute(sql, params)
+
+    def explain(self, sql: str, params: Optional[Sequence] = None) -> str:
+        """คืน query plan หลังรันจริง (EXPLAIN ANALYZE) ใช้ตรวจจำนวนไฟล์ที่ถูกอ่านและ filter ที่ถูก push down"""
+        plan = self._execute(f"EXPLAIN ANALYZE {sql}", params)
+        return plan.iloc[0, -1]
+
+    def columns(self) -> List[str]:
+        """คอลัมน์ของ view telemetry"""
+        return self._execute("DESCRIBE telemetry")['column_name'].tolist()
+
+    def aggregate(
+        self,
+        devices: Sequence[str],
+        start_date_utc: datetime,
+        end_date_utc: datetime,
+        columns: Sequence[str],
+        resolution: str = '1h',
+        agg: str = 'mean'
+    ) -> pd.DataFrame:
+        """
+        ค่าสรุปต่อช่วงเวลา (ตามเวลาท้องถิ่น) ของแต่ละอุปกรณ์
+
+        เงื่อนไขช่วงเวลาถูกแปลงเป็นเงื่อนไขบน partition รายเดือนด้วย เพื่อให้ DuckDB ข้ามไฟล์นอกช่วงโดยไม่เปิดไฟล์
+
+        Args:
+            devices: ชื่ออุปกรณ์ (deviceName)
+            start_date_utc: เวลาเริ่มต้น (UTC)
+            end_date_utc: เวลาสิ้นสุด (UTC)
+            columns: คอลัมน์ตัวเลขหรือคอลัมน์ใน DERIVED_COLUMNS
+            resolution: ความกว้างของช่วงเวลาในรูปแบบ pandas เช่น '15min', '1h', '1D'
+            agg: ฟังก์ชันใน SQL_AGGREGATIONS
+
+        Returns:
+            DataFrame คอลัมน์ device, timestamp_local_dt และหนึ่งคอลัมน์ต่อ columns
+        """
+        if agg not in SQL_AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation: {agg}")
+        available = set(self.columns())
+        expressions = []
+        for column in columns:
+            if column in DERIVED_COLUMNS:
+                expression = DERIVED_COLUMNS[column]
+            elif column in available:
+                expression = _quote(column)
+            else:
+                raise ValueError(f"Unknown column: {column}")
+            expressions.append(f"{SQL_AGGREGATIONS[agg]}({expression}) AS {_quote(column)}")
+
+        partitions = ' OR '.join(
+            f"(year = {year} AND month = {month} AND day BETWEEN {first_day} AND {last_day})"
+            for year, month, first_day, last_day in partition_ranges(start_date_utc, end_date_utc)
+        ) or 'FALSE'
+        sql = (
+            f"SELECT device, time_bucket(to_microseconds(?), timestamp_local_dt) AS timestamp_local_dt, "
+            f"{', '.join(expressions)} FROM telemetry "
+            f"WHERE device IN ({', '.join('?' for _ in devices)}) AND ({partitions}) "
+            f"AND timestamp_utc_dt >= ? AND timestamp_utc_dt < ? "
+            f"GROUP BY ALL ORDER BY device, timestamp_local_dt"
+        )
+        width = int(pd.Timedelta(resolution).total_seconds() * 1_000_000)
+        return self._execute(sql, [width, *devices, start_date_utc, end_date_utc])
+
+_engine: Optional[TelemetrySQL] = None
+_engine_lock = threading.Lock()
+
+def get_sql_engine() -> TelemetrySQL:
+    """คืน TelemetrySQL ของ process (สร้างครั้งแรกที่ถูกเรียก)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TelemetrySQL()
+        return _engine
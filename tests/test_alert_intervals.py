@@ -0,0 +1,63 @@
+"""
+ทดสอบการประเมินระดับ (utils.classify_thresholds) และการหาช่วงแจ้งเตือน (utils.find_alert_intervals)
+
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import THRESHOLD_LEVELS, check_thresholds, classify_thresholds, find_alert_intervals
+
+# ระหว่าง band ปกติ (20-30) กับ band เฝ้าระวัง (15-35) มีช่วงที่ไม่เข้าเงื่อนไขใดเลย (unknown)
+THRESHOLDS = {'normal': (20, 30), 'warning': (15, 35), 'critical': (10, 40)}
+
+def make_frame(values) -> pd.DataFrame:
+    return pd.DataFrame({
+        'timestamp_local_dt': pd.date_range('2025-01-01', periods=len(values), freq='min'),
+        'temperature': values,
+    })
+
+def test_classify_matches_check_thresholds():
+    values = [5, 10, 12, 15, 17, 20, 25, 30, 32, 35, 38, 40, 45]
+    codes = classify_thresholds(values, THRESHOLDS)
+    expected = [check_thresholds(v, THRESHOLDS, 'temperature')[0] for v in values]
+    assert [THRESHOLD_LEVELS[int(code)] for code in codes] == expected
+    assert THRESHOLD_LEVELS[int(classify_thresholds([np.nan], THRESHOLDS)[0])] == 'unknown'
+
+def test_banding_gap_is_not_an_alert():
+    # 32 และ 17 อยู่นอก band ปกติแต่ยังอยู่ใน band เฝ้าระวัง จึงไม่ถูกนับเป็นช่วงแจ้งเตือน
+    intervals = find_alert_intervals(make_frame([25, 32, 36, 37, 32, 17, 25]), 'temperature', THRESHOLDS)
+    assert len(intervals) == 1
+    interval = intervals.iloc[0]
+    assert interval['level'] == 'warning'
+    assert interval['n_points'] == 2
+    assert interval['start'] == pd.Timestamp('2025-01-01 00:02')
+    assert interval['end'] == pd.Timestamp('2025-01-01 00:03')
+    assert interval['peak'] == 37
+
+def test_nan_splits_intervals_and_single_samples():
+    intervals = find_alert_intervals(make_frame([36, np.nan, 41, 25, 8]), 'temperature', THRESHOLDS)
+    assert intervals['n_points'].tolist() == [1, 1, 1]
+    assert intervals['level'].tolist() == ['warning', 'critical', 'critical']
+    assert (intervals['duration'] == pd.Timedelta(0)).all()
+    # peak คือค่าที่ห่างจาก band ปกติมากที่สุด ทั้งด้านบนและด้านล่าง
+    assert intervals['peak'].tolist() == [36, 41, 8]
+
+def test_unsorted_rows_and_min_level():
+    df = make_frame([25, 36, 41, 36, 25]).iloc[::-1]
+    warning = find_alert_intervals(df, 'temperature', THRESHOLDS)
+    assert warning[['level', 'n_points', 'peak']].values.tolist() == [['critical', 3, 41]]
+
+    critical = find_alert_intervals(df, 'temperature', THRESHOLDS, min_level='critical')
+    assert critical['n_points'].tolist() == [1]
+
+def test_missing_column_gives_empty_frame():
+    intervals = find_alert_intervals(make_frame([36]), 'humidity', THRESHOLDS)
+    assert intervals.empty
+    assert list(intervals.columns) == ['column', 'level', 'start', 'end', 'duration', 'peak', 'n_points']
@@ -0,0 +1,31 @@
+"""
+ทดสอบ calendar features ของ utils.build_calendar_features
+
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import build_calendar_features
+
+def test_missing_timestamps_give_empty_features():
+    timestamps = pd.Series(pd.to_datetime(['2025-01-04 20:00', None, '2025-01-06 03:00']))
+    features = build_calendar_features(timestamps)
+
+    assert features['hour'].tolist()[0::2] == [20, 3]
+    assert features.iloc[1].isna().all()
+    assert features['day_name'].tolist()[0::2] == ['Saturday', 'Monday']
+
+def test_timezone_aware_timestamps_use_local_time():
+    timestamps = pd.Series(pd.date_range('2025-01-04 20:00', periods=2, freq='h', tz='UTC'))
+    features = build_calendar_features(timestamps)
+
+    # 20:00 UTC = 03:00 ของวันอาทิตย์ตามเวลาท้องถิ่น (UTC+7)
+    assert features['hour'].tolist() == [3, 4]
+    assert features['day_name'].tolist() == ['Sunday', 'Sunday']
+    assert features['time_period'].tolist() == ['Night', 'Night']
@@ -0,0 +1,55 @@
+"""
+ทดสอบการ export แบบทีละช่วงแถวของ utils.write_export_data
+
+    python -m pytest tests
+"""
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import write_export_data
+
+def make_frame(rows: int = 10) -> pd.DataFrame:
+    """ข้อมูลที่คอลัมน์ note เป็นค่าว่างทั้งหมดในช่วงแรก และมีค่าจริงในช่วงหลัง"""
+    note = [None] * rows
+    note[-1] = 'sensor reset'
+    return pd.DataFrame({
+        'timestamp_local_dt': pd.date_range('2025-01-01', periods=rows, freq='min'),
+        'temperature': np.linspace(20, 30, rows),
+        'note': pd.Series(note, dtype=object),
+    })
+
+def read_back(data: bytes, format_type: str) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if format_type == 'parquet':
+        return pq.read_table(io.BytesIO(data)).to_pandas()
+    return pa.ipc.open_file(pa.BufferReader(data)).read_pandas()
+
+@pytest.mark.parametrize('format_type', ['parquet', 'arrow'])
+def test_null_first_chunk_keeps_column_type(format_type):
+    df = make_frame()
+    sink = io.BytesIO()
+    write_export_data(df, sink, format_type, chunk_rows=4)
+
+    result = read_back(sink.getvalue(), format_type)
+    pd.testing.assert_frame_equal(result, df)
+
+@pytest.mark.parametrize('format_type', ['parquet', 'arrow'])
+def test_all_null_column(format_type):
+    df = make_frame()
+    df['note'] = pd.Series([None] * len(df), dtype=object)
+    sink = io.BytesIO()
+    write_export_data(df, sink, format_type, chunk_rows=4)
+
+    result = read_back(sink.getvalue(), format_type)
+    assert len(result) == len(df)
+    assert result['note'].isna().all()
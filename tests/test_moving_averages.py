@@ -0,0 +1,59 @@
+"""
+ทดสอบ utils.MovingAverageEngine เทียบกับ rolling / ewm ของ pandas
+
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils import MovingAverageEngine
+
+def make_frame(rows: int = 500, seed: int = 0) -> pd.DataFrame:
+    """ข้อมูลที่ช่วงห่างของเวลาไม่สม่ำเสมอ มีค่าว่างบางแถว และถูกสลับลำดับแถว"""
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp('2025-01-01') + pd.to_timedelta(np.cumsum(rng.integers(5, 120, rows)), unit='s')
+    values = rng.normal(25, 3, rows)
+    values[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({'timestamp_local_dt': times, 'temperature': values})
+
+def test_row_windows_match_rolling():
+    df = make_frame()
+    result = MovingAverageEngine('temperature', [5, 20]).fit(df)
+    for window in (5, 20):
+        expected = df['temperature'].rolling(window, min_periods=1).mean()
+        np.testing.assert_allclose(result[f'temperature_ma{window}'], expected, rtol=1e-9)
+
+def test_time_windows_match_rolling_on_unsorted_rows():
+    df = make_frame().sample(frac=1, random_state=1)
+    result = MovingAverageEngine('temperature', ['5min', '1h'], time_column='timestamp_local_dt').fit(df)
+
+    ordered = df.sort_values('timestamp_local_dt')
+    for window in ('5min', '1h'):
+        expected = ordered.rolling(window, on='timestamp_local_dt', min_periods=1)['temperature'].mean()
+        np.testing.assert_allclose(result.loc[ordered.index, f'temperature_ma{window}'], expected, rtol=1e-9)
+
+def test_ewm_matches_pandas():
+    df = make_frame()
+    result = MovingAverageEngine('temperature', [], ewm_spans=[12]).fit(df)
+    expected = df['temperature'].ewm(span=12, adjust=False, ignore_na=True).mean()
+    np.testing.assert_allclose(result['temperature_ewm12'], expected, rtol=1e-9)
+
+@pytest.mark.parametrize('windows', [[5, 20], ['5min', '1h']])
+def test_update_continues_fit(windows):
+    df = make_frame()
+    full = MovingAverageEngine('temperature', windows, [12], time_column='timestamp_local_dt').fit(df)
+
+    engine = MovingAverageEngine('temperature', windows, [12], time_column='timestamp_local_dt')
+    parts = [engine.fit(df.iloc[:300]), engine.update(df.iloc[300:450]), engine.update(df.iloc[450:])]
+    pd.testing.assert_frame_equal(pd.concat(parts), full, rtol=1e-9)
+
+def test_time_window_requires_time_column():
+    with pytest.raises(ValueError):
+        MovingAverageEngine('temperature', ['5min'])
@@ -0,0 +1,45 @@
+"""
+ทดสอบการนำข้อมูลเข้า rollups.RollupStore
+
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from rollups import RollupStore
+
+def make_frame(rows: int = 600) -> pd.DataFrame:
+    """ข้อมูลทุก 10 วินาที โดยทุกคู่แถวมีเวลาเดียวกัน"""
+    times = pd.Timestamp('2025-01-01') + pd.to_timedelta(np.arange(rows) // 2 * 10, unit='s')
+    return pd.DataFrame({
+        'timestamp_local_dt': times,
+        '_id': [f'{i:024x}' for i in range(rows)],
+        'temperature': np.arange(rows, dtype='float64'),
+    })
+
+def test_late_and_same_timestamp_rows_are_counted():
+    df = make_frame()
+    late = df.index % 7 == 3
+    store = RollupStore()
+    # ครั้งแรกได้ข้อมูลไม่ครบ: ขาดแถวที่มาช้า และแถวที่สองของเวลาสุดท้าย
+    store.update(df[~late].iloc[:-1], version='v1')
+
+    added = store.update(df, version='v2')
+    assert added == late.sum() + 1
+    assert store.update(df, version='v3') == 0
+
+    expected = df.set_index('timestamp_local_dt')['temperature'].resample('1min').agg(['count', 'sum'])
+    assert store.query(resolution='1min', agg='count')['temperature'].tolist() == expected['count'].tolist()
+    assert store.query(resolution='1min', agg='sum')['temperature'].tolist() == expected['sum'].tolist()
+
+def test_rows_without_id_use_watermark():
+    df = make_frame().drop(columns='_id')
+    store = RollupStore()
+    store.update(df.iloc[:100])
+    assert store.update(df) == len(df) - 100
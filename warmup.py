@@ -0,0 +1,175 @@
+"""
+Warm-up ของ cache เมื่อ process ของแอปเริ่มทำงาน และเป็นคำสั่งเริ่มแอปสำหรับ deploy
+
+    python warmup.py                 # เริ่ม warm-up แล้วเริ่ม streamlit run 01_Home.py ใน process เดียวกัน
+    python warmup.py -- --server.port 8502
+    python warmup.py --warm-only     # warm-up แล้วจบ (ใช้เติม cache บนดิสก์ให้ process อื่นเมื่อกำหนด SHARED_CACHE_DIR)
+
+ควร deploy ด้วย python warmup.py เพราะเป็นโหมดเดียวที่ warm-up เริ่มพร้อม process ก่อนมีผู้ใช้คนแรก
+เมื่อรันด้วย streamlit run ตามปกติ warm-up จะเริ่มเมื่อหน้า Home หรือ Analysis Tool ถูกเปิดครั้งแรก
+(ผู้ใช้คนแรกจึงยังต้องรอข้อมูลของหน้าที่เปิด แต่การโหลดที่ key ตรงกับ warm-up จะรอผลเดียวกันแทนการโหลดซ้ำ)
+
+ผลที่คงอยู่หลังข้อมูลใหม่เข้ามาคือ TelemetryWindow ของ process (ข้อมูลย้อนหลังที่ load_data_from_mongo
+เติมเฉพาะแถวใหม่) และ RollupStore ส่วน entry ของ st.cache_data และ cache บนดิสก์ผูกกับเวอร์ชันข้อมูล ณ ตอน warm-up
+จึงใช้ได้จนกว่าจะมีข้อมูลใหม่เท่านั้น ข้อจำกัด: --warm-only เติมได้เพียง cache บนดิสก์ (process จบพร้อม TelemetryWindow)
+จึงช่วยเฉพาะ process ที่เปิดก่อนอุปกรณ์ส่งข้อมูลรอบถัดไป ควรใช้โหมดปกติ (warm-up ใน process ของ server) แทน
+"""
+import streamlit as st
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import load_data_from_mongo, get_data_version, DATA_SOURCES
+from rollups import get_rollup_store
+
+logger = logging.getLogger(__name__)
+
+# กำหนด CACHE_WARMUP=0 เพื่อปิด warm-up
+WARMUP_ENABLED = os.environ.get("CACHE_WARMUP", "1") != "0"
+
+# จำนวนวันที่แต่ละหน้าโหลด (ต้องตรงกับที่หน้าเว็บเรียก load_data_from_mongo เพื่อให้ key ของ cache ตรงกัน)
+HOME_DAYS = 1
+ANALYSIS_DAYS = 7
+
+class CacheWarmup:
+    """
+    โหลดข้อมูลเริ่มต้นของทุกแหล่งข้อมูลล่วงหน้าใน thread เบื้องหลัง เพื่อให้ผู้ใช้คนแรกหลัง deploy
+    หรือ restart ได้ผลจาก cache แทนการรอโหลดจาก MongoDB
+
+    ขั้นตอนเรียงตามลำดับที่ผู้ใช้น่าจะเปิด: ข้อมูล 1 วันของหน้า Home ก่อน แล้วจึงข้อมูล 7 วัน
+    และ rollup ของหน้า Analysis Tool ขั้นตอนที่ล้มเหลวจะถูกบันทึกและข้ามไป
+
+    การโหลดข้อมูลเติม TelemetryWindow ของแต่ละช่วงเวลา เมื่อเวอร์ชันข้อมูลเปลี่ยนหลัง warm-up
+    หน้าเว็บจึงดึงเพียงแถวใหม่แทนการโหลดทั้งช่วงใหม่
+
+    Args:
+        sources: Dictionary ของแหล่งข้อมูล {ชื่อ: (collection, deviceName)}
+    """
+
+    def __init__(self, sources: Dict[str, Tuple[str, str]] = DATA_SOURCES):
+        self.sources = sources
+        self.steps: List[Dict] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._versions: Dict[str, str] = {}
+        self._frames: Dict[str, object] = {}
+        self._plan: List[Tuple[str, Callable[[], Optional[int]]]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        for source in sources:
+            self._add(f"{source}: {HOME_DAYS}-day data", lambda s=source: self._load(s, HOME_DAYS))
+        for source in sources:
+            self._add(f"{source}: {ANALYSIS_DAYS}-day data", lambda s=source: self._load(s, ANALYSIS_DAYS))
+            self._add(f"{source}: rollups", lambda s=source: self._rollups(s))
+
+    def _add(self, name: str, run: Callable[[], Optional[int]]):
+        self._plan.append((name, run))
+        self.steps.append({'name': name, 'status': 'pending', 'seconds': None, 'rows': None, 'error': None})
+
+    def _load(self, source: str, days: int) -> int:
+        location = self.sources[source]
+        # ตรวจเวอร์ชันทุกขั้นตอน (เหมือนหน้าเว็บ) key ของ cache จึงตรงกับหน้าที่เปิดอยู่พร้อมกัน
+        # และหน้าเว็บรอผลจาก warm-up (lock ต่อ key ของ st.cache_data) แทนการโหลดซ้ำ
+        self._versions[source] = get_data_version(*location)
+        # เรียกด้วยรูปแบบอาร์กิวเมนต์เดียวกับหน้าเว็บ
+        df = load_data_from_mongo(*location, time_delta_days=days, data_version=self._versions[source])
+        if days == ANALYSIS_DAYS:
+            self._frames[source] = df
+        return len(df)
+
+    def _rollups(self, source: str) -> int:
+        df = self._frames.pop(source, None)
+        if df is None or df.empty:
+            return 0
+        return get_rollup_store(source).update(df, version=self._versions[source])
+
+    # --- สถานะ ---
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def progress(self) -> float:
+        """สัดส่วนขั้นตอนที่ทำเสร็จแล้ว (0-1)"""
+        with self._lock:
+            finished = sum(step['status'] in ('done', 'failed') for step in self.steps)
+        return finished / max(len(self.steps), 1)
+
+    def status(self) -> List[Dict]:
+        """คืนสำเนาสถานะของทุกขั้นตอน"""
+        with self._lock:
+            return [dict(step) for step in self.steps]
+
+    # --- Thread ---
+
+    def run(self):
+        """ทำทุกขั้นตอนตามลำดับ (เรียกใน thread ปัจจุบัน)"""
+        self.started_at = time.time()
+        for i, (name, run) in enumerate(self._plan):
+            with self._lock:
+                self.steps[i]['status'] = 'running'
+            started = time.perf_counter()
+            try:
+                rows = run()
+                status, error = 'done', None
+            except Exception as e:
+                logger.warning("Cache warm-up step '%s' failed: %s", name, e)
+                rows, status, error = None, 'failed', str(e)
+            with self._lock:
+                self.steps[i].update(status=status, seconds=time.perf_counter() - started, rows=rows, error=error)
+        self._frames.clear()
+        self.finished_at = time.time()
+        logger.info("Cache warm-up finished in %.1f s", self.finished_at - self.started_at)
+
+    def start(self):
+        """เริ่ม warm-up ใน thread เบื้องหลัง (เรียกซ้ำได้อย่างปลอดภัย)"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="cache-warmup", daemon=True)
+        self._thread.start()
+
+@st.cache_resource
+def get_cache_warmup() -> CacheWarmup:
+    """
+    คืน CacheWarmup ตัวเดียวของ process (เริ่มทำงานในครั้งแรกที่ถูกเรียก ถ้า WARMUP_ENABLED)
+    """
+    warmup = CacheWarmup()
+    if WARMUP_ENABLED:
+        warmup.start()
+    return warmup
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--script', default='01_Home.py', help="สคริปต์หลักของ streamlit")
+    parser.add_argument('--warm-only', action='store_true', help="warm-up แล้วจบโดยไม่เริ่ม server (cache บนดิสก์ใช้ได้จนกว่าจะมีข้อมูลใหม่เท่านั้น)")
+    parser.add_argument('streamlit_args', nargs='*', help="อาร์กิวเมนต์เพิ่มเติมของ streamlit run (หลัง --)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # ไฟล์นี้ถูกรันเป็น __main__ จึง import ตามชื่อโมดูล เพื่อให้หน้าเว็บได้ warm-up ตัวเดียวกันจาก get_cache_warmup()
+    import warmup
+
+    if args.warm_only:
+        task = warmup.CacheWarmup()
+        task.run()
+        for step in task.status():
+            print(f"{step['name']:<32} {step['status']:<7} {step['seconds'] or 0:>7.2f} s {step['rows'] or 0:>9,} rows  {step['error'] or ''}")
+        return
+
+    warmup.get_cache_warmup()
+    from streamlit.web import cli
+    sys.argv = ['streamlit', 'run', os.path.join(os.path.dirname(os.path.abspath(__file__)), args.script), *args.streamlit_args]
+    sys.exit(cli.main())
+
+if __name__ == '__main__':
+    main()